@@ -9,6 +9,7 @@ import time
 import random
 
 from colorama import Fore, Style
+from io import BytesIO
 from typing import Union
 
 from discord.app_commands import command as slash_commands
@@ -30,7 +31,21 @@ from d20_governance.utils.voting import (
     vote,
     set_global_decision_module,
     decision_manager,
+    decision_tally,
 )
+from d20_governance.utils.auditor import values_auditor
+from d20_governance.utils.history import recent_messages
+from d20_governance.utils.images import ImageGenerationError, stability_client
+from d20_governance.utils.llm import llm_governor
+from d20_governance.utils.pipeline import PreparedStage, StagePipeline
+from d20_governance.utils.roles import role_changes
+from d20_governance.utils.router import COMMAND, ECHO, INPUT, OWN, classify_message
+from d20_governance.utils.scheduler import rest_scheduler
+from d20_governance.utils.stage_generator import StageGenerator
+from d20_governance.utils.streaming import WebhookStream
+from d20_governance.utils.tally import tally_board
+from d20_governance.utils.tts import tts_worker
+from d20_governance.utils.webhooks import webhook_delivery, webhook_pool
 from discord import app_commands
 from discord.ext import tasks, commands
 from discord.ui import Button, View
@@ -50,6 +65,12 @@ class MyBot(commands.Bot):
         super().__init__(**kwargs)
         self.quest = Quest()
 
+    async def close(self):
+        await webhook_delivery.close()
+        await stability_client.close()
+        tts_worker.close()
+        await super().close()
+
     @commands.Cog.listener()
     async def on_ready(self):
         """
@@ -82,108 +103,47 @@ class MyBot(commands.Bot):
             f.write(f"\n\n--- Bot started at {datetime.datetime.now()} ---\n\n")
         logging.info(f"Logged in as {bot.user} (ID: {bot.user.id})")
         value_revision_manager.__init__()
+        # Pooled webhooks are reused across restarts instead of being deleted on startup
+        webhook_pool.bind(bot)
         for guild in bot.guilds:
             await bot.tree.sync(guild=guild)
             await setup_server(guild)
-            await delete_all_webhooks(guild)
-        check_and_delete_webhooks_if_needed.start()
+        if not reconcile_webhooks.is_running():
+            reconcile_webhooks.start()
+        # Samples channels wherever the values module is active, by command or input
+        values_auditor.start(bot)
 
     @commands.Cog.listener()
     async def on_message(self, message):
         """
         Global message event listener
+
+        Messages are classified before any command context is built, so our own
+        messages and webhook echoes are dropped immediately and ordinary chat only
+        builds a context when a handler needs one
         """
-        global VOTE_RETRY
-        context = await bot.get_context(message)
-        guild_id = context.guild.id if context.guild else None
-        channel_id = context.channel.id if context.channel else None
-        guild = context.guild
-        channel = bot.get_channel(channel_id)
+        kind, payload = classify_message(message, bot.user.id)
+        # Ignore messages sent by the bot itself, and webhook echoes so they don't loop
+        if kind == OWN or kind == ECHO:
+            return
         try:
-            if message.author == bot.user:  # Ignore messages sent by the bot itself
-                return
-
-            # Allow the "-help" command to run without channel checks
-            if message.content.startswith("-help"):
+            # Commands, including "-help" and slash commands, skip channel checks
+            if kind == COMMAND:
                 await bot.process_commands(message)
                 return
 
-            # If message is a slash command, proceed directly to processing
-            if message.content.startswith("/"):
-                await bot.process_commands(message)
-                return
+            # Our reposts are recorded when they are sent, everything else here
+            recent_messages.add_message(message)
 
-            # If message is a regular command, proceed directly to processing
-            if message.content.startswith("-"):
-                await bot.process_commands(message)
-                return
-
-            # This symbol ensures webhook messages don't loop
-            if message.content.startswith("※"):
+            if (
+                kind == INPUT
+                and message.guild is not None
+                and await handle_continuous_input(message, *payload)
+            ):
                 return
 
-            message_split = message.content.strip().split(" ")
-            if len(message_split) >= 2:
-                increment = message_split[-1]
-                if increment == "+1" or increment == "-1":
-                    module_name = message_split[0]
-                    change = 1 if increment == "+1" else -1
-                    if channel_id is not None and guild_id is not None:
-                        # TODO: deduplicate and refactor this code
-                        if module_name in CONTINUOUS_INPUT_DECISION_MODULES.keys():
-                            if (
-                                VOTE_RETRY
-                            ):  # Decision modules can only be changed via continuous input during a vote retry.
-                                decision_bucket = cooldowns["decisions"].get_bucket(
-                                    message
-                                )
-                                retry_after = decision_bucket.update_rate_limit()
-                                if retry_after:
-                                    await context.send(
-                                        f"{context.author.mention}: Decision cooldown active, try again in {retry_after:.2f} seconds"
-                                    )
-                                    return
-
-                                module = CONTINUOUS_INPUT_DECISION_MODULES[module_name]
-                                module.config["input_value"] += change
-                                module.config["input_value"] = max(
-                                    module.config["input_value"], 0
-                                )
-                                await display_module_status(
-                                    context, CONTINUOUS_INPUT_DECISION_MODULES
-                                )
-                                # We do not call calculate_decision_module_inputs here as this is handled by the vote retry logic
-                            return
-                        elif module_name in CULTURE_MODULES.keys():
-                            if channel.name == "d20-agora":
-                                culture_bucket = cooldowns["cultures"].get_bucket(
-                                    message
-                                )
-                                retry_after = culture_bucket.update_rate_limit()
-                                if retry_after:
-                                    await context.send(
-                                        f"{context.author.mention}: Culture cooldown active, try again in {retry_after:.2f} seconds"
-                                    )
-                                    return
-
-                                module = CULTURE_MODULES[module_name]
-                                module.config["input_value"] += change
-                                module.config["input_value"] = max(
-                                    module.config["input_value"], 0
-                                )
-                                await display_module_status(context, CULTURE_MODULES)
-                                await calculate_continuous_culture_inputs(
-                                    context, guild_id, channel_id
-                                )
-                                return
-                            else:
-                                print(
-                                    f"Continuous input module not found: {module_name}"
-                                )
-                                return
-
             # Process message if it was not a continuous input
-            await process_message(context, message)
+            await process_message(message)
         except Exception as e:
             type, value, tb = sys.exc_info()
             traceback_str = "".join(traceback.format_exception(type, value, tb))
@@ -192,7 +152,25 @@ class MyBot(commands.Bot):
             if bot.quest.game_channel:
                 await bot.quest.game_channel.send("An error occured")
             else:
-                await context.send("An error occurred.")
+                await message.channel.send("An error occurred.")
+
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel):
+        """
+        Keep local webhook accounting in sync when a channel's webhooks change
+        """
+        await webhook_pool.on_webhooks_update(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        """
+        Drop cached role objects when a role changes
+        """
+        role_changes.invalidate(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        role_changes.invalidate(role.guild.id)
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
@@ -385,6 +363,9 @@ async def help(interaction: discord.Interaction, command: str = None):
 def setup_quest(quest_mode, gen_images, gen_audio, fast_mode, solo_mode):
     quest = Quest(quest_mode, gen_images, gen_audio, fast_mode, solo_mode)
     bot.quest = quest
+    if quest.gen_images and quest.stages:
+        # Warm stage images while players join so each stage posts instantly
+        quest.image_task = asyncio.create_task(pregenerate_quest_images(quest))
     global QUEST_IN_PROGRESS
     QUEST_IN_PROGRESS = True
     return quest
@@ -406,38 +387,41 @@ async def start_quest(ctx, quest: Quest):
     # Sleep for 3 seconds to give time for users to get to the channel and avoid possible latency issues in fetching the message_object
     await asyncio.sleep(3)
 
-    if quest.mode == SIMULATIONS["llm_mode"]:
-        llm_agent = get_llm_agent()
+    if quest.mode == SIMULATIONS["llm_mode"]["name"]:
         num_stages = random.randint(5, 10)  # Adjust range as needed
-        for _ in range(num_stages):
-            print(f"{Fore.BLUE}Generating stage with llm..{Style.RESET_ALL}")
-            stage = await generate_stage_llm(llm_agent)
-            await process_stage(ctx, stage, quest)
+        generator = StageGenerator(get_llm_agent(), num_stages)
+        print(f"{Fore.BLUE}Generating stages with llm..{Style.RESET_ALL}")
+        await quest.game_channel.send("generating next narrative step with llm..")
+        async for stage_dict in generator.stages():
+            quest.progress_completed = False
+            stage = Stage.from_dict(stage_dict)
+            print(f"{Fore.BLUE}↷ Processing stage: '{stage.name}'{Style.RESET_ALL}")
+            await process_stage(ctx, stage, quest, message_obj)
+            # The next stage is generated while this one plays
+            if not generator.ready():
+                await quest.game_channel.send(
+                    "generating next narrative step with llm.."
+                )
 
     else:  # yaml mode
-        for stage in quest.stages:
-            # reset progress_completed to False at start of each stage
-            await asyncio.sleep(0.5)
-            quest.progress_completed = False
-            actions = [
-                Action.from_dict(action_dict)
-                for action_dict in stage[QUEST_ACTIONS_KEY]
-            ]
-            progress_conditions = [
-                Progress_Condition.from_dict(progress_condition_dict)
-                for progress_condition_dict in stage[QUEST_PROGRESS_CONDITIONS_KEY]
-            ]
-            stage = Stage(
-                name=stage[QUEST_NAME_KEY],
-                message=stage[QUEST_MESSAGE_KEY],
-                actions=actions,
-                progress_conditions=progress_conditions,
-                image_path=stage.get(QUEST_IMAGE_PATH_KEY),
-            )
+        # Prepare media for upcoming stages while the current one plays
+        stages = [Stage.from_dict(stage_dict) for stage_dict in quest.stages]
+        pipeline = StagePipeline(stages, lambda stage: prepare_stage(stage, quest))
+        pipeline.start()
+        try:
+            while (prepared := await pipeline.next()) is not None:
+                # reset progress_completed to False at start of each stage
+                await asyncio.sleep(0.5)
+                quest.progress_completed = False
+                stage = prepared.stage
 
-            print(f"{Fore.BLUE}↷ Processing stage: '{stage.name}'{Style.RESET_ALL}")
+                print(f"{Fore.BLUE}↷ Processing stage: '{stage.name}'{Style.RESET_ALL}")
 
-            await process_stage(ctx, stage, quest, message_obj)
+                await process_stage(ctx, stage, quest, message_obj, prepared)
+                pipeline.finish_stage()
+        finally:
+            pipeline.close()
+        print(f"{Fore.BLUE}Stage transitions: {pipeline.summary()}{Style.RESET_ALL}")
 
 
 # class VoteTimeoutView(View):
@@ -474,25 +458,83 @@ async def process_decision_retry(ctx, retry_message):
     await ctx.send(
         "```💡--Do Not Dispair!--💡\n\nYou have a chance to change how you make decisions```"
     )
-    await display_module_status(ctx, CONTINUOUS_INPUT_DECISION_MODULES)
+    # Each retry gets a fresh status message below its announcement
+    tally_board.forget(ctx.channel.id)
+    await tally_board.show(ctx.channel, decision_tally, "Decision Display Status")
     await ctx.send(
-        f"```👀--Instructions--👀\n\n* Post a message with the decision type you want to use\n\n* For example, type: consensus +1\n\n* You can express your preference multiple times and use +1 or -1 after the decision type\n\n* The decision module with the most votes in 60 seconds, or the first to {INPUT_SPECTRUM['threshold']}, will be the new decision making module during the next decision retry.\n\n* You have 60 seconds before the next decision is retried. ⏳```"
+        f"```👀--Instructions--👀\n\n* Post a message with the decision type you want to use\n\n* For example, type: consensus +1\n\n* You can express your preference multiple times and use +1 or -1 after the decision type\n\n* The decision module with the most votes in {TALLY['retry_window']} seconds, or the first to {INPUT_SPECTRUM['threshold']}, will be the new decision making module during the next decision retry.\n\n* You have {TALLY['retry_window']} seconds before the next decision is retried. ⏳```"
     )
 
     """
-    For 60 seconds, tally continuous votes; if threshold is reached for any module, it will be set as decision module, 
-    otherwise status quo will remain  
+    Until the retry window closes, wait for continuous votes to put a single module at
+    or above the threshold; it will be set as decision module, otherwise status quo
+    will remain
+    """
+    winner = await decision_tally.wait_for_winner(TALLY["retry_window"])
+    if winner is None:
+        await ctx.send("No winner was found. The status quo will remain.")
+        return
+
+    await update_decision_module(ctx, winner)
+    await ctx.send(f"```{winner} mode activated!```")
+
+
+async def prepare_stage(stage: Stage, quest: Quest):
+    """
+    Prepare the audio, image and embed for a stage
     """
-    for _ in range(60):
-        reached_threshold = await calculate_continuous_decision_inputs(ctx)
-        if reached_threshold:
-            return
-        await asyncio.sleep(1)
 
-    await ctx.send("No winner was found. The status quo will remain.")
+    async def prepare_audio():
+        if not quest.gen_audio:
+            return None
+        try:
+            audio_filename = await tts_worker.synthesize(stage.message)
+            audio_data = await tts_worker.read(audio_filename)
+            extension = os.path.splitext(audio_filename)[1]
+            return discord.File(
+                BytesIO(audio_data), filename=f"{quest.media_name(stage.name)}{extension}"
+            )
+        except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+            print(f"{Fore.RED}Audio generation failed: {e}{Style.RESET_ALL}")
+            logging.error(f"Audio generation failed: {e}")
+            return None
+
+    async def prepare_image():
+        if not quest.gen_images:
+            return None
+        # Check if stage has an non-empty image_path
+        if stage.image_path and stage.image_path != "None":
+            return discord.File(stage.image_path)
+        # If no image, pass
+        elif stage.image_path == "None":
+            return None
+        # Generate stage image in memory
+        try:
+            image_data = await generate_image(stage.message)
+            return discord.File(
+                BytesIO(image_data), filename=f"{quest.media_name(stage.name)}.png"
+            )
+        except ImageGenerationError as e:
+            print(f"{Fore.RED}Image generation failed: {e}{Style.RESET_ALL}")
+            logging.error(f"Image generation failed: {e}")
+            return None
 
+    audio_file, image_file = await asyncio.gather(prepare_audio(), prepare_image())
+    embed = discord.Embed(
+        title=stage.name,
+        description=stage.message,
+        color=discord.Color.dark_orange(),
+    )
+    return PreparedStage(stage, embed, image_file, audio_file)
 
-async def process_stage(ctx, stage: Stage, quest: Quest, message_obj: discord.Message):
+
+async def process_stage(
+    ctx,
+    stage: Stage,
+    quest: Quest,
+    message_obj: discord.Message = None,
+    prepared: PreparedStage = None,
+):
     """
     Run stages from yaml config
     """
@@ -501,42 +543,18 @@ async def process_stage(ctx, stage: Stage, quest: Quest, message_obj: discord.Me
     if game_channel_ctx.channel in ARCHIVED_CHANNELS:
         return
 
-    if quest.gen_audio:
-        loop = asyncio.get_event_loop()
-        audio_filename = f"{AUDIO_MESSAGES_PATH}/{stage.name}.mp3"
-        future = loop.run_in_executor(None, tts, stage.message, audio_filename)
-        await future
-
-    if quest.gen_images:
-        # Check if stage has an non-empty image_path
-        if hasattr(stage, "image_path") and stage.image_path != "None":
-            image = Image.open(stage.image_path)  # Open the image
-            image.save("generated_image.png")  # Save the image to a file
-        # If no image, pass
-        elif hasattr(stage, "image_path") and stage.image_path == "None":
-            pass
-        else:
-            # Generate intro image and send to temporary channel
-            image = generate_image(stage.message)
-            image.save("generated_image.png")  # Save the image to a file
+    if prepared is None:
+        prepared = await prepare_stage(stage, quest)
 
     # Post the image to the Discord channel
-    if os.path.exists("generated_image.png"):
-        await game_channel_ctx.send(file=discord.File("generated_image.png"))
-        os.remove("generated_image.png")
+    if prepared.image_file is not None:
+        await game_channel_ctx.send(file=prepared.image_file)
 
-    if quest.gen_audio:
+    if prepared.audio_file is not None:
         # Post audio file
-        with open(audio_filename, "rb") as f:
-            audio = discord.File(f)
-            await game_channel_ctx.send(file=audio)
-        os.remove(audio_filename)
+        await game_channel_ctx.send(file=prepared.audio_file)
 
-    embed = discord.Embed(
-        title=stage.name,
-        description=stage.message,
-        color=discord.Color.dark_orange(),
-    )
+    embed = prepared.embed
 
     # Stream message
     if quest.fast_mode:
@@ -686,7 +704,7 @@ async def countdown(
     first_message = (
         f"```⏳ Counting Down: {remaining_minutes:.2f} minutes remaining {text}```"
     )
-    message = await channel.send(first_message)
+    message = await rest_scheduler.send(channel, content=first_message)
 
     @tasks.loop(seconds=15)
     async def update_countdown():
@@ -695,17 +713,19 @@ async def countdown(
         new_message = (
             f"```⏳ Counting Down: {remaining_minutes:.2f} minutes remaining {text}.```"
         )
-        await message.edit(content=new_message)
+        await rest_scheduler.edit(message, content=new_message)
         if remaining_minutes <= 0:
             new_message = f"```⏲️ Counting down finished.```"
-            await channel.send(new_message)
+            await rest_scheduler.send(channel, content=new_message)
             print(f"{Fore.BLUE}⧗ Countdown finished.{Style.RESET_ALL}")
             update_countdown.stop()
 
         # Check if all submissions have been submitted
         if bot.quest.progress_completed:
-            await message.edit(
-                content="```⏲️ All submissions submitted. Countdown finished.```"
+            await rest_scheduler.edit(
+                message,
+                priority="status",
+                content="```⏲️ All submissions submitted. Countdown finished.```",
             )
             update_countdown.stop()
 
@@ -714,15 +734,19 @@ async def countdown(
         nonlocal remaining_seconds, remaining_minutes, message
         remaining_minutes = remaining_seconds / 60
         if remaining_minutes <= 0:
-            await message.edit(content="```⏲️ Counting down finished.```")
+            await rest_scheduler.edit(
+                message, priority="status", content="```⏲️ Counting down finished.```"
+            )
             print(f"{Fore.BLUE}⧗ Countdown finished.{Style.RESET_ALL}")
             send_new_message.stop()
         if remaining_minutes <= remaining_minutes - 1:
             new_message = f"```⏳ Counting Down: {remaining_minutes:.2f} minutes remaining {text}.```"
-            message = await channel.send(new_message)
+            message = await rest_scheduler.send(channel, content=new_message)
             if bot.quest.progress_completed:
-                await message.edit(
-                    content="```⏲️ All submissions submitted. Countdown finished.```"
+                await rest_scheduler.edit(
+                    message,
+                    priority="status",
+                    content="```⏲️ All submissions submitted. Countdown finished.```",
                 )
                 send_new_message.stop()
 
@@ -810,11 +834,10 @@ async def end(ctx):
     """
     Archive the quest and channel
     """
-    # Check if values_check_task is running and if so cancel process
-    global values_check_task
-    if values_check_task is not None and not values_check_task.done():
-        values_check_task.cancel()
-        print("value check loop canceled")
+    # Stop pre-generating images for stages that will not be played
+    quest = getattr(bot, "quest", None)
+    if quest is not None and quest.image_task is not None:
+        quest.image_task.cancel()
     global QUEST_IN_PROGRESS
     QUEST_IN_PROGRESS = False
     print(f"{Fore.BLUE}⇓ Archiving...{Style.RESET_ALL}")
@@ -838,9 +861,10 @@ async def end(ctx):
 
     print(f"{Fore.BLUE}⇓ Archived...{Style.RESET_ALL}")
 
-    guild_id = ctx.guild.id
-    guild = bot.get_guild(guild_id)
-    await delete_all_webhooks(guild)
+    # The archived channel no longer accepts messages, so its webhook can go
+    await webhook_pool.release(ctx.channel.id)
+    # Nor is it worth auditing; the audit stops once no audited channel is left
+    values_auditor.release(ctx.channel.id)
 
 
 # VIEWS
@@ -895,7 +919,9 @@ class JoinLeaveView(discord.ui.View):
             inline=False,
         )
 
-        await interaction.message.edit(embed=embed, view=self)
+        await rest_scheduler.edit(
+            interaction.message, priority="vote", embed=embed, view=self
+        )
 
     @discord.ui.button(
         style=discord.ButtonStyle.green, label="Join", custom_id="join_button"
@@ -1096,7 +1122,7 @@ async def embark(
     # Quest setup
     quest = setup_quest(
         quest_mode.value,
-        generate_images.value,
+        generate_images.value == "True",
         gen_audio=None,
         fast_mode=None,
         solo_mode=False,
@@ -1297,7 +1323,7 @@ class TimeoutView(View):
             if isinstance(item, discord.ui.Button):
                 item.disabled = True
         # Update the message to reflect the change
-        await self.message.edit(view=self)
+        await rest_scheduler.edit(self.message, priority="vote", view=self)
         self.wait_finished.set()
 
     async def wait(self):
@@ -1581,7 +1607,8 @@ async def trigger_vote(
         vote_context.decision_module_name = "lazy_consensus"
         vote_context.options = options
         non_objection_options = await vote(vote_context=vote_context)
-        value_revision_manager.agora_values_dict.update(non_objection_options)
+        # Goes through the manager so cached alignment verdicts are invalidated
+        await value_revision_manager.update_values_dict(None, non_objection_options)
     if type == "submissions":
         # Get all keys (player_names) from the players_to_submissions dictionary and convert it to a list
         options = list(bot.quest.players_to_submissions.values())
@@ -1626,7 +1653,29 @@ async def send_deliberation_questions(ctx, questions):
     random_question = questions.pop(random_index)
 
     embed = discord.Embed(title="A Deliberation Question:", description=random_question)
-    await ctx.channel.send(embed=embed)
+    await rest_scheduler.send(ctx.channel, embed=embed)
+
+
+# SCHEDULER COMMANDS
+@bot.command(hidden=True)
+@commands.check(lambda ctx: check_cmd_channel(ctx, "d20-testing"))
+async def rest_metrics(ctx):
+    """
+    Show outbound REST scheduler, webhook delivery, LLM governor and filter metrics
+    """
+    message_content = "REST scheduler:\n"
+    for key, value in rest_scheduler.snapshot().items():
+        message_content += f"{key}: {value}\n"
+    message_content += "\nWebhook delivery:\n"
+    for key, value in webhook_delivery.metrics.items():
+        message_content += f"{key}: {value}\n"
+    message_content += "\nLLM governor:\n"
+    for key, value in llm_governor.snapshot().items():
+        message_content += f"{key}: {value}\n"
+    message_content += "\nCulture filters:\n"
+    message_content += f"latency: {filter_latency.snapshot()}\n"
+    message_content += f"timeouts: {dict(filter_timeouts)}\n"
+    await ctx.send(f"```{message_content}```")
 
 
 # CLEANING COMMANDS
@@ -1651,12 +1700,28 @@ async def clean_category_channels(ctx, category_name="d20-quests"):
         await ctx.send(f'Category "{category_name}" was not found.')
         return
 
-    for channel in category.channels:
-        await channel.delete()
+    await asyncio.gather(
+        *(
+            rest_scheduler.submit(
+                channel.delete, route=f"guild:{guild.id}", priority="maintenance"
+            )
+            for channel in category.channels
+        )
+    )
 
     await ctx.send(f'All channels in category "{category_name}" have been deleted.')
 
 
+@bot.command(hidden=True)
+@commands.check(lambda ctx: check_cmd_channel(ctx, "d20-testing"))
+async def clean_webhooks(ctx):
+    """
+    Delete every webhook in the guild (the webhook pool normally makes this unnecessary)
+    """
+    await delete_all_webhooks(ctx.guild)
+    await ctx.send("All webhooks in this server have been deleted.")
+
+
 # TEST COMMANDS
 @bot.command(hidden=True)
 @commands.check(lambda ctx: check_cmd_channel(ctx, "d20-agora"))
@@ -1729,8 +1794,7 @@ async def clear_decision_input_values(ctx):
     Used during vote retries
     """
     print("Clearing decision input values...")
-    for decision_module in CONTINUOUS_INPUT_DECISION_MODULES.values():
-        decision_module["input_value"] = 0
+    decision_tally.reset()
     print("Decision input values set to 0")
 
 
@@ -1767,151 +1831,50 @@ async def update_decision_module(context, new_decision_module):
         ACTIVE_GLOBAL_DECISION_MODULES[context.channel] = channel_decision_modules
 
 
-async def calculate_continuous_decision_inputs(ctx):
+async def apply_culture_threshold(ctx, module_name, reached, guild_id, channel_id):
     """
-    Change local state of modules based on calculation of module inputs
+    Change local state of a culture module whose input crossed the threshold
     """
-    print("Calculating module inputs...")
-
-    max_value = max(
-        module["input_value"] for module in CONTINUOUS_INPUT_DECISION_MODULES.values()
-    )
-    max_module_names = [
-        module_name
-        for module_name, module in CONTINUOUS_INPUT_DECISION_MODULES.items()
-        if module["input_value"] == max_value
-    ]
-
-    # If threshold has been reached in only one module, update the decision module
-    if max_value >= INPUT_SPECTRUM["threshold"] and len(max_module_names) == 1:
-        # Update the decision module
-        await update_decision_module(ctx, max_module_names[0])
-        await ctx.send(f"```{max_module_names[0]} mode activated!```")
-        return True
-    else:
-        return False
-
-async def calculate_continuous_culture_inputs(ctx, guild_id, channel_id):
-    module: CultureModule
-    for module_name, module in CULTURE_MODULES.items():
-        # Check if input_value reaches the spectrum threshold and local state it not yet active
-        if module.config["input_value"] > INPUT_SPECTRUM[
-            "threshold"
-        ] and not module.is_local_state_active_in_channel(guild_id, channel_id):
-            # Activate local state
-            await module.activate_local_state_in_channel(ctx, guild_id, channel_id)
-            await ctx.send(
-                f"```{module_name.capitalize()} module has been activated!```"
-            )
-
-        # Check if input_value goes below the threshold and local state is active
-        elif module.config["input_value"] <= INPUT_SPECTRUM[
-            "threshold"
-        ] and module.is_local_state_active_in_channel(guild_id, channel_id):
-            # Deactivate local state
-            await module.deactivate_local_state_in_channel(ctx, guild_id, channel_id)
-            await ctx.send(
-                f"```{module_name.capitalize()} module has been deactivated```"
-            )
-
-
-# TODO: reconcile redundant code here
-async def display_module_status(context, module_dict):
-    """
-    Display the current status of culture input values
-    """
-    print("Displaying module status...")
-    if module_dict == CULTURE_MODULES:
-        embed = discord.Embed(
-            title="Culture Display Status",
-            color=discord.Color.green(),
-        )
-    else:
-        embed = discord.Embed(
-            title="Decision Display Status",
-            color=discord.Color.green(),
-        )
-
-    if module_dict == CULTURE_MODULES:
-        for module_name in module_dict:
-            module = CULTURE_MODULES[module_name]
-            input_value = module.config["input_value"]
-            module_name_field = module.config["name"].capitalize()
-            input_filled = int(min(input_value, INPUT_SPECTRUM["scale"]))
-            input_empty = INPUT_SPECTRUM["scale"] - input_filled
-
-            progress_bar = "🟦" * input_filled + "🟨" * input_empty
-            if module_dict == CULTURE_MODULES:
-                progress_bar = (
-                    progress_bar[: INPUT_SPECTRUM["threshold"]]
-                    + "📍"
-                    + progress_bar[INPUT_SPECTRUM["threshold"] :]
-                )
-
-            embed.add_field(
-                name=module_name_field,
-                value=f"{progress_bar}",
-                inline=False,
-            )
-    else:
-        for module_name in module_dict:
-            module = module_dict[module_name]["name"]
-            input_value = module_dict[module_name]["input_value"]
-            module_name_field = module.capitalize()
-            input_filled = int(min(input_value, INPUT_SPECTRUM["scale"]))
-            input_empty = INPUT_SPECTRUM["scale"] - input_filled
-
-            progress_bar = "🟦" * input_filled + "🟨" * input_empty
-            if module_dict == CULTURE_MODULES:
-                progress_bar = (
-                    progress_bar[: INPUT_SPECTRUM["threshold"]]
-                    + "📍"
-                    + progress_bar[INPUT_SPECTRUM["threshold"] :]
-                )
-
-            embed.add_field(
-                name=module_name_field,
-                value=f"{progress_bar}",
-                inline=False,
-            )
-
-    await context.send(embed=embed)
+    module: CultureModule = CULTURE_MODULES[module_name]
+    active = module.is_local_state_active_in_channel(guild_id, channel_id)
+    if reached and not active:
+        await module.activate_local_state_in_channel(ctx, guild_id, channel_id)
+        await ctx.send(f"```{module_name.capitalize()} module has been activated!```")
+    elif not reached and active:
+        await module.deactivate_local_state_in_channel(ctx, guild_id, channel_id)
+        await ctx.send(f"```{module_name.capitalize()} module has been deactivated```")
 
 
 # MESSAGE PROCESSING
-async def create_webhook(channel):
+def webhook_author(message):
     """
-    Create webhooks for having player avatars passed through to bot avatar
+    Webhook payload fields that make a repost appear under the message author
     """
-    global WEBHOOK_LIST
-    webhook = None
-    for wh in WEBHOOK_LIST:
-        if wh.channel.id == channel.id:
-            webhook = wh
-
-    if not webhook:
-        webhook = await channel.create_webhook(name="InternalWebhook")
-        WEBHOOK_LIST.append(webhook)
-
-    return webhook
+    return {
+        "username": message.author.nick if message.author.nick else message.author.name,
+        "avatar_url": message.author.avatar.url if message.author.avatar else None,
+    }
 
 
-async def send_webhook_message(webhook, message, filtered_message):
+async def send_webhook_message(message, filtered_message):
     """
     Use webhook to transform avatar of bot to user avatar
+
+    Posts go through the shared webhook delivery queue, which retries and paces them
     """
     try:
-        if webhook is None:
-            # Handle the case when webhook is not available
-            return
-        payload = {
-            "content": f"※ {filtered_message}",
-            "username": message.author.nick
-            if message.author.nick
-            else message.author.name,
-            "avatar_url": message.author.avatar.url if message.author.avatar else None,
-        }
-        await webhook.send(**payload)
+        payload = {"content": f"※ {filtered_message}", **webhook_author(message)}
+        result = await webhook_delivery.send(message.channel, payload)
+        if result is not None:
+            recent_messages.add(
+                message.channel.id,
+                int(result["id"]),
+                payload["username"],
+                result["content"],
+                is_repost=True,
+                author_id=message.author.id,
+            )
+        return result
     except (
         discord.errors.NotFound,
         discord.errors.Forbidden,
@@ -1930,92 +1893,125 @@ async def send_webhook_message(webhook, message, filtered_message):
         logging.error(error_msg)
 
 
-@tasks.loop(minutes=1.0)
-async def check_and_delete_webhooks_if_needed():
+@tasks.loop(minutes=WEBHOOK_RECONCILE["minutes"])
+async def reconcile_webhooks():
     """
-    Regularly check if the webhook limit has been reached and clear webhooks if necessary
+    Occasionally correct locally tracked webhook counts with one REST call per guild
+
+    Day-to-day accounting comes from our own creates and deletes and from webhook update events
     """
+    await asyncio.sleep(random.uniform(0, WEBHOOK_RECONCILE["jitter"]))
     for guild in bot.guilds:
-        webhook_count = 0
-        for channel in guild.text_channels:
-            webhooks = await channel.webhooks()
-            webhook_count += len(webhooks)
-        if webhook_count > 8:
-            await delete_all_webhooks(guild)
+        try:
+            webhook_count = await webhook_pool.reconcile(guild)
+        except discord.HTTPException as e:
+            logging.error(f"Webhook reconciliation failed for {guild.name}: {e}")
+            continue
+        print(f"Webhook check: # of webhooks in {guild.name}: {webhook_count}")
+
+
+async def handle_continuous_input(message, module_name, change):
+    """
+    Apply a "+1"/"-1" continuous input to a decision or culture module
+
+    Returns False if the message does not name a module, so it is processed as chat
+    """
+    # TODO: deduplicate and refactor this code
+    if module_name in CONTINUOUS_INPUT_DECISION_MODULES:
+        if (
+            not VOTE_RETRY
+        ):  # Decision modules can only be changed via continuous input during a vote retry.
+            return True
+        context = await bot.get_context(message)
+        decision_bucket = cooldowns["decisions"].get_bucket(message)
+        retry_after = decision_bucket.update_rate_limit()
+        if retry_after:
+            await context.send(
+                f"{context.author.mention}: Decision cooldown active, try again in {retry_after:.2f} seconds"
+            )
+            return True
+
+        decision_tally.add(module_name, change, message.author.id)
+        tally_board.show(message.channel, decision_tally, "Decision Display Status")
+        # The tally wakes the vote retry waiting for a winner, which switches the module
+        return True
+
+    if module_name in CULTURE_MODULES:
+        if message.channel.name != "d20-agora":
+            print(f"Continuous input module not found: {module_name}")
+            return True
+        context = await bot.get_context(message)
+        culture_bucket = cooldowns["cultures"].get_bucket(message)
+        retry_after = culture_bucket.update_rate_limit()
+        if retry_after:
+            await context.send(
+                f"{context.author.mention}: Culture cooldown active, try again in {retry_after:.2f} seconds"
+            )
+            return True
+
+        reached = culture_tally.add(module_name, change, message.author.id)
+        tally_board.show(message.channel, culture_tally, "Culture Display Status")
+        if reached is not None:
+            await apply_culture_threshold(
+                context, module_name, reached, message.guild.id, message.channel.id
+            )
+        return True
 
-    print(f"Webhook check: # of webhooks: {webhook_count}")
+    return False
 
 
-async def process_message(ctx, message):
+async def process_message(message):
     """
     Process messages from on_message
     """
-    guild_id = ctx.guild.id
-    channel_id = ctx.channel.id
-    key = (guild_id, channel_id)
+    if message.guild is None:
+        return
 
     if IS_QUIET and not message.author.bot:
         await message.delete()
     else:
-        # Check if any modes are active and deleted the original message
-        active_modules_by_channel = ACTIVE_MODULES_BY_CHANNEL.get(key, OrderedSet())
-        if active_modules_by_channel:
+        # Channels without active modules have no plan, so they stop at this lookup
+        plan: FilterPlan = FILTER_PLANS.get((message.guild.id, message.channel.id))
+        if plan is not None:
             message_content = message.content
-            if (
-                message_content == "check-values"
-                and "values" in active_modules_by_channel
-            ):
+            if message_content == "check-values" and "values" in plan.names:
+                ctx = await bot.get_context(message)
                 module_name: Values = CULTURE_MODULES["values"]
                 await module_name.check_values(bot, ctx, message)
                 return
 
-            message_content = message.content
-            delete_message = False
-            for module_name in active_modules_by_channel:
-                module: CultureModule = CULTURE_MODULES[module_name]
-                if module.config[
-                    "message_alter_mode"
-                ]:  # Not all culture modules filter messages; we only want to delete message and replace with webhook when we know it will be filtered
-                    delete_message = True
-                    break
-
+            # Not all culture modules filter messages; we only want to delete message
+            # and replace with webhook when we know it will be filtered.
             # We delete message before filtering because filtering has latency.
-            if delete_message:
+            if plan.alters_messages:
                 await message.delete()
-
+                recent_messages.discard(message.id)
+
+                # Streaming modules post the repost as their rewrite arrives
+                stream = WebhookStream(
+                    message.channel,
+                    webhook_author(message),
+                    webhook_delivery,
+                    prefix="※ ",
+                )
                 filtered_message = await apply_culture_modules(
-                    active_modules=active_modules_by_channel,
+                    active_modules=plan.modules,
                     message=message,
                     message_content=message_content,
+                    stream=stream,
                 )
 
-                webhook = await create_webhook(message.channel)
-                if module_name == "wildcard":
-                    get_module = CULTURE_MODULES.get("wildcard", None)
-                    llm_prompt = get_module.config["llm_disclosure"]
-                    prompt_result = f"{filtered_message}\n\n```Message filtered by the voice of group: {prompt_object.decision_one}.```"
-                    await send_webhook_message(webhook, message, prompt_result)
+                if "wildcard" in plan.names:
+                    filtered_message = f"{filtered_message}\n\n```Message filtered by the voice of group: {prompt_object.decision_one}.```"
+                # A streamed repost is completed in place, so it is never posted twice
+                if await stream.finish(filtered_message):
+                    recent_messages.add(
+                        message.channel.id,
+                        stream.message.id,
+                        stream.payload["username"],
+                        f"※ {filtered_message}",
+                        is_repost=True,
+                        author_id=message.author.id,
+                    )
                 else:
-                    await send_webhook_message(webhook, message, filtered_message)
-
-
-# TODO: write tests for culture module filtering
-async def apply_culture_modules(active_modules, message, message_content: str):
-    """
-    Filter messages based on culture modules
-
-    Filtering is cumulative
-
-    Order of application is derived from the active_global_culture_modules list
-    """
-
-    # Increment message count for the user (for diversity module)
-    user_id = message.author.id
-    USER_MESSAGE_COUNT[user_id] = USER_MESSAGE_COUNT.get(user_id, 0) + 1
-
-    # TODO: active_modules list should be the modules themselves, not their names
-    for module_name in active_modules:
-        module: CultureModule = CULTURE_MODULES[module_name]
-        message_content = await module.filter_message(message, message_content)
-
-    return message_content
+                    await send_webhook_message(message, filtered_message)
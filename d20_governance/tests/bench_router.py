@@ -0,0 +1,86 @@
+"""
+Microbenchmark of the on_message prelude for ordinary chat traffic
+
+Compares building a command context for every message before classifying it, as
+on_message used to, with classifying the raw message first. Not collected by
+pytest; run with `python -m d20_governance.tests.bench_router`.
+"""
+import time
+import asyncio
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+
+from d20_governance.utils.router import CHAT, classify_message
+
+MESSAGES = 20000
+BOT_USER_ID = 1
+
+
+def create_messages():
+    author = SimpleNamespace(id=2, bot=False)
+    channel = SimpleNamespace(id=3)
+    guild = SimpleNamespace(id=4)
+    contents = [
+        "has anyone read the proposal yet?",
+        "I think we should vote on it tomorrow",
+        "wildcard +1",
+        "※ Prithee, hark: a storm approaches",
+    ]
+    return [
+        SimpleNamespace(
+            id=i,
+            content=contents[i % len(contents)],
+            author=author,
+            channel=channel,
+            guild=guild,
+            _state=None,
+        )
+        for i in range(MESSAGES)
+    ]
+
+
+async def context_first(bot, messages):
+    for message in messages:
+        context = await bot.get_context(message)
+        if message.author.id == bot.user.id:
+            continue
+        if message.content.startswith("-help"):
+            continue
+        if message.content.startswith("/"):
+            continue
+        if message.content.startswith("-"):
+            continue
+        if message.content.startswith("※"):
+            continue
+        message_split = message.content.strip().split(" ")
+        if len(message_split) >= 2 and message_split[-1] in ("+1", "-1"):
+            continue
+
+
+async def classify_first(bot, messages):
+    for message in messages:
+        kind, _ = classify_message(message, BOT_USER_ID)
+        if kind != CHAT:
+            continue
+
+
+async def main():
+    bot = commands.Bot(command_prefix="-", intents=discord.Intents.default())
+    bot._connection.user = SimpleNamespace(id=BOT_USER_ID)
+    messages = create_messages()
+
+    results = {}
+    for name, prelude in (("context first", context_first), ("router", classify_first)):
+        started = time.perf_counter()
+        await prelude(bot, messages)
+        results[name] = time.perf_counter() - started
+
+    for name, elapsed in results.items():
+        print(f"{name:>14}: {MESSAGES / elapsed:>12,.0f} messages/s")
+    print(f"{'speedup':>14}: {results['context first'] / results['router']:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+import random
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from d20_governance.utils.auditor import Reservoir, ValuesAuditor
+from d20_governance.utils.constants import VALUES_AUDIT
+from d20_governance.utils.history import RecentMessageStore
+
+
+class TestReservoir(unittest.TestCase):
+    def test_sample_stays_bounded_and_covers_the_stream(self):
+        reservoir = Reservoir(5, rng=random.Random(0))
+        for i in range(1000):
+            reservoir.add(i)
+
+        sample = reservoir.take()
+        self.assertEqual(len(sample), 5)
+        self.assertTrue(any(i >= 500 for i in sample))
+        self.assertEqual((reservoir.items, reservoir.seen), ([], 0))
+
+
+class TestValuesAuditor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.store = RecentMessageStore()
+        self.toggles = []
+        self.auditor = ValuesAuditor(
+            store=self.store,
+            toggles=self.toggles,
+            settings={**VALUES_AUDIT, "guild_capacity": 1, "guild_refill": 0.001},
+        )
+        self.auditor.values = MagicMock()
+        self.toggle(1, 10, "values", True)
+        self.auditor.values.analyze_many = AsyncMock(
+            side_effect=lambda guild, texts: {
+                text: ("...", "misaligned" if "hate" in text else "aligned")
+                for text in texts
+            }
+        )
+        self.members = {}
+        self.guild = MagicMock()
+        self.guild.get_member = lambda member_id: self.members.setdefault(
+            member_id, MagicMock(roles=[])
+        )
+        self.bot = MagicMock()
+        self.bot.get_guild.return_value = self.guild
+
+    def toggle(self, *args):
+        for listener in self.toggles:
+            listener(*args)
+
+    async def test_audit_scores_active_channels_within_budget(self):
+        self.store.add(10, 1, "a", "I hate this", author_id=100)
+        self.store.add(10, 2, "a", "ok, fair point", author_id=100)
+        self.store.add(10, 3, "b", "I hate it too", author_id=200)
+        self.store.add(99, 4, "c", "not audited", author_id=300)
+
+        with patch("d20_governance.utils.auditor.assign_role_to_user") as assign_role:
+            await self.auditor.audit(self.bot)
+            self.store.add(10, 5, "b", "again", author_id=200)
+            await self.auditor.audit(self.bot)
+
+        self.auditor.values.analyze_many.assert_awaited_once()
+        assigned = sorted(
+            (call.args[0] is self.members[100], call.args[1])
+            for call in assign_role.call_args_list
+        )
+        # Author 100's latest message decides their role
+        self.assertEqual(assigned, [(False, "Misaligned"), (True, "Aligned")])
+        self.assertEqual(self.auditor.metrics["over_budget"], 1)
+        self.assertNotIn(99, self.auditor.reservoirs)
+
+    async def test_run_survives_failed_audits(self):
+        self.auditor.settings = {**self.auditor.settings, "interval": (0, 0)}
+        audits = 0
+
+        async def audit(bot):
+            nonlocal audits
+            audits += 1
+            raise RuntimeError("LLM unavailable")
+
+        with patch.object(self.auditor, "audit", audit):
+            auditor_task = self.auditor.start(self.bot)
+            self.assertIs(self.auditor.start(self.bot), auditor_task)
+            for _ in range(5):
+                await asyncio.sleep(0)
+            self.assertFalse(auditor_task.done())
+            auditor_task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await auditor_task
+        self.assertGreater(audits, 1)
+
+    async def test_runs_only_while_a_channel_is_audited(self):
+        self.toggle(1, 20, "values", True)
+        auditor_task = self.auditor.start(self.bot)
+        self.store.add(10, 1, "a", "I hate this", author_id=100)
+
+        # Archiving one channel drops its sample but keeps auditing the other
+        self.auditor.release(10)
+        self.assertNotIn(10, self.auditor.reservoirs)
+        self.assertIs(self.auditor.task, auditor_task)
+
+        self.toggle(1, 20, "values", False)
+        self.assertIsNone(self.auditor.task)
+        with self.assertRaises(asyncio.CancelledError):
+            await auditor_task
+
+        # Other modules do not matter, activating values again restarts the audit
+        self.toggle(1, 30, "amplify", True)
+        self.assertIsNone(self.auditor.task)
+        self.toggle(1, 30, "values", True)
+        self.assertFalse(self.auditor.task.done())
+        self.auditor.stop()
+
+    async def test_run_stops_when_cancelled(self):
+        auditor_task = asyncio.create_task(self.auditor.run(self.bot))
+        await asyncio.sleep(0)
+        auditor_task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await auditor_task
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from d20_governance.utils.cultures import (
+    CULTURE_MODULES,
+    FILTER_PLANS,
+    LatencyHistogram,
+    alignment_cache,
+    apply_culture_modules,
+    filter_timeouts,
+    hash_values,
+    toggle_culture_module,
+    value_revision_manager,
+)
+from d20_governance.utils.llm import LLMProvider
+
+
+def create_fake_provider():
+    return LLMProvider(
+        backend="fake",
+        fake_settings={
+            "latency": {"distribution": "fixed", "seconds": 0},
+            "error_rate": 0.0,
+            "seed": 0,
+        },
+    )
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_use_bucket_bounds(self):
+        histogram = LatencyHistogram(buckets=(0.1, 1, 10))
+        for seconds in [0.05] * 90 + [0.5] * 9 + [5]:
+            histogram.observe(seconds)
+
+        self.assertEqual(
+            histogram.snapshot(), {"count": 100, "p50": 0.1, "p95": 1, "p99": 1}
+        )
+        histogram.observe(60)
+        self.assertEqual(histogram.percentile(100), float("inf"))
+
+
+class TestFilterPlans(unittest.IsolatedAsyncioTestCase):
+    async def test_plan_follows_toggles(self):
+        key = (1, 2)
+        await toggle_culture_module(*key, "values", True)
+        self.assertEqual(FILTER_PLANS[key].names, ("values",))
+        self.assertFalse(FILTER_PLANS[key].alters_messages)
+
+        await toggle_culture_module(*key, "amplify", True)
+        self.assertEqual(FILTER_PLANS[key].names, ("values", "amplify"))
+        self.assertIs(FILTER_PLANS[key].modules[1], CULTURE_MODULES["amplify"])
+        self.assertTrue(FILTER_PLANS[key].alters_messages)
+
+        await toggle_culture_module(*key, "values", False)
+        await toggle_culture_module(*key, "amplify", False)
+        self.assertNotIn(key, FILTER_PLANS)
+
+
+class TestApplyCultureModules(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_llm_module_falls_back_to_text_filters(self):
+        async def stalled(message, message_string):
+            await asyncio.sleep(10)
+
+        amplify = CULTURE_MODULES["amplify"]
+        obscurity = CULTURE_MODULES["obscurity"]
+        timeouts = filter_timeouts["amplify"]
+        with patch.object(amplify, "filter_message", stalled), patch.dict(
+            amplify.config, {"llm_timeout": 0.01}
+        ), patch.dict(obscurity.config, {"mode": "camel_case"}):
+            filtered = await apply_culture_modules(
+                (obscurity, amplify), MagicMock(), "hello there"
+            )
+
+        self.assertEqual(filtered, "HelloThere")
+        self.assertEqual(filter_timeouts["amplify"], timeouts + 1)
+
+    async def test_last_module_streams_tokens(self):
+        provider = create_fake_provider()
+        stream = MagicMock()
+        tokens = []
+
+        async def feed(token):
+            tokens.append(token)
+
+        stream.feed = feed
+
+        with patch("d20_governance.utils.cultures.llm_provider", provider):
+            filtered = await apply_culture_modules(
+                (CULTURE_MODULES["amplify"],), MagicMock(), "we did it", stream=stream
+            )
+
+        self.assertEqual(filtered, "WE DID IT!!!")
+        self.assertEqual("".join(tokens), filtered)
+        self.assertGreater(len(tokens), 1)
+
+
+class TestValuesAlignment(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        alignment_cache.clear()
+        self.provider = create_fake_provider()
+        self.values = CULTURE_MODULES["values"]
+
+    def llm_calls(self):
+        return sum(client.calls for client in self.provider.clients.values())
+
+    async def test_repeated_checks_hit_the_cache_until_values_change(self):
+        with patch("d20_governance.utils.cultures.llm_provider", self.provider):
+            first = await self.values.analyze(MagicMock(), "let's help each other")
+            second = await self.values.analyze(MagicMock(), "let's help each other")
+            self.assertEqual(first, second)
+            self.assertEqual(self.llm_calls(), 1)
+
+            values_dict = dict(value_revision_manager.agora_values_dict)
+            values_list = self.values.config["values_list"]
+            try:
+                await value_revision_manager.update_values_dict(
+                    "Trust", {"Honesty": "We tell each other the truth."}
+                )
+                await self.values.analyze(MagicMock(), "let's help each other")
+            finally:
+                value_revision_manager.agora_values_dict = values_dict
+                value_revision_manager.values_hash = hash_values(values_dict)
+                self.values.config["values_list"] = values_list
+
+        self.assertEqual(self.llm_calls(), 2)
+
+    async def test_batch_scores_messages_in_one_call(self):
+        texts = ["I hate this plan", "great idea, thanks", "never again", "sure"]
+        with patch("d20_governance.utils.cultures.llm_provider", self.provider):
+            verdicts = await self.values.analyze_many(MagicMock(), texts)
+            cached = await self.values.analyze(MagicMock(), "great idea, thanks")
+
+        self.assertEqual(self.llm_calls(), 1)
+        self.assertEqual(
+            [verdicts[text][1] for text in texts],
+            ["misaligned", "aligned", "misaligned", "aligned"],
+        )
+        self.assertEqual(cached, verdicts["great idea, thanks"])
+        self.assertTrue(cached[0].startswith("This message aligns with our values"))
+
+
+if __name__ == "__main__":
+    unittest.main()
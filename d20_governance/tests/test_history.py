@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from d20_governance.utils.history import RecentMessage, RecentMessageStore
+
+
+def create_message(message_id, content, bot=False):
+    mock_message = MagicMock()
+    mock_message.id = message_id
+    mock_message.content = content
+    mock_message.author.bot = bot
+    return mock_message
+
+
+def create_channel(channel_id, history=()):
+    mock_channel = MagicMock()
+    mock_channel.id = channel_id
+
+    async def fetch_history(limit):
+        for message in history[:limit]:
+            yield message
+
+    mock_channel.history = MagicMock(side_effect=fetch_history)
+    return mock_channel
+
+
+class TestRecentMessageStore(unittest.IsolatedAsyncioTestCase):
+    async def test_previous_skips_current_message_and_commands(self):
+        store = RecentMessageStore(depth=5)
+        store.add(1, 10, "a", "the river is rising")
+        store.add(1, 11, "a", "-vote")
+        store.add(1, 12, "d20", "bot status", is_repost=True)
+        store.add(1, 13, "b", "※ we should build a dam", is_repost=True)
+        store.add(1, 14, "a", "no, a bridge")
+
+        previous = await store.previous(create_channel(1), exclude_id=14)
+
+        self.assertEqual(previous.content, "※ we should build a dam")
+        self.assertTrue(previous.is_repost)
+
+    async def test_backfills_only_on_cold_start(self):
+        store = RecentMessageStore(depth=5)
+        # Discord returns history newest first
+        channel = create_channel(
+            1, [create_message(2, "second"), create_message(1, "first")]
+        )
+        store.add(1, 3, "a", "third")
+
+        self.assertEqual(
+            (await store.previous(channel, exclude_id=3)).content, "second"
+        )
+        self.assertEqual(
+            (await store.previous(channel, exclude_id=3)).content, "second"
+        )
+        channel.history.assert_called_once()
+        self.assertEqual([record.id for record in store.recent(1)], [1, 2, 3])
+
+    async def test_cancelled_reader_does_not_cancel_the_backfill(self):
+        store = RecentMessageStore(depth=5)
+        fetched = asyncio.Event()
+
+        async def slow_history(limit):
+            await fetched.wait()
+            yield create_message(1, "first")
+
+        channel = create_channel(1)
+        channel.history = MagicMock(side_effect=slow_history)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(store.previous(channel, exclude_id=2), 0.01)
+        fetched.set()
+
+        self.assertEqual((await store.previous(channel, exclude_id=2)).content, "first")
+        channel.history.assert_called_once()
+
+    async def test_cancelled_backfill_is_retried(self):
+        store = RecentMessageStore(depth=5)
+        channel = create_channel(1, [create_message(1, "first")])
+        backfill = asyncio.get_running_loop().create_future()
+        backfill.cancel()
+        store.backfills[1] = backfill
+
+        self.assertEqual((await store.previous(channel, exclude_id=2)).content, "first")
+
+    async def test_empty_channel_has_no_previous_message(self):
+        store = RecentMessageStore(depth=5)
+        self.assertIsNone(await store.previous(create_channel(1), exclude_id=1))
+
+    def test_depth_and_channel_limits_keep_id_index_in_sync(self):
+        store = RecentMessageStore(depth=2, max_channels=2)
+        for message_id in range(3):
+            store.add(1, message_id, "a", f"message {message_id}")
+        store.add(2, 10, "a", "hello")
+        store.add(1, 3, "a", "channel 1 is active again")
+        store.add(3, 20, "a", "channel 2 is dropped")
+
+        self.assertIsNone(store.get(0))
+        self.assertIsNone(store.get(10))
+        self.assertEqual(store.get(2).content, "message 2")
+        self.assertEqual(list(store.channels), [1, 3])
+        self.assertEqual(len(store.by_id), 3)
+
+    def test_records_use_slots(self):
+        record = RecentMessageStore().add(1, 1, "a", "hi")
+        self.assertIsInstance(record, RecentMessage)
+        self.assertFalse(hasattr(record, "__dict__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
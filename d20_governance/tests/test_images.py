@@ -0,0 +1,147 @@
+import os
+import base64
+import asyncio
+import tempfile
+import unittest
+
+from aiohttp import web
+
+from d20_governance.utils.constants import STABILITY_CLIENT
+from d20_governance.utils.images import (
+    ImageCache,
+    ImageGenerationError,
+    StabilityClient,
+)
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\nfake"
+
+
+class TestStabilityClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+        self.responses = []
+
+        async def text_to_image(request):
+            self.requests.append(await request.json())
+            status = self.responses.pop(0) if self.responses else 200
+            if status != 200:
+                return web.json_response({"message": "error"}, status=status)
+            return web.json_response(
+                {"artifacts": [{"base64": base64.b64encode(PNG_BYTES).decode()}]}
+            )
+
+        app = web.Application()
+        app.router.add_post("/v1/generation/{engine}/text-to-image", text_to_image)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        self.client = StabilityClient(
+            api_host=f"http://127.0.0.1:{port}",
+            engine_id="test-engine",
+            token="token",
+            settings={**STABILITY_CLIENT, "backoff": 0.01},
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.runner.cleanup()
+
+    async def test_returns_image_bytes(self):
+        image_data = await self.client.generate("a dragon")
+        self.assertEqual(image_data, PNG_BYTES)
+        self.assertEqual(self.requests[0]["text_prompts"], [{"text": "a dragon"}])
+
+    async def test_retries_server_errors(self):
+        self.responses = [503, 429]
+        image_data = await self.client.generate("a dragon")
+        self.assertEqual(image_data, PNG_BYTES)
+        self.assertEqual(self.client.metrics["retried"], 2)
+
+    async def test_client_error_is_not_retried(self):
+        self.responses = [400]
+        with self.assertRaises(ImageGenerationError):
+            await self.client.generate("a dragon")
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_cached_prompts_are_generated_once(self):
+        self.client.cache = ImageCache(path=tempfile.mkdtemp())
+
+        await asyncio.gather(*(self.client.generate("a dragon") for _ in range(3)))
+        image_data = await self.client.generate("a dragon")
+
+        self.assertEqual(image_data, PNG_BYTES)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_pregenerate_warms_unique_prompts(self):
+        self.client.cache = ImageCache(path=tempfile.mkdtemp())
+
+        generated = await self.client.pregenerate(["a", "b", "a"])
+
+        self.assertEqual(generated, 2)
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_cancelling_last_caller_cancels_the_request(self):
+        self.client.cache = ImageCache(path=tempfile.mkdtemp())
+        started = asyncio.Event()
+        cancelled = []
+
+        async def request(payload):
+            started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(payload["text_prompts"][0]["text"])
+                raise
+
+        self.client._request = request
+        caller = asyncio.create_task(self.client.generate("a dragon"))
+        warmer = asyncio.create_task(self.client.pregenerate(["a dragon"]))
+        await started.wait()
+
+        # Another caller still waits on the request, so it keeps running
+        caller.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, [])
+
+        warmer.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await warmer
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, ["a dragon"])
+        self.assertEqual((self.client.pending, self.client.waiters), ({}, {}))
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def test_evicts_least_recently_used(self):
+        cache = ImageCache(path=self.path, max_bytes=20)
+        cache.put("a", b"0" * 10)
+        cache.put("b", b"1" * 10)
+        cache.get("a")  # b is now least recently used
+        cache.put("c", b"2" * 10)
+
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertFalse(os.path.exists(os.path.join(self.path, "b.png")))
+
+    def test_reloads_from_disk(self):
+        ImageCache(path=self.path).put("a", PNG_BYTES)
+        self.assertEqual(ImageCache(path=self.path).get("a"), PNG_BYTES)
+
+    def test_key_depends_on_engine_and_parameters(self):
+        payload = {"text_prompts": [{"text": "a"}], "steps": 10}
+        self.assertNotEqual(
+            ImageCache.key("engine-a", payload), ImageCache.key("engine-b", payload)
+        )
+        self.assertNotEqual(
+            ImageCache.key("engine-a", payload),
+            ImageCache.key("engine-a", {**payload, "steps": 20}),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from d20_governance.utils.constants import LLM_GOVERNOR
+from d20_governance.utils.cultures import CULTURE_MODULES
+from d20_governance.utils.llm import (
+    FakeLLM,
+    FakeLLMError,
+    LLMGovernor,
+    LLMProvider,
+    LLMRejected,
+)
+
+NO_LATENCY = {"distribution": "fixed", "seconds": 0}
+
+
+class TestFakeLLM(unittest.IsolatedAsyncioTestCase):
+    def test_rules_are_deterministic(self):
+        llm = FakeLLM(latency=NO_LATENCY)
+        prompt = "Please rewrite this in the Shakespearean era. Input: hello there"
+        self.assertEqual(llm(prompt), llm(prompt))
+        self.assertEqual(llm(prompt), "Prithee, hark: hello there")
+
+    def test_error_rate(self):
+        llm = FakeLLM(latency=NO_LATENCY, error_rate=1.0)
+        with self.assertRaises(FakeLLMError):
+            llm("anything")
+
+    def test_seeded_latency_is_reproducible(self):
+        latency = {"distribution": "lognormal", "median": 0.5, "sigma": 0.5}
+        first = FakeLLM(latency=latency, seed=1)
+        second = FakeLLM(latency=latency, seed=1)
+        self.assertEqual(
+            [first.sample_latency() for _ in range(5)],
+            [second.sample_latency() for _ in range(5)],
+        )
+
+    async def test_culture_modules_run_offline(self):
+        provider = LLMProvider(
+            backend="fake",
+            fake_settings={"latency": NO_LATENCY, "error_rate": 0.0, "seed": 0},
+        )
+        with patch("d20_governance.utils.cultures.llm_provider", provider):
+            amplified = await CULTURE_MODULES["amplify"].filter_message(
+                MagicMock(), "we did it"
+            )
+            _, alignment = await CULTURE_MODULES["values"].llm_analyze_values(
+                {"Kindness": "be kind"}, "I hate this"
+            )
+
+        self.assertEqual(amplified, "WE DID IT!!!")
+        self.assertEqual(alignment, "misaligned")
+
+    def test_provider_reuses_clients(self):
+        provider = LLMProvider(backend="fake")
+        self.assertIs(provider.get(temperature=0.1), provider.get(temperature=0.1))
+        self.assertIsNot(provider.get(temperature=0.1), provider.get(temperature=0.5))
+
+
+class TestLLMGovernor(unittest.IsolatedAsyncioTestCase):
+    async def test_urgent_lanes_go_first(self):
+        governor = LLMGovernor(settings={**LLM_GOVERNOR, "concurrency": 1})
+        gate = asyncio.Event()
+        order = []
+
+        async def call(name):
+            order.append(name)
+            await gate.wait()
+
+        first = asyncio.create_task(governor.run(lambda: call("first"), "wildcard"))
+        await asyncio.sleep(0)
+        queued = [
+            asyncio.create_task(governor.run(lambda n=n: call(n), n, priority=n))
+            for n in ("cosmetic", "values", "narration")
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *queued)
+
+        self.assertEqual(order, ["first", "narration", "values", "cosmetic"])
+        self.assertGreater(governor.snapshot()["queue_wait"]["cosmetic"]["max"], 0)
+
+    async def test_concurrency_is_bounded(self):
+        governor = LLMGovernor(settings={**LLM_GOVERNOR, "concurrency": 2})
+        running = []
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            running.append(1)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        await asyncio.gather(
+            *(governor.run(call, "quest", priority="narration") for _ in range(6))
+        )
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(governor.snapshot()["completed"], 6)
+
+    async def test_exhausted_module_budget_is_rejected(self):
+        governor = LLMGovernor(
+            settings={**LLM_GOVERNOR, "module_capacity": 2, "module_refill": 0.001}
+        )
+
+        async def call():
+            return "ok"
+
+        for _ in range(2):
+            self.assertEqual(await governor.run(call, "eloquence", guild_id=1), "ok")
+        with self.assertRaises(LLMRejected):
+            await governor.run(call, "eloquence", guild_id=1)
+        # Narration is not budgeted and other modules have their own bucket
+        self.assertEqual(
+            await governor.run(call, "eloquence", priority="narration"), "ok"
+        )
+        self.assertEqual(await governor.run(call, "amplify", guild_id=1), "ok")
+        self.assertEqual(governor.snapshot()["rejected"]["module_budget"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
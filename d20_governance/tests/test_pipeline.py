@@ -0,0 +1,53 @@
+import asyncio
+import unittest
+
+from d20_governance.utils.pipeline import PreparedStage, StagePipeline
+
+
+class TestStagePipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_prepares_ahead_within_lookahead(self):
+        prepared_names = []
+
+        async def prepare(stage):
+            prepared_names.append(stage)
+            return PreparedStage(stage, embed=None)
+
+        pipeline = StagePipeline(["a", "b", "c", "d", "e"], prepare, lookahead=2)
+        pipeline.start()
+
+        first = await pipeline.next()
+        await asyncio.sleep(0.01)  # let the producer run while "a" plays
+
+        self.assertEqual(first.stage, "a")
+        # Two stages wait in the queue and one more is prepared but blocked
+        self.assertEqual(prepared_names, ["a", "b", "c", "d"])
+        pipeline.close()
+
+    async def test_records_transition_gaps(self):
+        async def prepare(stage):
+            return PreparedStage(stage, embed=None)
+
+        pipeline = StagePipeline(["a", "b"], prepare)
+        pipeline.start()
+
+        played = []
+        while (prepared := await pipeline.next()) is not None:
+            played.append(prepared.stage)
+            pipeline.finish_stage()
+
+        self.assertEqual(played, ["a", "b"])
+        self.assertEqual(len(pipeline.gaps), 1)
+
+    async def test_raises_preparation_errors(self):
+        async def prepare(stage):
+            raise ValueError("tts failed")
+
+        pipeline = StagePipeline(["a"], prepare)
+        pipeline.start()
+
+        with self.assertRaises(ValueError):
+            await pipeline.next()
+
+
+if __name__ == "__main__":
+    unittest.main()
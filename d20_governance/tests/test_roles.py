@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
+
+from d20_governance.utils.cultures import assign_role_to_user
+from d20_governance.utils.roles import RoleCoalescer
+
+
+def create_role(role_id, name):
+    mock_role = MagicMock()
+    mock_role.id = role_id
+    mock_role.name = name
+    return mock_role
+
+
+def create_member(guild, roles):
+    mock_member = MagicMock()
+    mock_member.id = 100
+    mock_member.guild = guild
+    mock_member.roles = roles
+    mock_member.edit = AsyncMock()
+    return mock_member
+
+
+class TestRoleCoalescer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        async def submit(factory, **kwargs):
+            return await factory()
+
+        self.scheduler = MagicMock()
+        self.scheduler.submit = AsyncMock(side_effect=submit)
+        self.coalescer = RoleCoalescer(scheduler=self.scheduler, debounce=0.01)
+        self.guild = MagicMock(id=1)
+        self.everyone = create_role(1, "@everyone")
+        self.aligned = create_role(2, "Aligned")
+        self.misaligned = create_role(3, "Misaligned")
+        self.player = create_role(4, "Player")
+        self.guild.roles = [self.everyone, self.aligned, self.misaligned, self.player]
+
+    async def test_burst_becomes_one_edit_with_net_roles(self):
+        member = create_member(self.guild, [self.everyone, self.player, self.aligned])
+
+        self.coalescer.change(member, add=["Misaligned"], remove=["Aligned"])
+        self.coalescer.change(member, add=["Aligned"], remove=["Misaligned"])
+        await self.coalescer.change(member, add=["Misaligned"], remove=["Aligned"])
+
+        member.edit.assert_awaited_once_with(roles=[self.player, self.misaligned])
+
+    async def test_net_no_op_skips_the_edit(self):
+        member = create_member(self.guild, [self.everyone, self.aligned])
+
+        self.coalescer.change(member, add=["Misaligned"], remove=["Aligned"])
+        await self.coalescer.change(member, add=["Aligned"], remove=["Misaligned"])
+
+        member.edit.assert_not_called()
+        self.assertEqual(self.coalescer.metrics["unchanged"], 1)
+
+    async def test_roles_are_looked_up_once_per_guild(self):
+        guild = MagicMock(id=1)
+        roles = PropertyMock(return_value=[self.aligned, self.misaligned])
+        type(guild).roles = roles
+        for _ in range(3):
+            self.assertIs(self.coalescer.role(guild, "Aligned"), self.aligned)
+        roles.assert_called_once()
+
+    async def test_assign_role_swaps_alignment_roles(self):
+        member = create_member(self.guild, [self.everyone, self.misaligned])
+        with patch("d20_governance.utils.cultures.role_changes", self.coalescer):
+            await assign_role_to_user(member, "Aligned")
+
+        member.edit.assert_awaited_once_with(roles=[self.aligned])
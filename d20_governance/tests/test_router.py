@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import MagicMock
+
+from d20_governance.utils.router import (
+    CHAT,
+    COMMAND,
+    ECHO,
+    INPUT,
+    OWN,
+    classify_message,
+)
+
+BOT_USER_ID = 1
+
+
+def create_message(content, author_id=2):
+    mock_message = MagicMock()
+    mock_message.content = content
+    mock_message.author.id = author_id
+    return mock_message
+
+
+class TestClassifyMessage(unittest.TestCase):
+    def test_kinds(self):
+        cases = [
+            (create_message("※ hello", author_id=BOT_USER_ID), (OWN, None)),
+            (create_message("-help"), (COMMAND, None)),
+            (create_message("/vote"), (COMMAND, None)),
+            (create_message("※ reposted"), (ECHO, None)),
+            (create_message("wildcard +1"), (INPUT, ("wildcard", 1))),
+            (create_message("  consensus   -1 "), (INPUT, ("consensus", -1))),
+            (create_message("hello everyone"), (CHAT, None)),
+        ]
+        for message, expected in cases:
+            with self.subTest(content=message.content):
+                self.assertEqual(classify_message(message, BOT_USER_ID), expected)
+
+    def test_bare_increment_is_chat(self):
+        self.assertEqual(
+            classify_message(create_message(" +1"), BOT_USER_ID), (CHAT, None)
+        )
+        self.assertEqual(
+            classify_message(create_message("a+1"), BOT_USER_ID), (CHAT, None)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from d20_governance.utils.constants import REST_PRIORITIES
+from d20_governance.utils.scheduler import RestScheduler, TokenBucket
+
+
+def create_message(message_id=1, channel_id=1):
+    mock_message = MagicMock()
+    mock_message.id = message_id
+    mock_message.channel.id = channel_id
+    mock_message.edit = AsyncMock()
+    return mock_message
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_take_until_empty(self):
+        bucket = TokenBucket(capacity=2, refill_rate=1.0)
+        self.assertTrue(bucket.try_take())
+        self.assertTrue(bucket.try_take())
+        self.assertFalse(bucket.try_take())
+        self.assertGreater(bucket.wait_time(), 0)
+
+
+class TestRestScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_superseded_edits_are_dropped(self):
+        scheduler = RestScheduler(
+            settings={"concurrency": 10, "route_capacity": 5, "route_refill": 1.0}
+        )
+        message = create_message()
+
+        await asyncio.gather(
+            *(scheduler.edit(message, content=str(i)) for i in range(10))
+        )
+
+        message.edit.assert_called_with(content="9")
+        self.assertLess(message.edit.call_count, 10)
+        self.assertEqual(scheduler.metrics["superseded"] + message.edit.call_count, 10)
+
+    async def test_higher_priority_runs_first(self):
+        scheduler = RestScheduler(
+            settings={"concurrency": 1, "route_capacity": 5, "route_refill": 1.0},
+            priorities=REST_PRIORITIES,
+        )
+        order = []
+
+        def record(name):
+            async def call():
+                order.append(name)
+
+            return call
+
+        await asyncio.gather(
+            scheduler.submit(record("cosmetic"), route="a", priority="cosmetic"),
+            scheduler.submit(record("maintenance"), route="a", priority="maintenance"),
+            scheduler.submit(record("repost"), route="a", priority="repost"),
+        )
+
+        self.assertEqual(order, ["repost", "cosmetic", "maintenance"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import MagicMock
+
+from langchain import LLMChain, PromptTemplate
+from langchain.llms.fake import FakeListLLM
+
+from d20_governance.utils.stage_generator import (
+    StageGenerationError,
+    StageGenerator,
+    StageSummaryMemory,
+    StageValidationError,
+    parse_stage,
+)
+
+VALID_STAGE = """
+- stage: The Vote
+  message: A storm approaches the village.
+  actions:
+    - action: "vote_governance culture"
+"""
+
+
+class TestParseStage(unittest.TestCase):
+    def test_valid_stage_gets_defaults(self):
+        stage = parse_stage(VALID_STAGE)
+        self.assertEqual(stage["stage"], "The Vote")
+        self.assertEqual(stage["actions"], [{"action": "vote_governance culture"}])
+        self.assertEqual(stage["progress_conditions"], [])
+
+    def test_identical_output_is_parsed_once(self):
+        self.assertIs(parse_stage(VALID_STAGE), parse_stage(VALID_STAGE))
+
+    def test_rejects_raw_action_string(self):
+        with self.assertRaises(StageValidationError):
+            parse_stage('stage: a\nmessage: b\nactions: "vote_governance culture"')
+
+    def test_rejects_empty_or_unparsable_actions(self):
+        # The second one is valid yaml but has an unbalanced quote for shlex
+        for action in ('""', '"vote_governance \'culture"'):
+            with self.subTest(action=action), self.assertRaises(StageValidationError):
+                parse_stage(f"stage: a\nmessage: b\nactions:\n  - action: {action}")
+
+    def test_rejects_missing_message(self):
+        with self.assertRaises(StageValidationError):
+            parse_stage("stage: a\nactions: []")
+
+
+class TestStageGenerator(unittest.IsolatedAsyncioTestCase):
+    async def test_prefetches_next_stage(self):
+        llm_chain = MagicMock()
+        llm_chain.predict.return_value = VALID_STAGE
+        generator = StageGenerator(llm_chain, num_stages=3)
+
+        played = []
+        async for stage in generator.stages():
+            played.append(stage)
+        self.assertEqual(len(played), 3)
+        self.assertEqual(llm_chain.predict.call_count, 3)
+
+    async def test_retries_invalid_output(self):
+        llm_chain = MagicMock()
+        llm_chain.predict.side_effect = ["not: [valid", VALID_STAGE]
+        generator = StageGenerator(llm_chain, num_stages=1)
+
+        played = [stage async for stage in generator.stages()]
+
+        self.assertEqual(played[0]["stage"], "The Vote")
+
+    async def test_gives_up_after_max_attempts(self):
+        llm_chain = MagicMock()
+        llm_chain.predict.return_value = "just prose"
+        generator = StageGenerator(
+            llm_chain,
+            num_stages=1,
+            settings={"max_attempts": 2, "memory_window": 4, "parse_cache_size": 8},
+        )
+
+        with self.assertRaises(StageGenerationError):
+            async for _ in generator.stages():
+                pass
+        self.assertEqual(llm_chain.predict.call_count, 2)
+
+
+class TestStageSummaryMemory(unittest.IsolatedAsyncioTestCase):
+    async def test_prompt_size_stays_flat_over_ten_stages(self):
+        prompt = PromptTemplate(
+            input_variables=["chat_history", "human_input"],
+            template="{chat_history}\nHuman: {human_input}\nChatbot:",
+        )
+        memory = StageSummaryMemory(
+            llm=FakeListLLM(responses=["The story so far."] * 10),
+            k=2,
+            summarize_every=2,
+        )
+        llm_chain = LLMChain(
+            llm=FakeListLLM(responses=[VALID_STAGE] * 10),
+            prompt=prompt,
+            memory=memory,
+        )
+        generator = StageGenerator(llm_chain, num_stages=10)
+
+        async for _ in generator.stages():
+            pass
+
+        self.assertEqual(memory.summaries, 4)
+        self.assertLessEqual(len(memory.buffer), 2)
+        # Once the window is full, prompt size repeats with each summary cycle
+        # instead of growing with quest length
+        steady_state = generator.prompt_tokens[4:6]
+        self.assertEqual(generator.prompt_tokens[6:8], steady_state)
+        self.assertEqual(generator.prompt_tokens[8:10], steady_state)
+
+
+if __name__ == "__main__":
+    unittest.main()
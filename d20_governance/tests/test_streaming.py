@@ -0,0 +1,89 @@
+import time
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from d20_governance.utils.constants import STREAMING
+from d20_governance.utils.streaming import EditCoalescer, WebhookStream
+
+
+def create_message(message_id=1, channel_id=1):
+    mock_message = MagicMock()
+    mock_message.id = message_id
+    mock_message.channel.id = channel_id
+    return mock_message
+
+
+class TestEditCoalescer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.scheduler = MagicMock()
+        self.scheduler.edit = AsyncMock()
+        self.coalescer = EditCoalescer(scheduler=self.scheduler, min_interval=0.05)
+
+    async def test_sends_latest_content_only(self):
+        message = create_message()
+
+        for i in range(20):
+            self.coalescer.update(message, content=str(i))
+        await self.coalescer.flush(message)
+
+        self.scheduler.edit.assert_called_once_with(message, content="19")
+        self.assertEqual(self.coalescer.metrics, {"requested": 20, "sent": 1})
+
+    async def test_spaces_edits_on_the_same_route(self):
+        first, second = create_message(1), create_message(2)
+        edit_times = []
+        self.scheduler.edit.side_effect = lambda *args, **kwargs: edit_times.append(
+            time.monotonic()
+        )
+
+        self.coalescer.update(first, content="a")
+        self.coalescer.update(second, content="b")
+        await asyncio.gather(self.coalescer.flush(first), self.coalescer.flush(second))
+
+        self.assertEqual(len(edit_times), 2)
+        self.assertGreaterEqual(edit_times[1] - edit_times[0], 0.04)
+
+
+class TestWebhookStream(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.scheduler = MagicMock()
+        self.scheduler.edit = AsyncMock()
+        self.delivery = MagicMock()
+        self.delivery.send = AsyncMock(return_value={"id": "7"})
+        self.delivery.edit = AsyncMock(return_value={"id": "7"})
+        self.stream = WebhookStream(
+            MagicMock(id=1),
+            {"username": "a"},
+            self.delivery,
+            coalescer=EditCoalescer(scheduler=self.scheduler, min_interval=0.01),
+            prefix="※ ",
+            settings={**STREAMING, "first_chars": 5},
+        )
+
+    async def test_posts_on_first_tokens_and_edits_the_rest(self):
+        for token in ["Hark, ", "good ", "friends ", "all"]:
+            await self.stream.feed(token)
+            await asyncio.sleep(0)
+
+        self.assertTrue(await self.stream.finish("Hark, good friends all!"))
+        self.delivery.send.assert_called_once_with(
+            self.stream.channel,
+            {"username": "a", "content": "※ Hark, "},
+            coalesce=False,
+        )
+        # Webhook edits bypass the bot's channel route
+        self.scheduler.edit.assert_not_called()
+        self.delivery.edit.assert_called_with(
+            self.stream.channel, 7, {"content": "※ Hark, good friends all!"}
+        )
+        self.assertIsNotNone(self.stream.first_visible)
+
+    async def test_finish_reports_nothing_posted(self):
+        await self.stream.feed("Hi")
+        self.assertFalse(await self.stream.finish("Hi"))
+        self.delivery.send.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
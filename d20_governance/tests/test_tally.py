@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from d20_governance.utils.tally import Tally, TallyBoard
+
+
+class TestTally(unittest.TestCase):
+    def setUp(self):
+        self.tally = Tally({"majority": "majority", "consensus": "consensus"}, 2)
+
+    def test_reports_threshold_crossings(self):
+        self.assertIsNone(self.tally.add("majority", 1, voter_id=1))
+        self.assertTrue(self.tally.add("majority", 1, voter_id=2))
+        self.assertIsNone(self.tally.add("majority", 1, voter_id=2))
+        self.assertIsNone(self.tally.add("majority", -1, voter_id=3))
+        self.assertFalse(self.tally.add("majority", -1, voter_id=3))
+        self.assertEqual(self.tally.count("majority"), 1)
+        self.assertEqual(self.tally.unique_voters(), 3)
+
+    def test_counts_never_go_negative(self):
+        self.assertIsNone(self.tally.add("consensus", -1, voter_id=1))
+        self.assertEqual(self.tally.count("consensus"), 0)
+
+    def test_voters_are_counted_per_window(self):
+        with patch("d20_governance.utils.tally.time.monotonic", return_value=0):
+            tally = Tally({"majority": "majority"}, 2, window=60)
+            tally.add("majority", 1, voter_id=1)
+            tally.add("majority", 1, voter_id=1)
+        self.assertEqual(tally.voters, {1})
+        with patch("d20_governance.utils.tally.time.monotonic", return_value=61):
+            self.assertEqual(tally.unique_voters(), 0)
+            self.assertEqual(tally.count("majority"), 2)
+
+    def test_embed_shows_standings(self):
+        tally = Tally({"values": "values"}, 6, pin=5)
+        for voter_id in range(3):
+            tally.add("values", 1, voter_id)
+        field = tally.embed("Culture Display Status").fields[0]
+        self.assertEqual(field.name, "Values")
+        self.assertEqual(field.value, "🟦🟦🟦🟨🟨📍🟨🟨🟨🟨🟨")
+
+
+class TestWaitForWinner(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tally = Tally({"majority": "majority", "consensus": "consensus"}, 2)
+
+    async def test_wakes_on_unique_winner(self):
+        for name in ("majority", "consensus", "majority", "consensus"):
+            self.tally.add(name, 1, voter_id=1)
+        waiter = asyncio.create_task(self.tally.wait_for_winner(timeout=5))
+        # Tied at the threshold, so nobody has won yet
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        self.assertEqual(len(self.tally.waiters), 1)
+
+        self.tally.add("consensus", -1, voter_id=2)
+        self.assertEqual(await waiter, "majority")
+        self.assertEqual(self.tally.waiters, [])
+
+    async def test_times_out_without_winner(self):
+        self.tally.add("majority", 1, voter_id=1)
+        self.assertIsNone(await self.tally.wait_for_winner(timeout=0.01))
+        self.assertEqual(self.tally.waiters, [])
+
+
+class TestTallyBoard(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_becomes_one_message_and_one_edit(self):
+        scheduler = MagicMock()
+        status_message = MagicMock()
+        scheduler.send = AsyncMock(return_value=status_message)
+        scheduler.edit = AsyncMock()
+        board = TallyBoard(scheduler, interval=0.05)
+        channel = MagicMock(id=1)
+        tally = Tally({"majority": "majority"}, 5)
+
+        for voter_id in range(10):
+            tally.add("majority", 1, voter_id)
+            worker = board.show(channel, tally, "Decision Display Status")
+            await asyncio.sleep(0)
+        await worker
+
+        scheduler.send.assert_awaited_once()
+        scheduler.edit.assert_awaited_once()
+        self.assertIs(scheduler.edit.await_args.args[0], status_message)
+        embed = scheduler.edit.await_args.kwargs["embed"]
+        self.assertEqual(embed.fields[0].value, "🟦" * 10)
+        self.assertEqual(board.metrics, {"requested": 10, "posted": 1, "edited": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import queue
+import asyncio
+import tempfile
+import unittest
+import threading
+from unittest.mock import MagicMock, patch
+
+from d20_governance.utils.constants import TTS
+from d20_governance.utils.tts import TtsWorker, _encode, _worker_main
+
+
+def create_engine():
+    mock_engine = MagicMock()
+    saved = {}
+
+    def save_to_file(text, filename):
+        saved["job"] = (text, filename)
+
+    def run_and_wait():
+        text, filename = saved["job"]
+        with open(filename, "w") as f:
+            f.write(text)
+
+    mock_engine.save_to_file.side_effect = save_to_file
+    mock_engine.runAndWait.side_effect = run_and_wait
+    return mock_engine
+
+
+class TestTtsWorkerProcess(unittest.TestCase):
+    def test_worker_reuses_engine_and_writes_atomically(self):
+        cache_path = tempfile.mkdtemp()
+        mock_pyttsx3 = MagicMock()
+        mock_pyttsx3.init.return_value = create_engine()
+        jobs, results = queue.Queue(), queue.Queue()
+        for key in ("a", "b"):
+            jobs.put((key, f"text {key}", os.path.join(cache_path, key)))
+        jobs.put(None)
+
+        with patch.dict(sys.modules, {"pyttsx3": mock_pyttsx3}):
+            _worker_main(jobs, results, TTS)
+
+        mock_pyttsx3.init.assert_called_once()
+        for key in ("a", "b"):
+            result_key, filename, error = results.get_nowait()
+            self.assertEqual((result_key, error), (key, None))
+            self.assertTrue(os.path.exists(filename))
+        self.assertNotIn(".tmp", " ".join(os.listdir(cache_path)))
+
+    def test_encode_falls_back_to_wav_with_honest_extension(self):
+        root = os.path.join(tempfile.mkdtemp(), "a")
+        with open(f"{root}.tmp.wav", "w") as f:
+            f.write("not really audio")
+
+        filename = _encode(f"{root}.tmp.wav", root, {**TTS, "codec": "missing"})
+
+        self.assertEqual(filename, f"{root}.wav")
+        self.assertEqual(os.listdir(os.path.dirname(root)), ["a.wav"])
+
+    def test_encode_streams_wav_through_ffmpeg(self):
+        root = os.path.join(tempfile.mkdtemp(), "a")
+        with open(f"{root}.tmp.wav", "wb") as f:
+            f.write(b"RIFF" * 50000)
+
+        written = bytearray()
+
+        def popen(command, **kwargs):
+            out_filename = command[-1]
+            process = MagicMock()
+            process.stdin.write.side_effect = written.extend
+
+            def wait(timeout=None):
+                with open(out_filename, "wb") as f:
+                    f.write(b"OggS")
+                return 0
+
+            process.wait.side_effect = wait
+            return process
+
+        with patch("d20_governance.utils.tts.subprocess.Popen", side_effect=popen) as p:
+            filename = _encode(f"{root}.tmp.wav", root, TTS)
+
+        command = p.call_args.args[0]
+        self.assertEqual(command[command.index("-i") + 1], "pipe:0")
+        self.assertEqual(bytes(written), b"RIFF" * 50000)
+        self.assertEqual(filename, f"{root}.ogg")
+        self.assertEqual(os.listdir(os.path.dirname(root)), ["a.ogg"])
+
+
+class TestTtsWorkerCache(unittest.IsolatedAsyncioTestCase):
+    async def test_cached_text_skips_synthesis(self):
+        worker = TtsWorker(cache_path=tempfile.mkdtemp(), settings=TTS)
+        filename = f"{worker.root(worker.key('hello'))}.wav"
+        os.makedirs(worker.cache_path, exist_ok=True)
+        with open(filename, "w") as f:
+            f.write("audio")
+
+        self.assertEqual(await worker.synthesize("hello"), filename)
+        self.assertIsNone(worker.process)
+        self.assertEqual(worker.metrics["cached"], 1)
+
+    async def test_restart_stops_the_old_reader_thread(self):
+        worker = TtsWorker(cache_path=tempfile.mkdtemp(), settings=TTS)
+        worker.loop = asyncio.get_running_loop()
+        worker.results = worker.context.Queue()
+        reader = threading.Thread(
+            target=worker._read_results, args=(worker.results,), daemon=True
+        )
+        worker.reader = reader
+        reader.start()
+
+        worker.restart()
+        self.assertFalse(reader.is_alive())
+        self.assertIsNone(worker.reader)
+
+    def test_key_depends_on_voice_settings(self):
+        worker = TtsWorker(settings=TTS)
+        slow_worker = TtsWorker(settings={**TTS, "rate": 100})
+        self.assertNotEqual(worker.key("hello"), slow_worker.key("hello"))
+
+
+if __name__ == "__main__":
+    unittest.main()
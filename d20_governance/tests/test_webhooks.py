@@ -0,0 +1,201 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from aiohttp import web
+
+from d20_governance.utils.constants import REST_SCHEDULER, WEBHOOK_DELIVERY
+from d20_governance.utils.scheduler import RestScheduler
+from d20_governance.utils.webhooks import WebhookDelivery, WebhookPool
+
+
+def create_channel(channel_id, guild_id=1):
+    mock_channel = MagicMock()
+    mock_channel.id = channel_id
+    mock_channel.guild.id = guild_id
+    mock_webhook = MagicMock()
+    mock_webhook.id = 1000 + channel_id
+    mock_webhook.token = f"token-{channel_id}"
+    mock_webhook.delete = AsyncMock()
+    mock_channel.create_webhook = AsyncMock(return_value=mock_webhook)
+    return mock_channel
+
+
+class TestWebhookPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.store_path = os.path.join(tempfile.mkdtemp(), "webhooks.json")
+
+    async def test_reuses_webhook_per_channel(self):
+        pool = WebhookPool(store_path=self.store_path)
+        channel = create_channel(1)
+
+        first = await pool.get(channel)
+        second = await pool.get(channel)
+
+        self.assertIs(first, second)
+        channel.create_webhook.assert_called_once()
+
+    async def test_persists_records(self):
+        pool = WebhookPool(store_path=self.store_path)
+        await pool.get(create_channel(1))
+
+        restored = WebhookPool(store_path=self.store_path)
+        self.assertEqual(restored.records[1]["id"], 1001)
+        self.assertEqual(restored.records[1]["token"], "token-1")
+
+    async def test_evicts_least_recently_used_at_limit(self):
+        pool = WebhookPool(store_path=self.store_path, guild_limit=2)
+        channels = [create_channel(i) for i in range(3)]
+
+        await pool.get(channels[0])
+        await pool.get(channels[1])
+        await pool.get(channels[0])  # channel 1 is now least recently used
+        await pool.get(channels[2])
+
+        self.assertEqual(list(pool.records), [0, 2])
+        channels[1].create_webhook.return_value.delete.assert_called_once()
+
+    async def test_reconcile_counts_guild_webhooks_once(self):
+        pool = WebhookPool(store_path=self.store_path, guild_limit=10)
+        await pool.get(create_channel(1))
+
+        foreign_webhook = MagicMock(id=5, channel_id=2)
+        own_webhook = MagicMock(id=1001, channel_id=1)
+        mock_guild = MagicMock(id=1)
+        mock_guild.webhooks = AsyncMock(return_value=[foreign_webhook, own_webhook])
+
+        webhook_count = await pool.reconcile(mock_guild)
+
+        self.assertEqual(webhook_count, 2)
+        mock_guild.webhooks.assert_called_once()
+
+        await pool.get(create_channel(3))
+        self.assertEqual(pool.guild_count(1), 3)
+
+
+class TestWebhookDelivery(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+        self.responses = []
+
+        async def execute_webhook(request):
+            self.requests.append(await request.json())
+            status, headers = self.responses.pop(0) if self.responses else (200, {})
+            if status == 429:
+                return web.json_response(
+                    {"retry_after": 0.05}, status=429, headers=headers
+                )
+            return web.json_response(
+                {"id": len(self.requests)}, status=status, headers=headers
+            )
+
+        async def edit_webhook_message(request):
+            self.edits.append((request.match_info["message_id"], await request.json()))
+            return web.json_response({"id": request.match_info["message_id"]})
+
+        self.edits = []
+        app = web.Application()
+        app.router.add_post("/webhooks/{id}/{token}", execute_webhook)
+        app.router.add_patch(
+            "/webhooks/{id}/{token}/messages/{message_id}", edit_webhook_message
+        )
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        pool = WebhookPool(store_path=os.path.join(tempfile.mkdtemp(), "w.json"))
+        self.delivery = WebhookDelivery(
+            pool,
+            api_base=f"http://127.0.0.1:{port}",
+            settings={**WEBHOOK_DELIVERY, "backoff": 0.01},
+        )
+        self.channel = create_channel(1)
+
+    async def asyncTearDown(self):
+        await self.delivery.close()
+        await self.runner.cleanup()
+
+    async def test_retries_after_rate_limit(self):
+        self.responses = [(429, {}), (200, {})]
+        result = await self.delivery.send(
+            self.channel, {"content": "※ hello", "username": "a"}
+        )
+        self.assertEqual(result, {"id": 2})
+        self.assertEqual(self.delivery.metrics["retried"], 1)
+
+    async def test_coalesces_same_author_when_throttled(self):
+        # The first response exhausts the bucket so queued posts wait and merge
+        self.responses = [
+            (200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.1"})
+        ]
+        results = await asyncio.gather(
+            *(
+                self.delivery.send(self.channel, {"content": f"※ {i}", "username": "a"})
+                for i in range(4)
+            )
+        )
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[1]["content"], "※ 1\n※ 2\n※ 3")
+        self.assertEqual(results[1], results[3])
+
+    async def test_posts_that_will_be_edited_are_never_merged(self):
+        self.responses = [
+            (200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.1"})
+        ]
+        results = await asyncio.gather(
+            self.delivery.send(self.channel, {"content": "※ 0", "username": "a"}),
+            self.delivery.send(
+                self.channel, {"content": "※ 1", "username": "a"}, coalesce=False
+            ),
+            self.delivery.send(self.channel, {"content": "※ 2", "username": "a"}),
+        )
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(len({result["id"] for result in results}), 3)
+
+    async def test_edits_posted_message(self):
+        posted = await self.delivery.send(
+            self.channel, {"content": "※ hel", "username": "a"}
+        )
+        edited = await self.delivery.edit(
+            self.channel, posted["id"], {"content": "※ hello"}
+        )
+
+        self.assertEqual(self.edits, [("1", {"content": "※ hello"})])
+        self.assertEqual(edited, {"id": "1"})
+        self.assertEqual(self.delivery.metrics["edited"], 1)
+
+    async def test_runs_in_the_repost_lane_on_the_webhook_route(self):
+        scheduler = RestScheduler()
+        self.delivery.scheduler = scheduler
+        await self.delivery.send(self.channel, {"content": "※ hi", "username": "a"})
+
+        self.assertEqual(scheduler.snapshot()["queue_wait"]["repost"]["count"], 1)
+        self.assertIn(f"webhook:{self.channel.id}", scheduler.buckets)
+        self.assertNotIn(f"channel:{self.channel.id}", scheduler.buckets)
+
+    async def test_rate_limit_wait_does_not_hold_a_scheduler_slot(self):
+        scheduler = RestScheduler(settings={**REST_SCHEDULER, "concurrency": 1})
+        self.delivery.scheduler = scheduler
+        self.responses = [(429, {}), (200, {})]
+        finished = []
+
+        async def repost():
+            await self.delivery.send(self.channel, {"content": "※ hi", "username": "a"})
+            finished.append("repost")
+
+        async def status():
+            await asyncio.sleep(0.02)  # submitted while the repost waits out its 429
+            await scheduler.submit(AsyncMock(), route="channel:2", priority="status")
+            finished.append("status")
+
+        await asyncio.gather(repost(), status())
+
+        self.assertEqual(finished, ["status", "repost"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import random
+import asyncio
+import logging
+
+from colorama import Fore, Style
+
+from d20_governance.utils.constants import VALUES_AUDIT
+from d20_governance.utils.cultures import (
+    CULTURE_MODULES,
+    CULTURE_TOGGLE_LISTENERS,
+    assign_role_to_user,
+)
+from d20_governance.utils.history import recent_messages
+from d20_governance.utils.scheduler import TokenBucket
+
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` items from a stream of unknown length
+    """
+
+    def __init__(self, size, rng=random):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        index = self.rng.randrange(self.seen)
+        if index < self.size:
+            self.items[index] = item
+
+    def take(self):
+        items = self.items
+        self.items = []
+        self.seen = 0
+        return items
+
+
+class ValuesAuditor:
+    """
+    Periodically values-check a random sample of recent messages
+
+    Messages in channels where the values module is active are sampled from the
+    recent-message store as they arrive, so memory stays constant however busy a
+    channel is and no history is fetched. Each audit scores a channel's sample in one
+    batched LLM call, spends a token from the guild's audit budget, and requests one
+    alignment role change per sampled author.
+    """
+
+    def __init__(
+        self,
+        store=recent_messages,
+        toggles=CULTURE_TOGGLE_LISTENERS,
+        settings=VALUES_AUDIT,
+    ):
+        self.settings = settings
+        self.values = CULTURE_MODULES["values"]
+        self.reservoirs = {}  # channel_id -> Reservoir of RecentMessage
+        self.budgets = {}  # guild_id -> TokenBucket
+        self.metrics = {"audits": 0, "messages": 0, "over_budget": 0, "roles": 0}
+        self.task = None
+        self.bot = None
+        # channel_id -> guild_id for channels where the values module is active
+        self.channels = {
+            channel_id: guild_id
+            for guild_id, channel_ids in self.values.config["guild_channel_map"].items()
+            for channel_id in channel_ids
+        }
+        store.subscribe(self.observe)
+        toggles.append(self.on_toggle)
+
+    def on_toggle(self, guild_id, channel_id, module_name, state):
+        if module_name != "values":
+            return
+        if state:
+            self.channels[channel_id] = guild_id
+            if self.bot is not None:
+                self.start(self.bot)
+        else:
+            self.release(channel_id)
+
+    def release(self, channel_id):
+        """
+        Stop auditing a channel, and stop the audit once no channel is left
+        """
+        self.channels.pop(channel_id, None)
+        self.reservoirs.pop(channel_id, None)
+        if not self.channels:
+            self.stop()
+
+    def observe(self, record):
+        if record.author_id is None or record.channel_id not in self.channels:
+            return
+        reservoir = self.reservoirs.get(record.channel_id)
+        if reservoir is None:
+            reservoir = Reservoir(self.settings["sample_size"])
+            self.reservoirs[record.channel_id] = reservoir
+        reservoir.add(record)
+
+    def budget(self, guild_id):
+        bucket = self.budgets.get(guild_id)
+        if bucket is None:
+            bucket = TokenBucket(
+                self.settings["guild_capacity"], self.settings["guild_refill"]
+            )
+            self.budgets[guild_id] = bucket
+        return bucket
+
+    def start(self, bot):
+        """
+        Run the audit in the background unless it is already running
+
+        The audit only runs while some channel has the values module active. Once
+        started it is restarted whenever the module is activated again, however that
+        happened.
+        """
+        self.bot = bot
+        if self.channels and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self.run(bot))
+        return self.task
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self, bot):
+        """
+        Audit until cancelled
+        """
+        print(f"{Fore.BLUE}Values audit started{Style.RESET_ALL}")
+        try:
+            while True:
+                await asyncio.sleep(random.uniform(*self.settings["interval"]))
+                try:
+                    await self.audit(bot)
+                except Exception as e:
+                    # Nobody awaits this task, so one failed audit must not end it
+                    print(f"{Fore.RED}Values audit failed: {e}{Style.RESET_ALL}")
+                    logging.error(f"Values audit failed: {e}")
+        except asyncio.CancelledError:
+            print(f"{Fore.BLUE}Values audit stopped{Style.RESET_ALL}")
+            self.reservoirs.clear()
+            raise
+
+    async def audit(self, bot):
+        for channel_id in list(self.reservoirs):
+            guild_id = self.channels.get(channel_id)
+            if guild_id is None:
+                del self.reservoirs[channel_id]
+                continue
+            records = self.reservoirs[channel_id].take()
+            if not records:
+                continue
+            if not self.budget(guild_id).try_take():
+                self.metrics["over_budget"] += 1
+                continue
+
+            guild = bot.get_guild(guild_id)
+            if guild is None:
+                continue
+            verdicts = await self.values.analyze_many(
+                guild, [record.content for record in records]
+            )
+            self.metrics["audits"] += 1
+            self.metrics["messages"] += len(records)
+
+            # One role change per author, from their latest sampled message
+            alignments = {}
+            for record in sorted(records, key=lambda record: record.timestamp):
+                verdict = verdicts.get(record.content)
+                if verdict is not None:
+                    alignments[record.author_id] = verdict[1]
+            self.apply_roles(guild, alignments)
+
+    def apply_roles(self, guild, alignments):
+        for member_id, alignment in alignments.items():
+            member = guild.get_member(member_id)
+            if member is None:
+                continue
+            role_name = "Aligned" if alignment == "aligned" else "Misaligned"
+            assign_role_to_user(member, role_name)
+            self.metrics["roles"] += 1
+
+
+values_auditor = ValuesAuditor()
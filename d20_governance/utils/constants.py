@@ -27,9 +27,23 @@ STABILITY_TOKEN = os.getenv("STABILITY_API_KEY")
 if STABILITY_TOKEN is None:
     raise Exception("Missing Stability API key.")
 
+LLM_BACKEND = os.getenv(
+    "D20_LLM_BACKEND", "openai"
+)  # "openai" or "fake" for offline runs
+
 API_HOST = "https://api.stability.ai"
 STABILITY_API_HOST = "https://api.stability.ai"
 ENGINE_ID = "stable-diffusion-v1-5"
+STABILITY_CLIENT = {
+    "connections": 4,  # size of the HTTP connection pool for image requests
+    "timeout": 60,  # seconds before a single generation request is abandoned
+    "retries": 2,  # attempts after the first on rate limits, server errors or timeouts
+    "backoff": 1.0,  # base delay in seconds, doubled on every retry
+    "pregenerate_concurrency": 3,  # images generated at once when warming a quest
+}
+IMAGE_CACHE = {
+    "max_bytes": 200 * 1024 * 1024,  # disk budget for cached images before LRU eviction
+}
 
 # TIMEOUTS
 timeouts = {
@@ -53,6 +67,12 @@ GOVERNANCE_STACK_SNAPSHOTS_PATH = "assets/user_created/governance_stack_snapshot
 LOGGING_PATH = "logs"
 LOG_FILE_NAME = f"{LOGGING_PATH}/bot.log"
 
+# PERSISTENT STATE PATHS
+STATE_PATH = "state"
+WEBHOOK_STORE_PATH = f"{STATE_PATH}/webhooks.json"
+IMAGE_CACHE_PATH = f"{STATE_PATH}/image_cache"
+TTS_CACHE_PATH = f"{STATE_PATH}/tts_cache"
+
 # BOT IMAGES
 BOT_ICON = "assets/imgs/game_icons/d20-gov-icon.png"
 
@@ -103,9 +123,6 @@ deliberation_questions = [
     "As you discuss and deliberate your proposals, consider: does your proposal resonate in any way with the community that the group is embeeded in?",
 ]
 
-# INIT
-values_check_task = None
-
 # QUEST KEYS
 QUEST_MESSAGE_KEY = "message"
 QUEST_NAME_KEY = "stage"
@@ -165,6 +182,13 @@ INPUT_SPECTRUM = {
     "threshold": 5,
 }
 
+# CONTINUOUS INPUT TALLY
+TALLY = {
+    "edit_interval": 3.0,  # minimum seconds between updates of a channel's status message
+    "voter_window": 300,  # seconds over which unique voters are counted
+    "retry_window": 60,  # seconds a vote retry waits for a new decision module
+}
+
 # INTERNAL ACCESS CONTROL SETTINGS
 ACCESS_CONTROL_SETTINGS = {
     "allowed_roles": ["@everyone"],
@@ -182,9 +206,146 @@ QUEST_IN_PROGRESS = False
 USER_MESSAGE_COUNT = {}  # Stores the number of messages sent by each user
 
 # MISC LISTS
-WEBHOOK_LIST = []  # stores webhooks
 ARCHIVED_CHANNELS = []
 
+# REST SCHEDULING
+REST_PRIORITIES = {
+    "repost": 0,  # webhook reposts of filtered messages and their streamed edits
+    "vote": 1,  # vote UI and module status
+    "status": 2,  # stage and game status messages
+    "cosmetic": 3,  # streaming and countdown edits
+    "maintenance": 4,  # cleanup deletes
+}
+REST_SCHEDULER = {
+    "concurrency": 10,  # requests in flight at once across all routes
+    "route_capacity": 5,  # burst size per route, matching Discord's 5 per 5 seconds
+    "route_refill": 1.0,  # tokens per second added back to each route bucket
+}
+
+# TEXT TO SPEECH
+TTS = {
+    "voice": "english",
+    "rate": 140,  # words per minute
+    "format": "ogg",  # container for encoded narration, WAV is kept if encoding fails
+    "codec": "libopus",
+    "bitrate": "32k",  # plenty for speech
+    "timeout": 120,  # seconds to wait for one synthesis before restarting the worker
+    "max_bytes": 200 * 1024 * 1024,  # disk budget for cached audio before LRU eviction
+}
+
+# FAKE LLM
+FAKE_LLM = {
+    "latency": {
+        "distribution": "lognormal",  # "fixed" (seconds), "uniform" (low, high) or "lognormal"
+        "median": 0.8,  # seconds
+        "sigma": 0.5,  # spread of the lognormal tail
+    },
+    "error_rate": 0.0,  # fraction of calls that raise
+    "seed": None,  # set for reproducible latencies and errors
+}
+
+# LLM GOVERNOR
+LLM_PRIORITIES = {
+    "narration": 0,  # quest stage generation
+    "values": 1,  # values checks
+    "cosmetic": 2,  # culture module rewrites of chat messages
+}
+LLM_GOVERNOR = {
+    "concurrency": 8,  # LLM calls in flight at once across the bot
+    "budgeted_lanes": (
+        "values",
+        "cosmetic",
+    ),  # lanes that spend module and guild tokens
+    "module_capacity": 10,  # burst of calls per culture module
+    "module_refill": 1.0,  # calls per second added back to each module budget
+    "guild_capacity": 20,  # burst of calls per guild
+    "guild_refill": 2.0,  # calls per second added back to each guild budget
+    "max_waiting": 50,  # budgeted calls are rejected beyond this many waiting
+}
+
+# CULTURE FILTERS
+CULTURE_FILTERS = {
+    "llm_timeout": 5.0,  # default seconds an LLM module may take before the text-only fallback
+    "latency_buckets": (
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2,
+        3,
+        5,
+        8,
+        13,
+        20,
+    ),  # histogram bounds in seconds
+}
+
+# VALUES CHECKS
+VALUES_CHECK = {
+    "cache_size": 512,  # alignment verdicts kept, keyed on message content and values set
+    "batch_size": 20,  # messages scored per LLM call in batch mode
+}
+
+# ROLE CHANGES
+ALIGNMENT_ROLES = ("Aligned", "Misaligned")
+ROLE_CHANGES = {
+    "debounce": 2.0,  # seconds a member's role changes are collected before one edit
+}
+
+# VALUES AUDIT
+VALUES_AUDIT = {
+    "interval": (45, 55),  # seconds between audits, drawn uniformly
+    "sample_size": 5,  # messages sampled per channel between audits
+    "guild_capacity": 2,  # burst of audit LLM calls per guild
+    "guild_refill": 1 / 120,  # audit LLM calls per second added back to each guild
+}
+
+# RECENT MESSAGES
+RECENT_MESSAGES = {
+    "depth": 50,  # recent eligible messages kept per channel, also the cold start backfill size
+    "max_channels": 200,  # least recently active channels are dropped beyond this many
+}
+
+# LLM STAGES
+LLM_STAGES = {
+    "max_attempts": 5,  # LLM calls per stage before giving up on valid output
+    "memory_window": 3,  # previous stages sent back verbatim with each stage prompt
+    "summarize_every": 3,  # stages folded into the rolling story summary at once
+    "parse_cache_size": 64,  # memoized parsed responses
+}
+
+# STAGE PIPELINE
+STAGE_PIPELINE = {
+    "lookahead": 2,  # prepared stages that may wait while the current stage plays
+}
+
+# STREAMING
+STREAMING = {
+    "mode": "reveal",  # "reveal" paces chunks by wall clock, "edit" waits for each chunk's edit
+    "min_interval": 1.5,  # minimum seconds between edits on one channel
+    "first_chars": 12,  # streamed LLM text shown before the webhook repost is first posted
+}
+
+# WEBHOOKS
+DISCORD_API_BASE = "https://discord.com/api/v10"
+WEBHOOK_NAME = "InternalWebhook"
+WEBHOOK_GUILD_LIMIT = (
+    15  # Evict least recently used webhooks before a guild reaches this many
+)
+WEBHOOK_RECONCILE = {
+    "minutes": 30,  # cadence of the REST pass that corrects locally tracked webhook counts
+    "jitter": 300,  # random delay in seconds so reconciliation never lines up with other traffic
+    "event_grace": 5,  # seconds during which webhook update events for our own changes are ignored
+}
+WEBHOOK_DELIVERY = {
+    "connections": 20,  # size of the shared HTTP connection pool for webhook sends
+    "timeout": 10,  # seconds before a single webhook request is abandoned
+    "retries": 4,  # attempts after the first before a send is dropped
+    "backoff": 0.5,  # base delay in seconds, doubled on every retry
+    "max_length": 2000,  # Discord's message length limit, caps coalesced posts
+}
+
 # JOSH GAME # todo: move this out to game-specific file
 JOSH_NICKNAMES = [
     "Jigsaw Joshy",
@@ -1,19 +1,38 @@
+import re
+import time
 import random
+import bisect
+import hashlib
 import asyncio
 import datetime
 
 import discord
 from discord import app_commands
 
-from d20_governance.utils.constants import GOVERNANCE_SVG_ICONS
+from d20_governance.utils.constants import (
+    ALIGNMENT_ROLES,
+    CULTURE_FILTERS,
+    GOVERNANCE_SVG_ICONS,
+    INPUT_SPECTRUM,
+    USER_MESSAGE_COUNT,
+    VALUES_CHECK,
+)
+from d20_governance.utils.history import recent_messages
+from d20_governance.utils.llm import (
+    LLMRejected,
+    llm_governor,
+    llm_provider,
+    token_sink,
+)
+from d20_governance.utils.roles import role_changes
+from d20_governance.utils.scheduler import rest_scheduler
+from d20_governance.utils.tally import Tally
 
 from langchain.prompts import PromptTemplate
-from langchain.llms import OpenAI
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
 
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from colorama import Fore, Style
 
 
@@ -45,6 +64,45 @@ class OrderedSet:
         return len(self) > 0  # The instance is "Truthy" if there are elements in it
 
 
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with approximate percentiles
+
+    Percentiles are reported as the upper bound of the bucket they fall in, so
+    recording a sample is a bisect and an increment regardless of traffic.
+    """
+
+    def __init__(self, buckets=CULTURE_FILTERS["latency_buckets"]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last bucket catches overflow
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return (
+                    self.buckets[index] if index < len(self.buckets) else float("inf")
+                )
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
 class RandomCultureModuleManager:
     def __init__(self):
         self.random_culture_module = ""
@@ -53,6 +111,45 @@ class RandomCultureModuleManager:
 random_culture_module_manager = RandomCultureModuleManager()
 
 
+class AlignmentCache:
+    """
+    LRU cache of values-alignment verdicts
+
+    Entries are keyed on the message content and a hash of the values set they were
+    judged against, so a verdict is never reused after the values change.
+    """
+
+    def __init__(self, max_entries=VALUES_CHECK["cache_size"]):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (values_hash, content) -> (response, alignment)
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def get(self, values_hash, content):
+        verdict = self.entries.get((values_hash, content))
+        if verdict is None:
+            self.metrics["misses"] += 1
+            return None
+        self.entries.move_to_end((values_hash, content))
+        self.metrics["hits"] += 1
+        return verdict
+
+    def put(self, values_hash, content, verdict):
+        self.entries[(values_hash, content)] = verdict
+        self.entries.move_to_end((values_hash, content))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def hash_values(values_dict):
+    return hashlib.sha256(repr(sorted(values_dict.items())).encode("utf-8")).hexdigest()
+
+
+alignment_cache = AlignmentCache()
+
+
 class ValueRevisionManager:
     def __init__(self):
         self.proposed_values_dict = {}
@@ -63,6 +160,7 @@ class ValueRevisionManager:
             "Collaboration": "Our community encourage collaboration, fostering an environment where members can work together and share knowledge or skills.",
             "Trust": "Our community believes building trust is important, as it allows members to feel safe and comfortable sharing their thoughts and experiences.",
         }
+        self.values_hash = hash_values(self.agora_values_dict)
         self.selected_value = {}
         self.game_quest_values_dict = {}
         self.quest_game_channels = []
@@ -84,6 +182,12 @@ class ValueRevisionManager:
             self.proposed_values_dict[proposed_value_name] = proposed_value_definition
 
     async def update_values_dict(self, select_value, vote_result):
+        """
+        Replace `select_value` (None to only add) with the values in `vote_result`
+
+        All changes to the agora values go through here, so the values hash and the
+        cached alignment verdicts stay in step with them.
+        """
         async with self.lock:
             if not vote_result:
                 print("value dict not updated")
@@ -91,6 +195,9 @@ class ValueRevisionManager:
                 if select_value in value_revision_manager.agora_values_dict:
                     del value_revision_manager.agora_values_dict[select_value]
                 value_revision_manager.agora_values_dict.update(vote_result)
+                # Verdicts against the old values no longer apply
+                self.values_hash = hash_values(self.agora_values_dict)
+                alignment_cache.clear()
                 message_content = ""
                 for (
                     value,
@@ -132,6 +239,29 @@ class CultureModule(ABC):
     ) -> str:
         return message_string
 
+    def llm_timeout(self):
+        """
+        Seconds this module's filter may take before the text-only fallback is posted
+        """
+        return self.config.get("llm_timeout", CULTURE_FILTERS["llm_timeout"])
+
+    async def run_llm(self, guild, call, priority="cosmetic"):
+        """
+        Run an LLM call for this module through the governor
+
+        Returns None if the governor rejected the call.
+        """
+        try:
+            return await llm_governor.run(
+                call,
+                module=self.config["name"],
+                guild_id=getattr(guild, "id", None),
+                priority=priority,
+            )
+        except LLMRejected as e:
+            print(f"{Fore.YELLOW}{e}{Style.RESET_ALL}")
+            return None
+
     # State management with channel and guild mapping
     async def toggle_local_state_per_channel(self, ctx, guild_id, channel_id):
         print("Toggling module...")
@@ -252,7 +382,7 @@ class Wildcard(CultureModule):
         """
         print(f"{Fore.GREEN}※ applying wildcard module{Style.RESET_ALL}")
         module = CULTURE_MODULES.get("wildcard", None)
-        llm = ChatOpenAI(temperature=0.1, model_name="gpt-3.5-turbo")
+        llm = llm_provider.get(model_name="gpt-3.5-turbo", temperature=0.1)
         prompt = PromptTemplate(
             input_variables=[
                 "input_text",
@@ -263,15 +393,18 @@ class Wildcard(CultureModule):
             template="You are from {group_name}. Please rewrite the following input ina way that makes the speaker sound {group_way_of_speaking} while maintaining the original meaning and intent. Incorporate the theme of {group_topic}. Don't complete any sentences, just rewrite them. Input: {input_text}",
         )
         chain = LLMChain(llm=llm, prompt=prompt)
-        response = await chain.arun(
-            {
-                "group_name": prompt_object.decision_one,
-                "group_topic": prompt_object.decision_two,
-                "group_way_of_speaking": prompt_object.decision_three,
-                "input_text": message_string,
-            }
+        response = await self.run_llm(
+            message.guild,
+            lambda: chain.arun(
+                {
+                    "group_name": prompt_object.decision_one,
+                    "group_topic": prompt_object.decision_two,
+                    "group_way_of_speaking": prompt_object.decision_three,
+                    "input_text": message_string,
+                }
+            ),
         )
-        return response
+        return response if response is not None else message_string
 
 
 class Amplify(CultureModule):
@@ -282,14 +415,18 @@ class Amplify(CultureModule):
         A LLM filter for messages during the /eloquence command/function
         """
         print(f"{Fore.GREEN}※ applying amplify module{Style.RESET_ALL}")
-        llm = ChatOpenAI(temperature=0.1, model_name="gpt-3.5-turbo")
+        llm = llm_provider.get(
+            model_name="gpt-3.5-turbo",
+            temperature=0.1,
+            streaming=self.config.get("streaming", False),
+        )
         prompt = PromptTemplate(
             input_variables=["input_text"],
             template="Using the provided input text, generate a revised version that amplifies its sentiment to a much greater degree. Maintain the overall context and meaning of the message while significantly heightening the emotional tone. You must ONLY respond with the revised message. Input text: {input_text}",
         )
         chain = LLMChain(llm=llm, prompt=prompt)
-        response = await chain.arun(message_string)
-        return response
+        response = await self.run_llm(message.guild, lambda: chain.arun(message_string))
+        return response if response is not None else message_string
 
 
 class Ritual(CultureModule):
@@ -297,26 +434,20 @@ class Ritual(CultureModule):
         self, message: discord.Message, message_string: str
     ) -> str:
         print(f"{Fore.GREEN}※ applying ritual module{Style.RESET_ALL}")
-        async for msg in message.channel.history(limit=100):
-            if msg.id == message.id:
-                continue
-            if msg.author.bot and not msg.content.startswith(
-                "※"
-            ):  # This condition lets webhook messages to be checked
-                continue
-            if msg.content.startswith("/") or msg.content.startswith("-"):
-                continue
-            previous_message = msg.content
-            break
-        if previous_message is None:
+        previous = await recent_messages.previous(
+            message.channel, exclude_id=message.id
+        )
+        if previous is None:
             return message_string
-        filtered_message = await self.initialize_ritual_agreement(
-            previous_message, message_string
+        previous_message = previous.content
+        filtered_message = await self.run_llm(
+            message.guild,
+            lambda: self.initialize_ritual_agreement(previous_message, message_string),
         )
-        return filtered_message
+        return filtered_message if filtered_message is not None else message_string
 
     async def initialize_ritual_agreement(self, previous_message, new_message):
-        llm = ChatOpenAI(temperature=0.9)
+        llm = llm_provider.get(temperature=0.9)
         prompt = PromptTemplate(
             input_variables=["previous_message", "new_message"],
             template="Write a message that reflects the content in the message '{new_message}' but is cast in agreement with the message '{previous_message}'. Preserve and transfer the meaning and any spelling errors or text transformations in the message in the response.",
@@ -328,40 +459,56 @@ class Ritual(CultureModule):
         return response
 
 
+VALUES_BATCH_TEMPLATE = """We hold and maintain a set of mutually agreed-upon values:
+
+{values}
+
+Score each numbered message against the values we hold. Answer with exactly one line per message in the form '<number>. aligned: <reason>' or '<number>. misaligned: <reason>'. Keep each reason under 150 characters.
+
+Messages:
+{messages}
+
+Answer:"""
+
+
 class Values(CultureModule):
     async def check_values(self, bot, ctx, message: discord.Message):
         print("Checking values")
         if message.reference:
-            reference_message = await message.channel.fetch_message(
-                message.reference.message_id
-            )
-            if (
-                reference_message.author.bot
-                and not reference_message.content.startswith(
-                    "※"
-                )  # This condition lets webhook messages to be checked
-            ):
-                await ctx.send("Cannot check values of messages from bot")
-                return
-            else:
-                print(
-                    f"Original Message Content: {reference_message.content}, posted by {message.author}"
+            # Recent messages are resolved from memory, older ones from the API
+            reference_message = recent_messages.get(message.reference.message_id)
+            if reference_message is None:
+                reference_message = await message.channel.fetch_message(
+                    message.reference.message_id
                 )
+                if (
+                    reference_message.author.bot
+                    and not reference_message.content.startswith(
+                        "※"
+                    )  # This condition lets webhook messages to be checked
+                ):
+                    await ctx.send("Cannot check values of messages from bot")
+                    return
+            print(
+                f"Original Message Content: {reference_message.content}, posted by {message.author}"
+            )
 
             current_values_dict = value_revision_manager.agora_values_dict
             values_list = f"Community Defined Values:\n\n"
             for value in current_values_dict.keys():
                 values_list += f"* {value}\n"
-            llm_response, alignment = await self.llm_analyze_values(
-                current_values_dict, reference_message.content
-            )
+            analysis = await self.analyze(message.guild, reference_message.content)
+            if analysis is None:
+                await ctx.send("The values check is busy right now, try again shortly.")
+                return
+            llm_response, alignment = analysis
             message_content = f"----------```Message: {reference_message.content}\n\nMessage author: {reference_message.author}```\n> **Values Analysis:** {llm_response}\n```{values_list}```\n----------"
 
             # Assign alignment roles to users if their post is values-checked
             if alignment == "aligned":
-                await assign_role_to_user(message.author, "Aligned")
+                assign_role_to_user(message.author, "Aligned")
             else:
-                await assign_role_to_user(message.author, "Misaligned")
+                assign_role_to_user(message.author, "Misaligned")
             await ctx.send(message_content)
         else:
             if message.author.bot and not message.content.startswith("※"):
@@ -376,24 +523,122 @@ class Values(CultureModule):
             values_list = f"Community Defined Values:\n\n"
             for value in current_values_dict.keys():
                 values_list += f"* {value}\n"
-            llm_response, alignment = await self.llm_analyze_values(
-                current_values_dict, message.content
-            )
+            analysis = await self.analyze(message.guild, message.content)
+            if analysis is None:
+                await ctx.send("The values check is busy right now, try again shortly.")
+                return
+            llm_response, alignment = analysis
             message_content = f"----------```Message: {message.content}\n\nMessage author: {message.author}```\n> **Values Analysis:** {llm_response}\n```{values_list}```\n----------"
 
             # Assign alignment roles to users if their post is values-checked
             if alignment == "aligned":
-                await assign_role_to_user(message.author, "Aligned")
+                assign_role_to_user(message.author, "Aligned")
             else:
-                await assign_role_to_user(message.author, "Misaligned")
+                assign_role_to_user(message.author, "Misaligned")
             await ctx.send(message_content)
 
+    async def analyze(self, guild, text):
+        """
+        Values analysis of one message, reusing cached verdicts
+
+        Returns None if the governor rejected the LLM call
+        """
+        values_hash = value_revision_manager.values_hash
+        verdict = alignment_cache.get(values_hash, text)
+        if verdict is None:
+            values_dict = value_revision_manager.agora_values_dict
+            verdict = await self.run_llm(
+                guild,
+                lambda: self.llm_analyze_values(values_dict, text),
+                priority="values",
+            )
+            if verdict is not None:
+                alignment_cache.put(values_hash, text, verdict)
+        return verdict
+
+    async def analyze_many(self, guild, texts):
+        """
+        Values analysis of many messages, scoring uncached ones in batched LLM calls
+
+        Returns a dict of text -> (response, alignment). Texts the LLM skipped or that
+        could not be scored because the governor rejected the call are left out.
+        """
+        values_hash = value_revision_manager.values_hash
+        values_dict = dict(value_revision_manager.agora_values_dict)
+        verdicts = {}
+        misses = []
+        for text in dict.fromkeys(texts):
+            verdict = alignment_cache.get(values_hash, text)
+            if verdict is None:
+                misses.append(text)
+            else:
+                verdicts[text] = verdict
+
+        batch_size = VALUES_CHECK["batch_size"]
+        for start in range(0, len(misses), batch_size):
+            batch = misses[start : start + batch_size]
+            scored = await self.run_llm(
+                guild,
+                lambda: self.llm_analyze_values_batch(values_dict, batch),
+                priority="values",
+            )
+            if scored is None:
+                break
+            for text, verdict in scored.items():
+                alignment_cache.put(values_hash, text, verdict)
+                verdicts[text] = verdict
+        return verdicts
+
+    async def llm_analyze_values_batch(self, values_dict, texts):
+        """
+        Analyze several messages against the values in a single LLM call
+
+        Verdicts are returned in the same form as llm_analyze_values
+        """
+        print(
+            f"{Fore.GREEN}※ applying values module to {len(texts)} messages{Style.RESET_ALL}"
+        )
+        llm = llm_provider.get(model_name="gpt-3.5-turbo", temperature=0.5)
+        prompt = PromptTemplate(
+            input_variables=["values", "messages"],
+            template=VALUES_BATCH_TEMPLATE,
+        )
+        chain = LLMChain(llm=llm, prompt=prompt)
+        response = await chain.arun(
+            values="\n".join(
+                f"- {value}: {description}"
+                for value, description in values_dict.items()
+            ),
+            messages="\n".join(
+                f"{number}. {' '.join(text.split())}"
+                for number, text in enumerate(texts, start=1)
+            ),
+        )
+        verdicts = {}
+        for number, alignment, reason in re.findall(
+            r"^\s*(\d+)\.\s*(aligned|misaligned)\s*:\s*(.*)$",
+            response,
+            re.IGNORECASE | re.MULTILINE,
+        ):
+            index = int(number) - 1
+            if not 0 <= index < len(texts):
+                continue
+            alignment = alignment.lower()
+            if alignment == "aligned":
+                verdict = f"This message aligns with our values. {reason.strip()}"
+            else:
+                verdict = (
+                    f"This message does not align with our values. {reason.strip()}"
+                )
+            verdicts[texts[index]] = (verdict, alignment)
+        return verdicts
+
     async def llm_analyze_values(self, values_dict, text):
         """
         Analyze message content based on values
         """
         print(f"{Fore.GREEN}※ applying values module{Style.RESET_ALL}")
-        llm = ChatOpenAI(temperature=0.5, model_name="gpt-3.5-turbo")
+        llm = llm_provider.get(model_name="gpt-3.5-turbo", temperature=0.5)
         template = f"We hold and maintain a set of mutually agreed-upon values. Analyze whether the message '{text}' is in accordance with the values we hold:\n\n"
         current_values_dict = value_revision_manager.agora_values_dict
         for (
@@ -412,66 +657,18 @@ class Values(CultureModule):
         )
         return response, alignment
 
-    # TODO: Finish implementing and refine
-    # async def randomly_check_values(self, bot, ctx, channel):
-    #     while True:
-    #         print("in a value check loop")
-    #         current_time = datetime.datetime.utcnow()
-    #         print(f"time is: {current_time}")
-    #         # Randomly generate delay between executions
-    #         delay = random.randint(45, 55)
-
-    #         # Wait for the specified delay
-    #         await asyncio.sleep(delay)
 
-    #         try:
-    #             # Fetch a random message from a game channel
-    #             messages = []
-    #             async for message in channel.history(limit=100, after=current_time):
-    #                 if (
-    #                     message.content.startswith("※")
-    #                     or isinstance(message, discord.Message)
-    #                     and not message.author.bot
-    #                 ):
-    #                     messages.append(message)
-
-    #             if not messages:
-    #                 print("No valid messages found in the channel")
-    #                 return
-
-    #             # Generate a list of valid message IDs
-    #             valid_message_ids = [message.id for message in messages]
-
-    #             random_message_id = random.choice(valid_message_ids)
-
-    #             random_message = await channel.fetch_message(random_message_id)
-    #             print("fetched random message")
-
-    #             # Check values of the random message
-    #             await self.check_values(bot, channel, random_message)
-    #         except Exception as e:
-    #             print(f"Error occurred while checking values: {e}")
-    #         except discord.NotFound:
-    #             print("Random message not found")
-    #         except discord.HTTPException as e:
-    #             print(f"Error occurrent while fetching random message: {e}")
-
-
-async def assign_role_to_user(user, role_name):
-    guild = user.guild
-    new_role = discord.utils.get(guild.roles, name=role_name)
-
-    # Define role variables
-    aligned_role = discord.utils.get(guild.roles, name="Aligned")
-    misaligned_role = discord.utils.get(guild.roles, name="Misaligned")
-
-    # Check if the user already has an alignment role
-    if aligned_role in user.roles and new_role == misaligned_role:
-        await user.remove_roles(aligned_role)
-    elif misaligned_role in user.roles and new_role == aligned_role:
-        await user.remove_roles(misaligned_role)
+def assign_role_to_user(user, role_name):
+    """
+    Give a member a role, replacing their other alignment role if it is one
 
-    await user.add_roles(new_role)
+    Changes are merged per member and applied shortly after in a single edit;
+    returns the task applying them
+    """
+    remove = []
+    if role_name in ALIGNMENT_ROLES:
+        remove = [name for name in ALIGNMENT_ROLES if name != role_name]
+    return role_changes.change(user, add=[role_name], remove=remove)
 
 
 class Eloquence(CultureModule):
@@ -482,7 +679,11 @@ class Eloquence(CultureModule):
         A LLM filter for messages during the /eloquence command/function
         """
         print(f"{Fore.GREEN}※ applying eloquence module{Style.RESET_ALL}")
-        llm = ChatOpenAI(temperature=0.5, model_name="gpt-3.5-turbo")
+        llm = llm_provider.get(
+            model_name="gpt-3.5-turbo",
+            temperature=0.5,
+            streaming=self.config.get("streaming", False),
+        )
         prompt = PromptTemplate.from_template(
             template="You are from the Shakespearean era. Please rewrite the following input in a way that makes the speaker sound as eloquent, persuasive, and rhetorical as possible, while maintaining the original meaning and intent. Don't complete any sentences, jFust rewrite them. Input: {input_text}"
         )
@@ -490,13 +691,38 @@ class Eloquence(CultureModule):
             input_text=message_string
         )  # TODO: is both formatting and passing the message_string necessary?
         chain = LLMChain(llm=llm, prompt=prompt)
-        response = await chain.arun(message_string)
-        return response
+        response = await self.run_llm(message.guild, lambda: chain.arun(message_string))
+        return response if response is not None else message_string
 
 
 ACTIVE_MODULES_BY_CHANNEL = defaultdict(OrderedSet)
 
 
+class FilterPlan:
+    """
+    What a channel's active culture modules do to each message, resolved up front
+
+    Plans are rebuilt only when a module is toggled, so the message path does not
+    look modules up or scan their configs.
+    """
+
+    __slots__ = ("names", "modules", "alters_messages")
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.modules = tuple(CULTURE_MODULES[name] for name in self.names)
+        self.alters_messages = any(
+            module.config["message_alter_mode"] for module in self.modules
+        )
+
+
+# Filter plans by (guild_id, channel_id); channels with no active module have none
+FILTER_PLANS = {}
+
+# Callables receiving (guild_id, channel_id, module_name, state) on every toggle
+CULTURE_TOGGLE_LISTENERS = []
+
+
 async def toggle_culture_module(guild_id, channel_id, module_name, state):
     """
     If state is True, turn on the culture module
@@ -510,6 +736,14 @@ async def toggle_culture_module(guild_id, channel_id, module_name, state):
     else:
         active_modules_by_channel.remove(module_name)
 
+    if active_modules_by_channel:
+        FILTER_PLANS[key] = FilterPlan(active_modules_by_channel)
+    else:
+        FILTER_PLANS.pop(key, None)
+
+    for listener in CULTURE_TOGGLE_LISTENERS:
+        listener(guild_id, channel_id, module_name, state)
+
 
 # TODO: what does the variable "state" mean?
 async def display_culture_module_state(ctx, guild_id, channel_id, module_name, state):
@@ -574,7 +808,7 @@ async def display_culture_module_state(ctx, guild_id, channel_id, module_name, s
             inline=False,
         )
 
-    await ctx.send(embed=embed)
+    await rest_scheduler.send(ctx, embed=embed)
 
 
 def get_values_message():
@@ -599,12 +833,12 @@ CULTURE_MODULES = {
             "mode": None,
             "help": False,
             "message_alter_mode": "llm",
+            "llm_timeout": 6.0,  # seconds before falling back to the text-only filters
             "llm_disclosure": None,
             "activated_message": "Messages will now be process through an LLM.",
             "deactivated_message": "Messages will no longer be processed through an LLM.",
             "url": "",  # TODO: Add Wildcard URL
             "icon": GOVERNANCE_SVG_ICONS["culture"],
-            "input_value": 0,
             "values_list": None,
         }
     ),
@@ -621,7 +855,6 @@ CULTURE_MODULES = {
             "deactivated_message": "Messages will no longer be distored by obscurity.",
             "url": "https://raw.githubusercontent.com/metagov/d20-governance/main/assets/imgs/embed_thumbnails/obscurity.png",
             "icon": GOVERNANCE_SVG_ICONS["culture"],
-            "input_value": 0,
             "values_list": None,
         }
     ),
@@ -633,12 +866,13 @@ CULTURE_MODULES = {
             "mode": None,
             "help": False,
             "message_alter_mode": "llm",
+            "llm_timeout": 5.0,  # seconds before falling back to the text-only filters
+            "streaming": True,  # repost while the rewrite streams in
             "llm_disclosure": "You are from the Shakespearean era. Please rewrite the messages in a way that makes the speaker sound as eloquent, persuasive, and rhetorical as possible, while maintaining the original meaning and intent.",
             "activated_message": "Messages will now be process through an LLM.",
             "deactivated_message": "Messages will no longer be processed through an LLM.",
             "url": "https://raw.githubusercontent.com/metagov/d20-governance/main/assets/imgs/embed_thumbnails/eloquence.png",
             "icon": GOVERNANCE_SVG_ICONS["culture"],
-            "input_value": 0,
             "values_list": None,
         }
     ),
@@ -650,12 +884,12 @@ CULTURE_MODULES = {
             "mode": None,
             "help": False,
             "message_alter_mode": "llm",
+            "llm_timeout": 6.0,  # seconds before falling back to the text-only filters
             "llm_disclosure": "Write a message that reflects the content in the posted message and is cast in agreement with the previous message. Preserve and transfer any spelling errors or text transformations in these messages in the response.",
             "activated_message": "A ritual of agreement permeates throughout the group.",
             "deactivated_message": "Automatic agreement has ended. But will the effects linger in practice?",
             "url": "",  # TODO: make ritual img
             "icon": GOVERNANCE_SVG_ICONS["culture"],
-            "input_value": 0,
             "values_list": None,
         }
     ),
@@ -667,12 +901,13 @@ CULTURE_MODULES = {
             "mode": None,
             "help": False,
             "message_alter_mode": "llm",
+            "llm_timeout": 4.0,  # seconds before falling back to the text-only filters
+            "streaming": True,  # repost while the rewrite streams in
             "llm_disclosure": "Using the provided input text, generate a revised version that amplifies its sentiment to a much greater degree. Maintain the overall context and meaning of the message while significantly heightening the emotional tone.",
             "activated_message": "Sentiment amplification abounds.",
             "deactivated_message": "Sentiment amplification has ceased.",
             "url": "",  # TODO: make amplify img
             "icon": GOVERNANCE_SVG_ICONS["culture"],
-            "input_value": 0,
             "values_list": None,
         }
     ),
@@ -690,12 +925,90 @@ CULTURE_MODULES = {
             "deactivated_message": "Automatic measurement of values is no longer present, through an essence of the culture remains, and you can respond to messages with `check-values` to check value alignment.",
             "url": "",  # TODO: make values img
             "icon": GOVERNANCE_SVG_ICONS["culture"],
-            "input_value": 0,
             "values_list": values_list,
         }
     ),
 }
 
+# Culture modules activate in a channel once their input is above the 📍 marker
+culture_tally = Tally(
+    {name: module.config["name"] for name, module in CULTURE_MODULES.items()},
+    threshold=INPUT_SPECTRUM["threshold"] + 1,
+    pin=INPUT_SPECTRUM["threshold"],
+)
+
+
+filter_latency = LatencyHistogram()
+filter_timeouts = defaultdict(int)  # module name -> filters that missed their deadline
+
+
+async def apply_text_modules(active_modules, message, message_content: str):
+    """
+    Apply only the text-mode culture modules, which need no LLM call
+    """
+    module: CultureModule
+    for module in active_modules:
+        if module.config["message_alter_mode"] == "text":
+            message_content = await module.filter_message(message, message_content)
+    return message_content
+
+
+async def apply_culture_modules(
+    active_modules, message, message_content: str, stream=None
+):
+    """
+    Filter messages based on culture modules
+
+    Filtering is cumulative
+
+    `active_modules` are the module objects in order of application, usually the
+    channel's FilterPlan.modules
+
+    Each LLM module gets its own deadline. If one misses it, the original message
+    with only the text-mode modules applied is returned instead, so the reposted
+    message is never held up by a stalled provider.
+
+    If the last module streams its rewrite, its tokens are fed to `stream`.
+    """
+
+    # Increment message count for the user (for diversity module)
+    user_id = message.author.id
+    USER_MESSAGE_COUNT[user_id] = USER_MESSAGE_COUNT.get(user_id, 0) + 1
+
+    started = time.monotonic()
+    filtered_message = message_content
+    last_module = active_modules[-1] if active_modules else None
+    module: CultureModule
+    for module in active_modules:
+        if module.config["message_alter_mode"] != "llm":
+            filtered_message = await module.filter_message(message, filtered_message)
+            continue
+        # Later modules would rewrite the text again, so only the last one streams
+        streams = (
+            stream is not None
+            and module is last_module
+            and module.config.get("streaming", False)
+        )
+        sink = token_sink.set(stream.feed if streams else None)
+        try:
+            filtered_message = await asyncio.wait_for(
+                module.filter_message(message, filtered_message),
+                timeout=module.llm_timeout(),
+            )
+        except asyncio.TimeoutError:
+            filter_timeouts[module.config["name"]] += 1
+            print(
+                f"{Fore.YELLOW}※ {module.config['name']} missed its {module.llm_timeout()}s deadline, posting text-only filters{Style.RESET_ALL}"
+            )
+            filtered_message = await apply_text_modules(
+                active_modules, message, message_content
+            )
+            break
+        finally:
+            token_sink.reset(sink)
+    filter_latency.observe(time.monotonic() - started)
+    return filtered_message
+
 
 async def send_msg_to_random_player(game_channel):
     print("Sending random DM...")
@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import logging
+
+from collections import OrderedDict, deque
+
+import discord
+
+from d20_governance.utils.constants import RECENT_MESSAGES
+
+
+def is_eligible(author_is_bot, content):
+    """
+    Whether a message counts as conversation: user posts and our webhook reposts,
+    but no commands
+    """
+    if author_is_bot and not content.startswith("※"):
+        return False
+    return not (content.startswith("/") or content.startswith("-"))
+
+
+class RecentMessage:
+    __slots__ = (
+        "id",
+        "channel_id",
+        "author",
+        "author_id",
+        "content",
+        "timestamp",
+        "is_repost",
+    )
+
+    def __init__(
+        self, id, channel_id, author, author_id, content, timestamp, is_repost
+    ):
+        self.id = id
+        self.channel_id = channel_id
+        self.author = author  # display name, as shown in the channel
+        self.author_id = (
+            author_id  # member who wrote it, also for reposts; None if unknown
+        )
+        self.content = content
+        self.timestamp = timestamp
+        self.is_repost = is_repost  # posted by our webhook on the author's behalf
+
+
+class RecentMessageStore:
+    """
+    Bounded store of recent eligible messages shared by the culture modules
+
+    Each channel keeps its last `depth` messages, fed from on_message and from our
+    own webhook reposts, and messages can be looked up by id, so neither finding a
+    channel's previous message nor resolving a reply needs a REST call. At most
+    `max_channels` channels are kept; the least recently active one is dropped first.
+    A channel's history is only fetched once, the first time it is read after a
+    (re)start.
+    """
+
+    def __init__(
+        self,
+        depth=RECENT_MESSAGES["depth"],
+        max_channels=RECENT_MESSAGES["max_channels"],
+    ):
+        self.depth = depth
+        self.max_channels = max_channels
+        self.channels = (
+            OrderedDict()
+        )  # channel_id -> deque of RecentMessage, newest last
+        self.by_id = {}  # message id -> RecentMessage
+        self.backfills = {}  # channel_id -> task fetching the channel's history once
+        self.listeners = []  # callables receiving every newly recorded message
+        self.metrics = {"recorded": 0, "hits": 0, "misses": 0, "backfills": 0}
+
+    def _buffer(self, channel_id):
+        buffer = self.channels.get(channel_id)
+        if buffer is None:
+            buffer = deque()
+            self.channels[channel_id] = buffer
+            while len(self.channels) > self.max_channels:
+                self._drop_channel(next(iter(self.channels)))
+        else:
+            self.channels.move_to_end(channel_id)
+        return buffer
+
+    def _drop_channel(self, channel_id):
+        for record in self.channels.pop(channel_id, ()):
+            self.by_id.pop(record.id, None)
+        backfill = self.backfills.pop(channel_id, None)
+        if backfill is not None and not backfill.done():
+            backfill.cancel()
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def add(
+        self,
+        channel_id,
+        message_id,
+        author,
+        content,
+        is_repost=False,
+        timestamp=None,
+        author_id=None,
+    ):
+        """
+        Record a message; reposts that are sent again (e.g. coalesced) are updated in place
+        """
+        if not is_eligible(is_repost, content):
+            return None
+        record = self.by_id.get(message_id)
+        if record is not None:
+            record.content = content
+            return record
+        record = RecentMessage(
+            message_id,
+            channel_id,
+            author,
+            author_id,
+            content,
+            timestamp or datetime.datetime.now(datetime.timezone.utc),
+            is_repost,
+        )
+        self._append(record)
+        self.metrics["recorded"] += 1
+        for listener in self.listeners:
+            listener(record)
+        return record
+
+    def _append(self, record):
+        buffer = self._buffer(record.channel_id)
+        if len(buffer) >= self.depth:
+            self.by_id.pop(buffer.popleft().id, None)
+        buffer.append(record)
+        self.by_id[record.id] = record
+
+    def add_message(self, message: discord.Message):
+        if message.author.bot:
+            return None  # Reposts are recorded when we send them
+        return self.add(
+            message.channel.id,
+            message.id,
+            str(message.author),
+            message.content,
+            timestamp=message.created_at,
+            author_id=message.author.id,
+        )
+
+    def discard(self, message_id):
+        """
+        Forget a message, e.g. an original we deleted to repost it filtered
+        """
+        record = self.by_id.pop(message_id, None)
+        if record is not None:
+            self.channels[record.channel_id].remove(record)
+
+    def get(self, message_id):
+        record = self.by_id.get(message_id)
+        self.metrics["hits" if record is not None else "misses"] += 1
+        return record
+
+    def recent(self, channel_id):
+        """
+        Recent messages of a channel, oldest first
+        """
+        return list(self.channels.get(channel_id, ()))
+
+    async def previous(self, channel, exclude_id=None):
+        """
+        The most recent message in a channel other than `exclude_id`
+        """
+        backfill = self.backfills.get(channel.id)
+        if backfill is not None and backfill.done():
+            if backfill.cancelled() or backfill.exception() is not None:
+                backfill = None  # try again instead of replaying the failure
+        if backfill is None:
+            backfill = asyncio.create_task(self._backfill(channel))
+            self.backfills[channel.id] = backfill
+        # Callers may be cancelled by a filter deadline; the shared fetch carries on
+        await asyncio.shield(backfill)
+
+        for record in reversed(self.channels.get(channel.id, ())):
+            if record.id != exclude_id:
+                return record
+        return None
+
+    async def _backfill(self, channel):
+        self.metrics["backfills"] += 1
+        try:
+            fetched = [msg async for msg in channel.history(limit=self.depth)]
+        except discord.HTTPException as e:
+            logging.error(f"Could not backfill history for channel {channel.id}: {e}")
+            self.backfills.pop(channel.id, None)  # try again on the next read
+            return
+        # Messages recorded since the restart are newer than anything fetched
+        newer = self.channels.pop(channel.id, deque())
+        for record in newer:
+            self.by_id.pop(record.id, None)
+        newer_ids = {record.id for record in newer}
+        # Discord returns history newest first
+        for msg in reversed(fetched):
+            if msg.id not in newer_ids:
+                self.add(
+                    channel.id,
+                    msg.id,
+                    str(msg.author),
+                    msg.content,
+                    is_repost=msg.author.bot,
+                    timestamp=msg.created_at,
+                    author_id=None if msg.author.bot else msg.author.id,
+                )
+        for record in newer:
+            self._append(record)
+
+
+recent_messages = RecentMessageStore()
@@ -0,0 +1,261 @@
+import os
+import json
+import base64
+import random
+import asyncio
+import hashlib
+import logging
+
+from collections import OrderedDict
+
+import aiohttp
+
+from d20_governance.utils.constants import (
+    ENGINE_ID,
+    IMAGE_CACHE,
+    IMAGE_CACHE_PATH,
+    STABILITY_API_HOST,
+    STABILITY_TOKEN,
+    STABILITY_CLIENT,
+)
+
+
+class ImageGenerationError(Exception):
+    pass
+
+
+class ImageCache:
+    """
+    Content-addressed disk cache for generated images
+
+    Images are stored under a hash of the prompt, engine and generation parameters.
+    Total size is bounded by `max_bytes`; the least recently used images are evicted
+    first, with file modification times carrying the recency across restarts.
+    """
+
+    def __init__(self, path=IMAGE_CACHE_PATH, max_bytes=IMAGE_CACHE["max_bytes"]):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries = None  # key -> size in bytes, least recently used first
+        self.total_bytes = 0
+        self.metrics = {"hits": 0, "misses": 0, "evicted": 0}
+
+    @staticmethod
+    def key(engine_id, payload):
+        data = json.dumps({"engine": engine_id, **payload}, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.png")
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = OrderedDict()
+        if not os.path.isdir(self.path):
+            return
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith(".png"):
+                stat = os.stat(os.path.join(self.path, name))
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def get(self, key):
+        """
+        Return cached image bytes for a key, or None
+        """
+        self._load()
+        if key not in self.entries:
+            self.metrics["misses"] += 1
+            return None
+        try:
+            with open(self._file(key), "rb") as f:
+                image_data = f.read()
+        except OSError:
+            self.total_bytes -= self.entries.pop(key)
+            self.metrics["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        os.utime(self._file(key))
+        self.metrics["hits"] += 1
+        return image_data
+
+    def put(self, key, image_data):
+        self._load()
+        os.makedirs(self.path, exist_ok=True)
+        tmp_file = f"{self._file(key)}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(image_data)
+        os.replace(tmp_file, self._file(key))
+
+        self.total_bytes -= self.entries.pop(key, 0)
+        self.entries[key] = len(image_data)
+        self.total_bytes += len(image_data)
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.metrics["evicted"] += 1
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+
+
+class StabilityClient:
+    """
+    Async client for Stability's text-to-image endpoint
+
+    Requests share one pooled HTTP session and are retried with exponential backoff on
+    rate limits, server errors and timeouts. Images are returned as PNG bytes so callers
+    can post them straight from memory. Results are kept in an ImageCache, and
+    concurrent requests for the same image share a single API call.
+    """
+
+    def __init__(
+        self,
+        api_host=STABILITY_API_HOST,
+        engine_id=ENGINE_ID,
+        token=STABILITY_TOKEN,
+        settings=STABILITY_CLIENT,
+        cache=None,
+    ):
+        self.api_host = api_host
+        self.engine_id = engine_id
+        self.token = token
+        self.settings = settings
+        self.cache = cache
+        self.session = None
+        self.pending = {}  # cache key -> task generating that image
+        self.waiters = {}  # pending task -> number of callers awaiting it
+        self.metrics = {"generated": 0, "retried": 0, "failed": 0}
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.settings["connections"]),
+                timeout=aiohttp.ClientTimeout(total=self.settings["timeout"]),
+                headers={
+                    "Content-Type": "application/json",
+                    "Accept": "application/json",
+                    "Authorization": f"Bearer {self.token}",
+                },
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def generate(self, prompt):
+        """
+        Generate an image for a prompt and return it as PNG bytes
+        """
+        payload = {
+            "text_prompts": [{"text": prompt}],
+            "cfg_scale": 7,
+            "clip_guidance_preset": "FAST_BLUE",
+            "height": 512,
+            "width": 512,
+            "samples": 1,
+            "steps": 10,  # minimum 10 steps, more steps longer generation time
+        }
+        if self.cache is None:
+            return await self._request(payload)
+
+        key = self.cache.key(self.engine_id, payload)
+        image_data = self.cache.get(key)
+        if image_data is not None:
+            return image_data
+
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request_and_store(key, payload))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        # Shielded so a cancelled caller does not abort a request others wait on;
+        # the request itself is cancelled along with its last caller
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters[task] == 1 and not task.done():
+                task.cancel()
+                self._forget(key, task)
+            raise
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+
+    def _forget(self, key, task):
+        if self.pending.get(key) is task:
+            del self.pending[key]
+
+    async def _request_and_store(self, key, payload):
+        image_data = await self._request(payload)
+        self.cache.put(key, image_data)
+        return image_data
+
+    async def pregenerate(self, prompts):
+        """
+        Warm the cache for several prompts in parallel
+
+        Returns the number of images that are now available.
+        """
+        semaphore = asyncio.Semaphore(self.settings["pregenerate_concurrency"])
+
+        async def warm(prompt):
+            async with semaphore:
+                try:
+                    await self.generate(prompt)
+                    return True
+                except ImageGenerationError as e:
+                    logging.error(f"Image pre-generation failed: {e}")
+                    return False
+
+        results = await asyncio.gather(*(warm(prompt) for prompt in set(prompts)))
+        return sum(results)
+
+    async def _request(self, payload):
+        session = self.get_session()
+        url = f"{self.api_host}/v1/generation/{self.engine_id}/text-to-image"
+        for attempt in range(self.settings["retries"] + 1):
+            if attempt > 0:
+                self.metrics["retried"] += 1
+            try:
+                async with session.post(url, json=payload) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        self.metrics["generated"] += 1
+                        return base64.b64decode(data["artifacts"][0]["base64"])
+                    if response.status != 429 and response.status < 500:
+                        self.metrics["failed"] += 1
+                        raise ImageGenerationError(
+                            f"Non-200 response: {await response.text()}"
+                        )
+                    logging.error(
+                        f"Image generation returned {response.status}, retrying"
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error(f"Image generation request failed: {e}")
+            if attempt < self.settings["retries"]:
+                await self._backoff(attempt)
+
+        self.metrics["failed"] += 1
+        raise ImageGenerationError(
+            f"Giving up on image generation after {self.settings['retries'] + 1} attempts"
+        )
+
+    async def _backoff(self, attempt):
+        delay = self.settings["backoff"] * 2**attempt
+        await asyncio.sleep(delay + random.uniform(0, delay))
+
+
+image_cache = ImageCache()
+stability_client = StabilityClient(cache=image_cache)
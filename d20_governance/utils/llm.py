@@ -0,0 +1,332 @@
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import contextvars
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from langchain.callbacks.base import AsyncCallbackHandler, AsyncCallbackManager
+from langchain.chat_models import ChatOpenAI
+from langchain.llms.base import LLM
+
+from d20_governance.utils.constants import (
+    FAKE_LLM,
+    LLM_BACKEND,
+    LLM_GOVERNOR,
+    LLM_PRIORITIES,
+)
+from d20_governance.utils.scheduler import QueueWaits, TokenBucket
+
+
+class FakeLLMError(Exception):
+    pass
+
+
+class LLMRejected(Exception):
+    pass
+
+
+FAKE_STAGE = """- stage: A Fork in the Road
+  message: The community reaches a crossroads and must decide how to move forward.
+  actions:
+    - action: "vote_governance culture"
+  progress_conditions: []
+"""
+
+# (pattern, response) pairs tried in order against the full prompt. A response is
+# either a template expanded with the match groups or a callable taking the match.
+FAKE_LLM_RULES = [
+    (r"generate the next stage", FAKE_STAGE),
+    (r"Progressively summarize", "The community keeps building its governance."),
+    (
+        r"Score each numbered message.*Messages:\n(?P<messages>.*?)\n\nAnswer:",
+        lambda match: "\n".join(
+            f"{number}. misaligned: It dismisses others."
+            if re.search(r"\b(hate|never|stupid)\b", text, re.IGNORECASE)
+            else f"{number}. aligned: It is constructive."
+            for number, text in re.findall(r"^(\d+)\. (.*)$", match["messages"], re.M)
+        ),
+    ),
+    (
+        r"analyze the message:\n(?P<text>.*?)\. Start the message",
+        lambda match: (
+            "This message does not align with our values. It dismisses others."
+            if re.search(r"\b(hate|never|stupid)\b", match["text"], re.IGNORECASE)
+            else "This message aligns with our values. It is constructive."
+        ),
+    ),
+    (
+        r"reflects the content in the message '(?P<text>.*?)' but is cast in agreement",
+        r"I agree, \g<text>",
+    ),
+    (
+        r"amplifies its sentiment.*Input text: (?P<text>.*)\Z",
+        lambda match: f"{match['text'].upper()}!!!",
+    ),
+    (r"Shakespearean era.*Input: (?P<text>.*)\Z", r"Prithee, hark: \g<text>"),
+    (r"You are from (?P<group>.*?)\..*Input: (?P<text>.*)\Z", r"\g<text> ~\g<group>"),
+]
+
+
+# Coroutine function receiving the streamed tokens of LLM calls made by the current task
+token_sink = contextvars.ContextVar("token_sink", default=None)
+
+
+class TokenRouter(AsyncCallbackHandler):
+    """
+    Forward streamed tokens to the sink set by the task that made the LLM call
+
+    Streaming clients are shared between calls, so the handler is registered once and
+    each call picks its destination through the `token_sink` context variable.
+    """
+
+    @property
+    def always_verbose(self) -> bool:
+        return True
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        sink = token_sink.get()
+        if sink is not None:
+            await sink(token)
+
+
+class FakeLLM(LLM):
+    """
+    Local stand-in for a hosted LLM
+
+    Responses come from deterministic rewrite rules, while latency and errors are drawn
+    from configurable distributions, so filtering throughput, concurrency limits and
+    caching can be benchmarked without the network.
+    """
+
+    latency: Dict[str, Any] = FAKE_LLM["latency"]
+    error_rate: float = FAKE_LLM["error_rate"]
+    seed: Optional[int] = FAKE_LLM["seed"]
+    rules: List[Tuple[str, Union[str, Callable]]] = FAKE_LLM_RULES
+    rng: Any = None
+    calls: int = 0
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def sample_latency(self):
+        if self.rng is None:
+            self.rng = random.Random(self.seed)
+        distribution = self.latency["distribution"]
+        if distribution == "fixed":
+            return self.latency["seconds"]
+        if distribution == "uniform":
+            return self.rng.uniform(self.latency["low"], self.latency["high"])
+        if distribution == "lognormal":
+            return (
+                self.rng.lognormvariate(0, self.latency["sigma"])
+                * self.latency["median"]
+            )
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    def respond(self, prompt):
+        self.calls += 1
+        if self.rng is None:
+            self.rng = random.Random(self.seed)
+        if self.rng.random() < self.error_rate:
+            raise FakeLLMError("Simulated LLM failure")
+        for pattern, response in self.rules:
+            match = re.search(pattern, prompt, re.DOTALL)
+            if match is None:
+                continue
+            if callable(response):
+                return response(match)
+            return match.expand(response)
+        return prompt.strip().splitlines()[-1]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        time.sleep(self.sample_latency())
+        return self.respond(prompt)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        latency = self.sample_latency()
+        response = self.respond(prompt)
+        if not self.streaming:
+            await asyncio.sleep(latency)
+            return response
+        # Spread the latency over the words, like a streamed completion
+        tokens = re.findall(r"\S+\s*", response) or [response]
+        for token in tokens:
+            await asyncio.sleep(latency / len(tokens))
+            await self.callback_manager.on_llm_new_token(token, verbose=self.verbose)
+        return response
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+
+class LLMProvider:
+    """
+    Hands out LLM clients for the configured backend
+
+    Clients are created once per model and temperature and shared between calls.
+    Set D20_LLM_BACKEND=fake to run every LLM feature against FakeLLM.
+    """
+
+    def __init__(self, backend=LLM_BACKEND, fake_settings=FAKE_LLM):
+        self.backend = backend
+        self.fake_settings = fake_settings
+        self.clients = {}
+
+    def get(self, model_name="gpt-3.5-turbo", temperature=0.7, streaming=False):
+        """
+        Return the shared client for a model and temperature
+
+        Streaming clients send their tokens to the calling task's `token_sink`.
+        """
+        key = (model_name, temperature, streaming)
+        client = self.clients.get(key)
+        if client is None:
+            callbacks = {}
+            if streaming:
+                callbacks = {
+                    "streaming": True,
+                    "callback_manager": AsyncCallbackManager([TokenRouter()]),
+                }
+            if self.backend == "fake":
+                client = FakeLLM(**self.fake_settings, **callbacks)
+            elif self.backend == "openai":
+                client = ChatOpenAI(
+                    model_name=model_name, temperature=temperature, **callbacks
+                )
+            else:
+                raise ValueError(f"Unknown LLM backend: {self.backend}")
+            self.clients[key] = client
+        return client
+
+
+class LLMGovernor:
+    """
+    Bound the bot's concurrent LLM calls and share them out by priority
+
+    At most `concurrency` calls run at once. Waiting calls are started lane by lane in
+    LLM_PRIORITIES order, so quest narration and values checks go before cosmetic
+    rewrites. Calls in budgeted lanes also spend a token from their module's and their
+    guild's bucket, and are rejected with LLMRejected when either is empty or too many
+    calls are already waiting, so a spike degrades to unfiltered messages instead of
+    every filter timing out together.
+    """
+
+    def __init__(self, settings=LLM_GOVERNOR, priorities=LLM_PRIORITIES):
+        self.settings = settings
+        self.priorities = priorities
+        self.active = 0
+        self.waiters = []  # heap of (rank, order, future)
+        self.order = itertools.count()
+        self.module_buckets = {}
+        self.guild_buckets = {}
+        self.metrics = {
+            "completed": 0,
+            "in_flight": 0,
+            "rejected": {"module_budget": 0, "guild_budget": 0, "queue_full": 0},
+        }
+        self.queue_wait = QueueWaits(priorities)
+
+    def _bucket(self, buckets, key, capacity, refill):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, refill)
+            buckets[key] = bucket
+        return bucket
+
+    def _reject(self, reason, module, guild_id):
+        self.metrics["rejected"][reason] += 1
+        raise LLMRejected(
+            f"LLM call for {module} in guild {guild_id} rejected: {reason}"
+        )
+
+    def _check_budget(self, module, guild_id):
+        if len(self.waiters) >= self.settings["max_waiting"]:
+            self._reject("queue_full", module, guild_id)
+        module_bucket = self._bucket(
+            self.module_buckets,
+            module,
+            self.settings["module_capacity"],
+            self.settings["module_refill"],
+        )
+        guild_bucket = self._bucket(
+            self.guild_buckets,
+            guild_id,
+            self.settings["guild_capacity"],
+            self.settings["guild_refill"],
+        )
+        if module_bucket.wait_time() > 0:
+            self._reject("module_budget", module, guild_id)
+        if guild_bucket.wait_time() > 0:
+            self._reject("guild_budget", module, guild_id)
+        module_bucket.try_take()
+        guild_bucket.try_take()
+
+    async def _acquire(self, priority):
+        if self.active < self.settings["concurrency"] and not self.waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (self.priorities[priority], next(self.order), future)
+        heapq.heappush(self.waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._release()
+            elif entry in self.waiters:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+            raise
+
+    def _release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                # Hand the slot straight to the most urgent waiter
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    async def run(self, call, module, guild_id=None, priority="cosmetic"):
+        """
+        Run `call()` (a coroutine factory) once the governor allows it
+
+        Raises LLMRejected if the call's budget is exhausted.
+        """
+        if priority in self.settings["budgeted_lanes"]:
+            self._check_budget(module, guild_id)
+
+        enqueued = time.monotonic()
+        await self._acquire(priority)
+        self.queue_wait.observe(priority, time.monotonic() - enqueued)
+
+        self.metrics["in_flight"] += 1
+        try:
+            return await call()
+        finally:
+            self.metrics["in_flight"] -= 1
+            self.metrics["completed"] += 1
+            self._release()
+
+    def snapshot(self):
+        """
+        Return a copy of the governor metrics with average queue waits
+        """
+        return {
+            "completed": self.metrics["completed"],
+            "in_flight": self.metrics["in_flight"],
+            "waiting": len(self.waiters),
+            "rejected": dict(self.metrics["rejected"]),
+            "queue_wait": self.queue_wait.snapshot(),
+        }
+
+
+llm_provider = LLMProvider()
+llm_governor = LLMGovernor()
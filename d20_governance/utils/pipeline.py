@@ -0,0 +1,69 @@
+import time
+import asyncio
+import logging
+
+from d20_governance.utils.constants import STAGE_PIPELINE
+
+
+class PreparedStage:
+    def __init__(self, stage, embed, image_file=None, audio_file=None):
+        self.stage = stage
+        self.embed = embed
+        self.image_file = image_file
+        self.audio_file = audio_file
+
+
+class StagePipeline:
+    """
+    Prepare quest stages ahead of the stage being played
+
+    A background task runs `prepare` for each stage in order and hands the results
+    over through a bounded queue, so at most `lookahead` prepared stages wait while
+    the current stage runs. The gap between one stage finishing and the next one
+    being ready is recorded for every transition.
+    """
+
+    def __init__(self, stages, prepare, lookahead=STAGE_PIPELINE["lookahead"]):
+        self.stages = stages
+        self.prepare = prepare
+        self.queue = asyncio.Queue(maxsize=lookahead)
+        self.producer = None
+        self.error = None
+        self.stage_finished = None
+        self.gaps = []  # seconds between a stage finishing and the next being ready
+
+    def start(self):
+        self.producer = asyncio.create_task(self._produce())
+
+    async def _produce(self):
+        try:
+            for stage in self.stages:
+                await self.queue.put(await self.prepare(stage))
+        except Exception as e:
+            logging.error(f"Stage preparation failed: {e}")
+            self.error = e
+        await self.queue.put(None)
+
+    async def next(self):
+        """
+        Wait for the next prepared stage, or None when every stage has been played
+        """
+        prepared = await self.queue.get()
+        if prepared is None and self.error is not None:
+            raise self.error
+        if prepared is not None and self.stage_finished is not None:
+            self.gaps.append(time.monotonic() - self.stage_finished)
+        return prepared
+
+    def finish_stage(self):
+        self.stage_finished = time.monotonic()
+
+    def close(self):
+        if self.producer is not None:
+            self.producer.cancel()
+
+    def summary(self):
+        if not self.gaps:
+            return "no stage transitions"
+        average = sum(self.gaps) / len(self.gaps)
+        return f"{len(self.gaps)} transitions, avg gap {average:.2f}s, max gap {max(self.gaps):.2f}s"
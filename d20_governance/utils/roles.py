@@ -0,0 +1,102 @@
+import asyncio
+import logging
+
+import discord
+
+from colorama import Fore, Style
+
+from d20_governance.utils.constants import ROLE_CHANGES
+from d20_governance.utils.scheduler import rest_scheduler
+
+
+class RoleCoalescer:
+    """
+    Collect role changes per member and apply them as a single member edit
+
+    Role objects are cached per guild by name. Changes requested for a member within
+    `debounce` seconds are merged into a net delta, and the member is only edited if
+    that delta actually changes their roles.
+    """
+
+    def __init__(self, scheduler=rest_scheduler, debounce=ROLE_CHANGES["debounce"]):
+        self.scheduler = scheduler
+        self.debounce = debounce
+        self.roles = {}  # guild_id -> {role name: discord.Role}
+        self.pending = (
+            {}
+        )  # (guild_id, member_id) -> {"member", "roles": {role_id: (role, keep)}}
+        self.workers = (
+            {}
+        )  # (guild_id, member_id) -> task flushing that member's changes
+        self.metrics = {"requested": 0, "edits": 0, "unchanged": 0}
+
+    def role(self, guild, name):
+        roles = self.roles.get(guild.id)
+        if roles is None or name not in roles:
+            # First use in this guild, or the role was created since
+            roles = {role.name: role for role in guild.roles}
+            self.roles[guild.id] = roles
+        return roles.get(name)
+
+    def invalidate(self, guild_id):
+        """
+        Forget cached roles, e.g. after a role was renamed or deleted
+        """
+        self.roles.pop(guild_id, None)
+
+    def change(self, member, add=(), remove=()):
+        """
+        Request roles (by name) to be added to and removed from a member
+
+        Returns the task that applies the member's merged changes
+        """
+        key = (member.guild.id, member.id)
+        pending = self.pending.setdefault(key, {"member": member, "roles": {}})
+        pending["member"] = member
+        for names, keep in ((remove, False), (add, True)):
+            for name in names:
+                role = self.role(member.guild, name)
+                if role is None:
+                    logging.error(f"Role {name} does not exist in {member.guild.name}")
+                    continue
+                pending["roles"][role.id] = (role, keep)
+        self.metrics["requested"] += 1
+
+        worker = self.workers.get(key)
+        if worker is None or worker.done():
+            worker = asyncio.create_task(self._flush(key))
+            self.workers[key] = worker
+        return worker
+
+    async def _flush(self, key):
+        await asyncio.sleep(self.debounce)
+        pending = self.pending.pop(key)
+        self.workers.pop(key, None)
+        member = pending["member"]
+        guild_id = member.guild.id
+
+        # The default role is implied and cannot be set
+        current = {role.id: role for role in member.roles if role.id != guild_id}
+        roles = dict(current)
+        for role_id, (role, keep) in pending["roles"].items():
+            if keep:
+                roles[role_id] = role
+            else:
+                roles.pop(role_id, None)
+        if roles.keys() == current.keys():
+            self.metrics["unchanged"] += 1
+            return
+
+        try:
+            await self.scheduler.submit(
+                lambda: member.edit(roles=list(roles.values())),
+                route=f"members:{guild_id}",
+                priority="status",
+            )
+            self.metrics["edits"] += 1
+        except discord.HTTPException as e:
+            print(f"{Fore.RED}Could not update roles of {member}: {e}{Style.RESET_ALL}")
+            logging.error(f"Could not update roles of {member}: {e}")
+
+
+role_changes = RoleCoalescer()
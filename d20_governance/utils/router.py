@@ -0,0 +1,32 @@
+# Kinds of incoming messages, in the order they are checked
+OWN = "own"  # sent by the bot itself
+COMMAND = "command"  # prefixed or slash command text
+ECHO = "echo"  # our own webhook repost coming back through the gateway
+INPUT = "input"  # continuous input such as "wildcard +1"
+CHAT = "chat"  # everything else
+
+COMMAND_PREFIXES = ("-", "/")
+REPOST_PREFIX = "※"
+INPUT_SUFFIXES = {" +1": 1, " -1": -1}
+
+
+def classify_message(message, bot_user_id):
+    """
+    Classify a raw gateway message with cheap string checks
+
+    Returns (kind, payload), where payload is (module_name, change) for continuous
+    inputs and None otherwise. Nothing here awaits or builds a command context, so
+    messages that need no further handling are dropped before any work is done.
+    """
+    if message.author.id == bot_user_id:
+        return OWN, None
+    content = message.content
+    if content.startswith(COMMAND_PREFIXES):
+        return COMMAND, None
+    if content.startswith(REPOST_PREFIX):
+        return ECHO, None
+    stripped = content.strip()
+    change = INPUT_SUFFIXES.get(stripped[-3:])
+    if change is not None:
+        return INPUT, (stripped.split(" ", 1)[0], change)
+    return CHAT, None
@@ -0,0 +1,265 @@
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+
+import discord
+
+from d20_governance.utils.constants import REST_PRIORITIES, REST_SCHEDULER
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously up to its capacity
+    """
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.refill_rate
+        )
+        self.updated = now
+
+    def wait_time(self, amount=1):
+        """
+        Seconds until the bucket can give out the requested tokens
+        """
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def try_take(self, amount=1):
+        if self.wait_time(amount) > 0:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class QueueWaits:
+    """
+    Time spent waiting in a queue, per priority lane
+    """
+
+    def __init__(self, lanes):
+        self.lanes = {name: {"count": 0, "total": 0.0, "max": 0.0} for name in lanes}
+
+    def observe(self, lane, waited):
+        wait = self.lanes[lane]
+        wait["count"] += 1
+        wait["total"] += waited
+        wait["max"] = max(wait["max"], waited)
+
+    def snapshot(self):
+        """
+        Return the wait count, average and maximum of every lane
+        """
+        return {
+            name: {
+                "count": wait["count"],
+                "avg": wait["total"] / wait["count"] if wait["count"] else 0.0,
+                "max": wait["max"],
+            }
+            for name, wait in self.lanes.items()
+        }
+
+
+class ScheduledRequest:
+    sequence = itertools.count()
+
+    def __init__(self, factory, route, priority, rank, supersede_key):
+        self.factory = factory
+        self.route = route
+        self.priority = priority
+        self.rank = rank
+        self.supersede_key = supersede_key
+        self.order = next(self.sequence)
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+        self.dropped = False
+
+    def __lt__(self, other):
+        return (self.rank, self.order) < (other.rank, other.order)
+
+
+class RestScheduler:
+    """
+    Central scheduler for outbound Discord REST calls
+
+    Requests are started in priority order (see REST_PRIORITIES) and paced by a token
+    bucket per route, so bursts from one channel do not run into Discord's rate limits.
+    Requests sharing a supersede key, such as repeated edits of the same message, never
+    run concurrently, and a queued one is dropped when a newer one arrives.
+    """
+
+    def __init__(self, settings=REST_SCHEDULER, priorities=REST_PRIORITIES):
+        self.settings = settings
+        self.priorities = priorities
+        self.queue = []  # heap of ScheduledRequest
+        self.pending = {}  # supersede_key -> queued ScheduledRequest
+        self.active_keys = set()  # supersede keys with a request in flight
+        self.buckets = {}  # route -> TokenBucket
+        self.in_flight = set()
+        self.dispatcher = None
+        self.wakeup = None
+        self.loop = None
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "superseded": 0,
+            "rate_limited": 0,
+        }
+        self.queue_wait = QueueWaits(priorities)
+
+    def _bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            bucket = TokenBucket(
+                self.settings["route_capacity"], self.settings["route_refill"]
+            )
+            self.buckets[route] = bucket
+        return bucket
+
+    async def submit(self, factory, route, priority="cosmetic", supersede_key=None):
+        """
+        Schedule a REST call and wait for its result
+
+        `factory` is called with no arguments to create the request coroutine once the
+        route has capacity. Returns None if the request was superseded before it ran.
+        """
+        request = ScheduledRequest(
+            factory, route, priority, self.priorities[priority], supersede_key
+        )
+        self.metrics["submitted"] += 1
+
+        if supersede_key is not None:
+            previous = self.pending.get(supersede_key)
+            if previous is not None:
+                # Keep the queued request's place in line but run the newest call
+                previous.dropped = True
+                previous.future.set_result(None)
+                request.order = previous.order
+                request.enqueued = previous.enqueued
+                self.metrics["superseded"] += 1
+            self.pending[supersede_key] = request
+
+        heapq.heappush(self.queue, request)
+        self._wake()
+        return await request.future
+
+    async def send(self, destination, priority="status", **kwargs):
+        """
+        Schedule `destination.send(**kwargs)` on the destination channel's route
+        """
+        channel = getattr(destination, "channel", destination)
+        return await self.submit(
+            lambda: destination.send(**kwargs),
+            route=f"channel:{channel.id}",
+            priority=priority,
+        )
+
+    async def edit(self, message, priority="cosmetic", **kwargs):
+        """
+        Schedule `message.edit(**kwargs)`, dropping older queued edits of the same fields
+        """
+        return await self.submit(
+            lambda: message.edit(**kwargs),
+            route=f"channel:{message.channel.id}",
+            priority=priority,
+            supersede_key=("edit", message.id, tuple(sorted(kwargs))),
+        )
+
+    def _wake(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # The dispatcher and event belong to the loop that created them
+            self.loop = loop
+            self.wakeup = asyncio.Event()
+            self.dispatcher = None
+        self.wakeup.set()
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while self.queue or self.in_flight:
+            self.wakeup.clear()
+            parked = []
+            next_wait = None
+            while self.queue and len(self.in_flight) < self.settings["concurrency"]:
+                request = heapq.heappop(self.queue)
+                if request.dropped:
+                    continue
+                if request.supersede_key in self.active_keys:
+                    parked.append(request)
+                    continue
+                wait = self._bucket(request.route).wait_time()
+                if wait > 0:
+                    parked.append(request)
+                    next_wait = wait if next_wait is None else min(next_wait, wait)
+                    continue
+                self._bucket(request.route).try_take()
+                self._start(request)
+            for request in parked:
+                heapq.heappush(self.queue, request)
+
+            if not self.queue and not self.in_flight:
+                break
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=next_wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, request):
+        if request.supersede_key is not None:
+            if self.pending.get(request.supersede_key) is request:
+                del self.pending[request.supersede_key]
+            self.active_keys.add(request.supersede_key)
+
+        self.queue_wait.observe(request.priority, time.monotonic() - request.enqueued)
+
+        task = asyncio.create_task(self._run(request))
+        self.in_flight.add(task)
+
+    async def _run(self, request):
+        try:
+            result = await request.factory()
+        except discord.HTTPException as e:
+            self.metrics["failed"] += 1
+            if e.status == 429:
+                self.metrics["rate_limited"] += 1
+                logging.warning(f"Rate limited on route {request.route}: {e}")
+            if not request.future.done():
+                request.future.set_exception(e)
+        except Exception as e:
+            self.metrics["failed"] += 1
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            self.metrics["completed"] += 1
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            self.active_keys.discard(request.supersede_key)
+            self.in_flight.discard(asyncio.current_task())
+            self._wake()
+
+    def snapshot(self):
+        """
+        Return a copy of the scheduler metrics with average queue waits
+        """
+        snapshot = dict(self.metrics)
+        snapshot["queued"] = len(self.queue)
+        snapshot["in_flight"] = len(self.in_flight)
+        snapshot["queue_wait"] = self.queue_wait.snapshot()
+        return snapshot
+
+
+rest_scheduler = RestScheduler()
@@ -0,0 +1,274 @@
+import shlex
+import asyncio
+import logging
+import functools
+
+from typing import Any, Dict, List
+
+import yaml as py_yaml
+from colorama import Fore, Style
+from langchain import LLMChain, PromptTemplate
+from langchain.schema import BaseLanguageModel, BaseMemory
+
+from d20_governance.utils.llm import llm_governor
+from d20_governance.utils.constants import (
+    LLM_STAGES,
+    QUEST_ACTIONS_KEY,
+    QUEST_MESSAGE_KEY,
+    QUEST_NAME_KEY,
+    QUEST_PROGRESS_CONDITIONS_KEY,
+)
+
+
+class StageValidationError(ValueError):
+    pass
+
+
+class StageGenerationError(ValueError):
+    pass
+
+
+def check_command(text):
+    """
+    Actions and progress conditions are shell-style commands, see Action.from_dict
+    """
+    try:
+        words = shlex.split(text)
+    except ValueError as e:
+        raise StageValidationError(f"cannot parse '{text}': {e}")
+    if not words:
+        raise StageValidationError("commands must not be empty")
+
+
+# Fields of a quest stage, as written in the quest yaml configs
+STAGE_SCHEMA = {
+    QUEST_NAME_KEY: {"type": str, "required": True},
+    QUEST_MESSAGE_KEY: {"type": str, "required": True},
+    QUEST_ACTIONS_KEY: {
+        "type": list,
+        "required": True,
+        "item_key": "action",
+        "item_check": check_command,
+    },
+    QUEST_PROGRESS_CONDITIONS_KEY: {
+        "type": list,
+        "required": False,
+        "item_key": "progress_condition",
+        "item_check": check_command,
+    },
+}
+
+
+def compile_schema(schema):
+    """
+    Turn a stage schema into a single validation function
+
+    The checks are built once so validating a stage is a flat loop over prepared
+    closures instead of re-reading the schema for every LLM response.
+    """
+    checks = []
+    for field, rules in schema.items():
+
+        def check(stage, field=field, rules=rules):
+            if field not in stage:
+                if rules["required"]:
+                    raise StageValidationError(f"missing field '{field}'")
+                stage[field] = rules["type"]()
+                return
+            value = stage[field]
+            if not isinstance(value, rules["type"]):
+                raise StageValidationError(
+                    f"'{field}' must be a {rules['type'].__name__}"
+                )
+            item_key = rules.get("item_key")
+            if item_key is not None:
+                for item in value:
+                    if not isinstance(item, dict) or not isinstance(
+                        item.get(item_key), str
+                    ):
+                        raise StageValidationError(
+                            f"every entry of '{field}' needs a '{item_key}' string"
+                        )
+                    item_check = rules.get("item_check")
+                    if item_check is not None:
+                        item_check(item[item_key])
+
+        checks.append(check)
+
+    def validate(stage):
+        if not isinstance(stage, dict):
+            raise StageValidationError("stage must be a mapping")
+        for check in checks:
+            check(stage)
+        return stage
+
+    return validate
+
+
+validate_stage = compile_schema(STAGE_SCHEMA)
+
+
+@functools.lru_cache(maxsize=LLM_STAGES["parse_cache_size"])
+def parse_stage(yaml_string):
+    """
+    Parse and validate one stage of LLM output
+
+    Results are memoized, so identical responses are only parsed once. Callers must
+    not mutate the returned dict.
+    """
+    try:
+        data = py_yaml.safe_load(yaml_string)
+    except py_yaml.YAMLError as e:
+        raise StageValidationError(f"invalid yaml: {e}")
+    if isinstance(data, list) and len(data) > 0:
+        data = data[0]
+    return validate_stage(data)
+
+
+SUMMARY_TEMPLATE = """Progressively summarize the story of a governance game.
+Add the new stages to the current summary and return one short paragraph.
+
+Current summary:
+{summary}
+
+New stages:
+{new_lines}
+
+New summary:"""
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["summary", "new_lines"], template=SUMMARY_TEMPLATE
+)
+
+
+def count_tokens(llm, text):
+    """
+    Count prompt tokens with the model's tokenizer, or estimate them if unavailable
+    """
+    try:
+        return llm.get_num_tokens(text)
+    except Exception:
+        # Roughly four characters per token for English text
+        return len(text) // 4
+
+
+class StageSummaryMemory(BaseMemory):
+    """
+    Conversation memory holding the last `k` stages verbatim plus a rolling summary
+
+    Stages that fall out of the window are folded into the summary in batches of
+    `summarize_every`, so the summary is updated incrementally and only every few
+    stages. Until then they stay verbatim, so nothing is lost between updates.
+    """
+
+    llm: BaseLanguageModel
+    memory_key: str = "chat_history"
+    k: int = LLM_STAGES["memory_window"]
+    summarize_every: int = LLM_STAGES["summarize_every"]
+    summary: str = ""
+    buffer: List[str] = []  # exchanges kept verbatim, oldest first
+    unsummarized: List[str] = []  # exchanges out of the window, not yet summarized
+    summaries: int = 0
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        lines = []
+        if self.summary:
+            lines.append(f"Story so far: {self.summary}")
+        lines.extend(self.unsummarized)
+        lines.extend(self.buffer)
+        return {self.memory_key: "\n".join(lines)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        human_input = next(v for k, v in inputs.items() if k != self.memory_key)
+        output = next(iter(outputs.values()))
+        self.buffer.append(f"Human: {human_input}\nChatbot: {output}")
+        while len(self.buffer) > self.k:
+            self.unsummarized.append(self.buffer.pop(0))
+        if len(self.unsummarized) >= self.summarize_every:
+            summary_chain = LLMChain(llm=self.llm, prompt=SUMMARY_PROMPT)
+            self.summary = summary_chain.predict(
+                summary=self.summary or "(none)",
+                new_lines="\n".join(self.unsummarized),
+            ).strip()
+            self.unsummarized = []
+            self.summaries += 1
+
+    def clear(self) -> None:
+        self.summary = ""
+        self.buffer = []
+        self.unsummarized = []
+
+
+class StageGenerator:
+    """
+    Generate quest stages with an LLM chain without blocking the event loop
+
+    The blocking chain call runs in a worker thread. While one stage is being played,
+    the next one is already generated in the background. The chain's memory bounds how
+    much of the story is sent back with each prompt.
+    """
+
+    def __init__(self, llm_chain, num_stages, settings=LLM_STAGES):
+        self.llm_chain = llm_chain
+        self.num_stages = num_stages
+        self.settings = settings
+        self.prefetch = None
+        self.prompt_tokens = []  # prompt size of every LLM call, in tokens
+
+    def _prompt_tokens(self, human_input):
+        memory_variables = self.llm_chain.memory.load_memory_variables({})
+        prompt = self.llm_chain.prompt.format(
+            human_input=human_input, **memory_variables
+        )
+        return count_tokens(self.llm_chain.llm, prompt)
+
+    def ready(self):
+        """
+        Whether the next stage is already generated
+        """
+        return self.prefetch is not None and self.prefetch.done()
+
+    async def _generate(self):
+        for attempt in range(1, self.settings["max_attempts"] + 1):
+            try:
+                human_input = "generate the next stage"
+                prompt_tokens = self._prompt_tokens(human_input)
+                self.prompt_tokens.append(prompt_tokens)
+                print(
+                    f"{Fore.BLUE}LLM stage prompt: {prompt_tokens} tokens{Style.RESET_ALL}"
+                )
+                yaml_string = await llm_governor.run(
+                    lambda: asyncio.to_thread(
+                        self.llm_chain.predict, human_input=human_input
+                    ),
+                    module="quest",
+                    priority="narration",
+                )
+                return parse_stage(yaml_string)
+            except StageValidationError as e:
+                print(
+                    f"{Fore.YELLOW}LLM stage rejected on attempt {attempt}: {e}{Style.RESET_ALL}"
+                )
+            except Exception as e:
+                logging.error(f"LLM stage generation failed on attempt {attempt}: {e}")
+        raise StageGenerationError(
+            f"yaml output in wrong format after {self.settings['max_attempts']} attempts"
+        )
+
+    async def stages(self):
+        """
+        Yield validated stage dicts, prefetching the next one while the caller plays
+        """
+        self.prefetch = asyncio.create_task(self._generate())
+        try:
+            for index in range(self.num_stages):
+                stage = await self.prefetch
+                if index + 1 < self.num_stages:
+                    self.prefetch = asyncio.create_task(self._generate())
+                yield stage
+        finally:
+            if not self.prefetch.done():
+                self.prefetch.cancel()
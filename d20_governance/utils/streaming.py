@@ -0,0 +1,171 @@
+import time
+import random
+import asyncio
+import logging
+
+import discord
+
+from d20_governance.utils.constants import STREAMING
+from d20_governance.utils.scheduler import rest_scheduler
+
+
+class EditCoalescer:
+    """
+    Collapse rapid edits of a message into as few API calls as possible
+
+    Each message has at most one edit in flight, and the edit that goes out always
+    carries the latest requested content. Edits on the same route are spaced at least
+    `min_interval` seconds apart, so several streams in one channel share that budget.
+    Webhook messages are edited through the webhook delivery, which schedules the edit
+    on the webhook's route itself.
+    """
+
+    def __init__(
+        self, scheduler=rest_scheduler, min_interval=STREAMING["min_interval"]
+    ):
+        self.scheduler = scheduler
+        self.min_interval = min_interval
+        self.latest = {}  # message id -> kwargs of the newest requested edit
+        self.workers = {}  # message id -> task sending edits for that message
+        self.next_slot = {}  # route -> earliest time the next edit may start
+        self.metrics = {"requested": 0, "sent": 0}
+
+    def update(self, message, **kwargs):
+        """
+        Request an edit of `message`; returns immediately
+        """
+        self.latest[message.id] = kwargs
+        self.metrics["requested"] += 1
+        worker = self.workers.get(message.id)
+        if worker is None or worker.done():
+            self.workers[message.id] = asyncio.create_task(self._drain(message))
+
+    async def flush(self, message):
+        """
+        Wait until the latest requested edit of `message` has been sent
+        """
+        worker = self.workers.get(message.id)
+        if worker is not None:
+            await worker
+
+    async def _drain(self, message):
+        if isinstance(message, WebhookMessage):
+            route = message.route
+        else:
+            route = f"channel:{message.channel.id}"
+        while message.id in self.latest:
+            # Reserve the next slot on this route before sleeping so streams sharing
+            # a channel take turns instead of all waking at once
+            now = time.monotonic()
+            start = max(now, self.next_slot.get(route, now))
+            self.next_slot[route] = start + self.min_interval
+            if start > now:
+                await asyncio.sleep(start - now)
+
+            kwargs = self.latest.pop(message.id)
+            try:
+                if isinstance(message, WebhookMessage):
+                    await message.edit(**kwargs)
+                else:
+                    await self.scheduler.edit(message, **kwargs)
+                self.metrics["sent"] += 1
+            except discord.HTTPException as e:
+                logging.error(f"Failed to edit streamed message {message.id}: {e}")
+        self.workers.pop(message.id, None)
+
+
+class WebhookMessage:
+    """
+    Minimal message handle for a webhook post, editable through the webhook delivery
+    """
+
+    def __init__(self, delivery, channel, message_id):
+        self.delivery = delivery
+        self.channel = channel
+        self.id = message_id
+        self.route = f"webhook:{channel.id}"
+
+    async def edit(self, **kwargs):
+        return await self.delivery.edit(self.channel, self.id, kwargs)
+
+
+class WebhookStream:
+    """
+    Repost a message through a webhook while its LLM rewrite is still streaming
+
+    The post goes out as soon as the first few characters arrive and then grows
+    through coalesced edits. `feed` is meant to be used as the `token_sink` of the
+    LLM call and never waits on Discord.
+    """
+
+    def __init__(
+        self, channel, payload, delivery, coalescer=None, prefix="", settings=STREAMING
+    ):
+        self.channel = channel
+        self.payload = payload  # author fields of the repost
+        self.delivery = delivery
+        self.coalescer = coalescer or edit_coalescer
+        self.prefix = prefix
+        self.settings = settings
+        self.text = ""
+        self.message = None
+        self.posting = None
+        self.started = time.monotonic()
+        self.first_visible = None  # seconds until the first text was posted
+
+    async def feed(self, token):
+        self.text += token
+        if self.message is not None:
+            self.coalescer.update(self.message, content=f"{self.prefix}{self.text}")
+        elif (
+            self.posting is None
+            and len(self.text.strip()) >= self.settings["first_chars"]
+        ):
+            self.posting = asyncio.create_task(self._post())
+
+    async def _post(self):
+        posted = self.text
+        # The post is edited as the rewrite streams in, so it must not be merged
+        data = await self.delivery.send(
+            self.channel,
+            {**self.payload, "content": f"{self.prefix}{posted}"},
+            coalesce=False,
+        )
+        if data is None:
+            return
+        self.first_visible = time.monotonic() - self.started
+        self.message = WebhookMessage(self.delivery, self.channel, int(data["id"]))
+        if self.text != posted:
+            # Tokens kept arriving while the post was in flight
+            self.coalescer.update(self.message, content=f"{self.prefix}{self.text}")
+
+    async def finish(self, text):
+        """
+        Replace the streamed text with the final `text`
+
+        Returns False if nothing was posted, so the caller should send `text` itself
+        """
+        if self.posting is None:
+            return False
+        await self.posting
+        if self.message is None:
+            return False
+        self.coalescer.update(self.message, content=f"{self.prefix}{text}")
+        await self.coalescer.flush(self.message)
+        return True
+
+
+def chunk_delay(chunk):
+    """
+    Seconds a chunk stays on screen before the next one, longer after punctuation
+    """
+    delay = random.uniform(0.1, 0.25)
+    for word in chunk.split():
+        if "," in word:
+            delay += 0.3
+        if "." in word:
+            delay += 0.4
+    return delay
+
+
+edit_coalescer = EditCoalescer()
@@ -0,0 +1,208 @@
+import time
+import asyncio
+import logging
+
+from array import array
+
+import discord
+
+from colorama import Fore, Style
+
+from d20_governance.utils.constants import INPUT_SPECTRUM, TALLY
+from d20_governance.utils.scheduler import rest_scheduler
+
+
+class Tally:
+    """
+    Continuous "+1"/"-1" input counters for a fixed set of modules
+
+    Counts live in one int array indexed by module, never go below zero, and report
+    when they cross `threshold`, so callers react to the one module that changed
+    instead of rescanning all of them. The voters of the current `window` seconds
+    are tracked as well. Tasks can wait for a module to lead the tally alone at or
+    above the threshold, and are woken by the input that makes it so.
+    """
+
+    def __init__(self, labels, threshold, pin=None, window=TALLY["voter_window"]):
+        self.labels = dict(labels)  # module name -> display name
+        self.names = tuple(self.labels)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.counts = array("i", [0]) * len(self.labels)
+        self.threshold = threshold
+        self.pin = pin  # position of the threshold marker in the progress bar
+        self.window = window
+        self.window_started = time.monotonic()
+        self.voters = set()
+        self.waiters = []  # futures resolved with the winning module name
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def count(self, name):
+        return self.counts[self.index[name]]
+
+    def _roll_window(self):
+        now = time.monotonic()
+        if now - self.window_started >= self.window:
+            self.window_started = now
+            self.voters.clear()
+
+    def add(self, name, change, voter_id):
+        """
+        Apply one input to a module
+
+        Returns True if the module reached the threshold, False if it dropped below
+        it, and None if it stayed on the same side.
+        """
+        self._roll_window()
+        self.voters.add(voter_id)
+        i = self.index[name]
+        before = self.counts[i]
+        after = max(before + change, 0)
+        self.counts[i] = after
+        if self.waiters:
+            self._notify()
+        if before < self.threshold <= after:
+            return True
+        if after < self.threshold <= before:
+            return False
+        return None
+
+    def winner(self):
+        """
+        The module alone at the top of the tally, once it has reached the threshold
+        """
+        top = max(self.counts, default=0)
+        if top < self.threshold or self.counts.count(top) != 1:
+            return None
+        return self.names[self.counts.index(top)]
+
+    def _notify(self):
+        winner = self.winner()
+        if winner is None:
+            return
+        for future in self.waiters:
+            if not future.done():
+                future.set_result(winner)
+        self.waiters.clear()
+
+    async def wait_for_winner(self, timeout):
+        """
+        Wait up to `timeout` seconds for a winner
+
+        Returns the winning module name, or None if there is none by the deadline.
+        """
+        winner = self.winner()
+        if winner is not None:
+            return winner
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if future in self.waiters:
+                self.waiters.remove(future)
+
+    def unique_voters(self):
+        self._roll_window()
+        return len(self.voters)
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.window_started = time.monotonic()
+        self.voters.clear()
+
+    def embed(self, title):
+        """
+        Render the current standings as emoji progress bars
+        """
+        scale = INPUT_SPECTRUM["scale"]
+        embed = discord.Embed(title=title, color=discord.Color.green())
+        for name, label in self.labels.items():
+            filled = min(self.count(name), scale)
+            progress_bar = "🟦" * filled + "🟨" * (scale - filled)
+            if self.pin is not None:
+                progress_bar = progress_bar[: self.pin] + "📍" + progress_bar[self.pin :]
+            embed.add_field(name=label.capitalize(), value=progress_bar, inline=False)
+        minutes = round(self.window / 60)
+        embed.set_footer(
+            text=f"{self.unique_voters()} voters in the last {minutes} minutes"
+        )
+        return embed
+
+
+class TallyBoard:
+    """
+    Keep one status message per channel showing a tally's latest standings
+
+    The first update posts the message. Updates arriving within `interval` seconds of
+    the last one are folded into a single edit, so a burst of inputs costs one REST
+    call per interval instead of one new embed per input.
+    """
+
+    def __init__(self, scheduler=rest_scheduler, interval=TALLY["edit_interval"]):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.messages = {}  # channel_id -> status message
+        self.pending = {}  # channel_id -> (channel, tally, title) to show next
+        self.workers = {}  # channel_id -> task publishing that channel's updates
+        self.updated = {}  # channel_id -> monotonic time of the last publish
+        self.metrics = {"requested": 0, "posted": 0, "edited": 0}
+
+    def show(self, channel, tally, title):
+        """
+        Request the channel's status message to show `tally`
+
+        Returns the task that publishes the channel's pending update
+        """
+        self.pending[channel.id] = (channel, tally, title)
+        self.metrics["requested"] += 1
+        worker = self.workers.get(channel.id)
+        if worker is None or worker.done():
+            worker = asyncio.create_task(self._flush(channel.id))
+            self.workers[channel.id] = worker
+        return worker
+
+    def forget(self, channel_id):
+        """
+        Post the channel's next update as a new message instead of editing the last one
+        """
+        self.messages.pop(channel_id, None)
+        self.updated.pop(channel_id, None)
+
+    async def _flush(self, channel_id):
+        while channel_id in self.pending:
+            wait = self.updated.get(channel_id, -self.interval) + self.interval
+            wait -= time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            channel, tally, title = self.pending.pop(channel_id)
+            self.updated[channel_id] = time.monotonic()
+            await self._publish(channel, tally.embed(title))
+        self.workers.pop(channel_id, None)
+
+    async def _publish(self, channel, embed):
+        message = self.messages.get(channel.id)
+        try:
+            if message is None:
+                self.messages[channel.id] = await self.scheduler.send(
+                    channel, priority="vote", embed=embed
+                )
+                self.metrics["posted"] += 1
+            else:
+                await self.scheduler.edit(message, priority="vote", embed=embed)
+                self.metrics["edited"] += 1
+        except discord.NotFound:
+            # The status message was deleted; the next update posts a new one
+            self.messages.pop(channel.id, None)
+        except discord.HTTPException as e:
+            print(
+                f"{Fore.RED}Could not update tally in {channel}: {e}{Style.RESET_ALL}"
+            )
+            logging.error(f"Could not update tally in {channel}: {e}")
+
+
+tally_board = TallyBoard()
@@ -0,0 +1,286 @@
+import os
+import asyncio
+import hashlib
+import shutil
+import logging
+import threading
+import subprocess
+import multiprocessing
+
+from colorama import Fore, Style
+
+from d20_governance.utils.constants import TTS, TTS_CACHE_PATH
+
+ENCODE_CHUNK_SIZE = 64 * 1024  # bytes of WAV written to ffmpeg at a time
+
+
+def _pipe_to_ffmpeg(wav_filename, out_filename, settings):
+    """
+    Stream a WAV file through an ffmpeg process in chunks, so the samples are never
+    held in memory all at once
+    """
+    process = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "wav",
+            "-i",
+            "pipe:0",
+            "-c:a",
+            settings["codec"],
+            "-b:a",
+            settings["bitrate"],
+            "-f",
+            settings["format"],
+            out_filename,
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with open(wav_filename, "rb") as f:
+            shutil.copyfileobj(f, process.stdin, ENCODE_CHUNK_SIZE)
+        process.stdin.close()
+        returncode = process.wait(timeout=settings["timeout"])
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {returncode}")
+
+
+def _encode(wav_filename, root, settings):
+    """
+    Encode a WAV file to the configured compressed format, falling back to WAV
+
+    Returns the published file name, whose extension always matches its contents.
+    """
+    extension = f".{settings['format']}"
+    tmp_filename = f"{root}.tmp{extension}"
+    try:
+        _pipe_to_ffmpeg(wav_filename, tmp_filename, settings)
+    except Exception as e:
+        print(f"Audio encoding unavailable, keeping WAV: {e}")
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        extension = ".wav"
+        tmp_filename = wav_filename
+    filename = f"{root}{extension}"
+    os.replace(tmp_filename, filename)
+    if os.path.exists(wav_filename):
+        os.remove(wav_filename)
+    return filename
+
+
+def _worker_main(jobs, results, settings):
+    """
+    Run in the worker process: keep one engine and synthesize jobs until told to stop
+    """
+    try:
+        import pyttsx3
+
+        engine = pyttsx3.init()
+        engine.setProperty("voice", settings["voice"])
+        engine.setProperty("rate", settings["rate"])
+        init_error = None
+    except Exception as e:
+        # Keep answering so callers fail fast instead of waiting for a timeout
+        init_error = f"could not start TTS engine: {e}"
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        key, text, root = job
+        if init_error is not None:
+            results.put((key, None, init_error))
+            continue
+        # pyttsx3 always writes WAV data, whatever the file name says
+        wav_filename = f"{root}.tmp.wav"
+        try:
+            engine.save_to_file(text, wav_filename)
+            engine.runAndWait()
+            # Only publish complete files so a cut-off synthesis is never served
+            results.put((key, _encode(wav_filename, root, settings), None))
+        except Exception as e:
+            results.put((key, None, str(e)))
+
+
+class TtsWorker:
+    """
+    Text-to-speech in a dedicated process with a single long-lived engine
+
+    pyttsx3 engines are slow to start and not thread-safe, so one worker process owns
+    the engine and takes jobs over a queue. Completions are reported back to the event
+    loop as futures. Output is cached on disk by a hash of the text and voice settings,
+    so repeated quest runs skip synthesis entirely.
+    """
+
+    def __init__(self, cache_path=TTS_CACHE_PATH, settings=TTS):
+        self.cache_path = cache_path
+        self.settings = settings
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.jobs = None
+        self.results = None
+        self.reader = None
+        self.loop = None
+        self.pending = {}  # cache key -> future resolved when the file is written
+        self.metrics = {"synthesized": 0, "cached": 0, "failed": 0}
+
+    def key(self, text):
+        data = f"{self.settings['voice']}:{self.settings['rate']}:{text}"
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def root(self, key):
+        return os.path.join(self.cache_path, key)
+
+    def cached(self, key):
+        """
+        Return the cached file for a key in whichever format it was stored, or None
+        """
+        for extension in (f".{self.settings['format']}", ".wav"):
+            filename = f"{self.root(key)}{extension}"
+            if os.path.exists(filename):
+                return filename
+        return None
+
+    def _ensure_started(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.jobs = self.context.Queue()
+        self.results = self.context.Queue()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(self.jobs, self.results, self.settings),
+            daemon=True,
+        )
+        self.process.start()
+        self.reader = threading.Thread(
+            target=self._read_results, args=(self.results,), daemon=True
+        )
+        self.reader.start()
+        print(f"{Fore.BLUE}Started TTS worker process{Style.RESET_ALL}")
+
+    def _read_results(self, results):
+        while True:
+            try:
+                result = results.get()
+            except (EOFError, OSError):
+                break
+            if result is None:
+                break
+            self.loop.call_soon_threadsafe(self._resolve, *result)
+
+    def _stop_reader(self):
+        """
+        Wake the thread reading the current results queue so it exits
+        """
+        if self.reader is None:
+            return
+        self.results.put(None)
+        self.reader.join(timeout=5)
+        self.results.close()
+        self.reader = None
+
+    def _resolve(self, key, filename, error):
+        future = self.pending.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is None:
+            self.metrics["synthesized"] += 1
+            future.set_result(filename)
+        else:
+            self.metrics["failed"] += 1
+            future.set_exception(RuntimeError(f"TTS synthesis failed: {error}"))
+
+    async def synthesize(self, text):
+        """
+        Return the path of an audio file speaking `text`, synthesizing it if needed
+
+        The file belongs to the cache and must not be deleted by the caller.
+        """
+        key = self.key(text)
+        filename = self.cached(key)
+        if filename is not None:
+            self.metrics["cached"] += 1
+            os.utime(filename)
+            return filename
+
+        future = self.pending.get(key)
+        if future is None:
+            os.makedirs(self.cache_path, exist_ok=True)
+            self._ensure_started()
+            future = self.loop.create_future()
+            self.pending[key] = future
+            self.jobs.put((key, text, self.root(key)))
+
+        try:
+            filename = await asyncio.wait_for(
+                asyncio.shield(future), timeout=self.settings["timeout"]
+            )
+        except asyncio.TimeoutError:
+            logging.error("TTS worker timed out, restarting it")
+            self.pending.pop(key, None)
+            self.restart()
+            raise
+        self._prune()
+        return filename
+
+    async def read(self, filename):
+        """
+        Read a synthesized file into memory off the event loop
+        """
+
+        def read_file():
+            with open(filename, "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read_file)
+
+    def _prune(self):
+        """
+        Remove the least recently used files once the cache exceeds its size budget
+        """
+        files = []
+        total_bytes = 0
+        for name in os.listdir(self.cache_path):
+            if ".tmp" in name:
+                continue
+            stat = os.stat(os.path.join(self.cache_path, name))
+            files.append((stat.st_mtime, name, stat.st_size))
+            total_bytes += stat.st_size
+        for _, name, size in sorted(files):
+            if total_bytes <= self.settings["max_bytes"]:
+                break
+            os.remove(os.path.join(self.cache_path, name))
+            total_bytes -= size
+
+    def restart(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+        self._stop_reader()
+        # Jobs queued on the old process are lost with it
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("TTS worker was restarted"))
+        self.pending.clear()
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            self.jobs.put(None)
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
+        self._stop_reader()
+
+
+tts_worker = TtsWorker()
@@ -1,11 +1,8 @@
 import discord
-import requests
 import random
-import base64
 import cairosvg
 import glob
 import uuid
-import pyttsx3
 import datetime
 import string
 import asyncio
@@ -14,6 +11,12 @@ import shlex
 import os
 
 from d20_governance.utils.constants import *
+from d20_governance.utils.images import stability_client
+from d20_governance.utils.llm import llm_provider
+from d20_governance.utils.scheduler import rest_scheduler
+from d20_governance.utils.stage_generator import StageSummaryMemory
+from d20_governance.utils.streaming import chunk_delay, edit_coalescer
+from d20_governance.utils.webhooks import webhook_pool
 
 from discord.ext import commands
 
@@ -21,9 +24,7 @@ from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 from colorama import Fore, Style
 
-from langchain.memory import ConversationBufferMemory
-from langchain import OpenAI, LLMChain, PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from langchain import LLMChain, PromptTemplate
 
 
 class Action:
@@ -94,6 +95,21 @@ class Stage:
         self.progress_conditions = progress_conditions
         self.image_path = image_path
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            name=data[QUEST_NAME_KEY],
+            message=data[QUEST_MESSAGE_KEY],
+            actions=[
+                Action.from_dict(action_dict) for action_dict in data[QUEST_ACTIONS_KEY]
+            ],
+            progress_conditions=[
+                Progress_Condition.from_dict(progress_condition_dict)
+                for progress_condition_dict in data[QUEST_PROGRESS_CONDITIONS_KEY]
+            ],
+            image_path=data.get(QUEST_IMAGE_PATH_KEY),
+        )
+
 
 class Quest:
     def __init__(
@@ -104,6 +120,9 @@ class Quest:
         fast_mode=None,
         solo_mode=None,
     ):
+        self.id = uuid.uuid4().hex[
+            :8
+        ]  # keeps media names unique across concurrent quests
         self.quest_data = None
         self.mode = quest_mode
         self.title = None
@@ -117,6 +136,7 @@ class Quest:
         self.fast_mode = fast_mode
         self.game_channel = None
         self.solo_mode = solo_mode
+        self.image_task = None  # pre-generates stage images in the background
 
         # game progression vars
         self.progress_completed = False  # used to interupt action_runner in process_stage if progression condition complete
@@ -132,7 +152,7 @@ class Quest:
         if self.mode == None:
             pass
         # LLM mode does not have yaml
-        elif self.mode is not SIMULATIONS["llm_mode"]["name"]:
+        elif self.mode != SIMULATIONS["llm_mode"]["name"]:
             with open(self.mode, "r") as f:
                 quest_data = py_yaml.load(f, Loader=py_yaml.SafeLoader)
                 self.quest_data = quest_data
@@ -143,6 +163,13 @@ class Quest:
         elif self.mode:  # LLM mode has no quest data
             self.title = self.mode
 
+    def media_name(self, stage_name):
+        """
+        File name stem for media this quest posts for a stage
+        """
+        slug = "".join(c if c.isalnum() else "-" for c in stage_name.lower())
+        return f"{self.id}-{slug.strip('-')}"
+
     def set_quest_vars(self, quest_data, quest_mode):
         self.quest_data = quest_data
         self.mode = quest_mode
@@ -393,33 +420,29 @@ def chunk_text(text):
 async def stream_message(ctx, text, original_embed):
     embed = original_embed.copy()
     embed.description = "[...]"
-    message_canvas = await ctx.send(embed=embed)
+    message_canvas = await rest_scheduler.send(ctx, embed=embed)
     try:
         chunks = chunk_text(text)
         joined_text = []
-        for chunk in chunks:
-            # Use the typing context manager to simulate typing
-            async with ctx.typing():
+        # Use the typing context manager to simulate typing
+        async with ctx.typing():
+            for chunk in chunks:
                 # Append chunk without adding a space if it's a newline
                 if chunk == "\n":
                     joined_text.append(chunk)
                 else:
                     joined_text.append(" " + chunk)
-                joined_text_str = "".join(joined_text)
-                embed.description = joined_text_str
-                await message_canvas.edit(embed=embed)
-                sleep_time = random.uniform(0.1, 0.25)
-                for word in chunk.split():
-                    if "," in word:
-                        sleep_time += 0.3
-                    if "." in word:
-                        sleep_time += 0.4
-                    else:
-                        pass
-                await asyncio.sleep(sleep_time)
-        final_message = "".join(joined_text_str) + " ✨"
+                embed.description = "".join(joined_text)
+                # Edits are coalesced, so only the latest text goes out per interval
+                edit_coalescer.update(message_canvas, embed=embed.copy())
+                if STREAMING["mode"] == "reveal":
+                    await asyncio.sleep(chunk_delay(chunk))
+                else:
+                    await edit_coalescer.flush(message_canvas)
+        await edit_coalescer.flush(message_canvas)
+        final_message = "".join(joined_text) + " ✨"
         embed.description = final_message
-        await message_canvas.edit(embed=embed)
+        await rest_scheduler.edit(message_canvas, priority="status", embed=embed)
     except Exception as e:
         print(e)
 
@@ -463,56 +486,37 @@ def distort_text(word_list):
 
 
 # Audio Utils
-# FIXME: Audio file is getting cut off before finishing string
-def tts(text, filename):
-    engine = pyttsx3.init()
-    engine.setProperty("voice", "english")
-    engine.setProperty("rate", 140)
-
-    try:
-        engine.save_to_file(text, filename)
-        engine.runAndWait()
-        print(f"{filename} created")
-    finally:
-        engine.stop()
-
-    return filename
-
-
 # Image Utils
 # Generate Quest Images
-def generate_image(message):
-    prompt = f"generate a fun image with no words that matches this message: {message}"
-    response = requests.post(
-        f"{STABILITY_API_HOST}/v1/generation/{ENGINE_ID}/text-to-image",
-        headers={
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "Authorization": f"Bearer {STABILITY_TOKEN}",
-            "Authorization": f"Bearer {STABILITY_TOKEN}",
-        },
-        json={
-            "text_prompts": [{"text": f"{prompt}"}],
-            "text_prompts": [{"text": f"{prompt}"}],
-            "cfg_scale": 7,
-            "clip_guidance_preset": "FAST_BLUE",
-            "height": 512,
-            "width": 512,
-            "samples": 1,
-            "steps": 10,  # minimum 10 steps, more steps longer generation time
-        },
-    )
+def image_prompt(message):
+    return f"generate a fun image with no words that matches this message: {message}"
 
-    if response.status_code != 200:
-        raise Exception("Non-200 response: " + str(response.text))
 
-    data = response.json()
+async def generate_image(message):
+    """
+    Generate an image matching a message and return it as PNG bytes
+    """
+    return await stability_client.generate(image_prompt(message))
 
-    image_data = base64.b64decode(data["artifacts"][0]["base64"])
-    with open("generated_image.png", "wb") as f:
-        f.write(image_data)
 
-    return Image.open("generated_image.png")
+async def pregenerate_quest_images(quest: Quest):
+    """
+    Warm the image cache for every quest stage that needs a generated image
+    """
+    prompts = [
+        image_prompt(stage[QUEST_MESSAGE_KEY])
+        for stage in quest.stages
+        if not stage.get(QUEST_IMAGE_PATH_KEY)
+    ]
+    print(f"{Fore.BLUE}Pre-generating {len(prompts)} stage images...{Style.RESET_ALL}")
+    try:
+        generated = await stability_client.pregenerate(prompts)
+    except Exception as e:
+        # Nobody awaits this task; stages generate their images on demand instead
+        print(f"{Fore.RED}Stage image pre-generation failed: {e}{Style.RESET_ALL}")
+        logging.error(f"Stage image pre-generation failed: {e}")
+        return
+    print(f"{Fore.GREEN}Pre-generated {generated} stage images{Style.RESET_ALL}")
 
 
 def wrap_text(text, font, max_width):
@@ -969,6 +973,9 @@ def check_dirs():
     if not os.path.exists(LOGGING_PATH):
         os.makedirs(LOGGING_PATH)
         print(f"{Fore.YELLOW}Created {LOGGING_PATH} directory{Style.RESET_ALL}")
+    if not os.path.exists(STATE_PATH):
+        os.makedirs(STATE_PATH)
+        print(f"{Fore.YELLOW}Created {STATE_PATH} directory{Style.RESET_ALL}")
     if not os.path.exists(LOG_FILE_NAME):
         with open(LOG_FILE_NAME, "w") as f:
             f.write("This is a new log file.")
@@ -1019,9 +1026,16 @@ async def delete_all_webhooks(guild):
     webhooks = await guild.webhooks()
 
     # Delete each webhook
-    for webhook in webhooks:
-        await webhook.delete()
-        print(f"{Fore.YELLOW}Webhooks from all guilds deleted{Style.RESET_ALL}")
+    await asyncio.gather(
+        *(
+            rest_scheduler.submit(
+                webhook.delete, route=f"webhooks:{guild.id}", priority="maintenance"
+            )
+            for webhook in webhooks
+        )
+    )
+    webhook_pool.forget_guild(guild.id)
+    print(f"{Fore.YELLOW}Webhooks from guild `{guild.name}` deleted{Style.RESET_ALL}")
 
 
 # LLM HELPERS
@@ -1031,9 +1045,10 @@ def get_llm_agent():
     template = """You are a chatbot generating the narrative and actions for a governance game.
     Your output must be of the following format:
     - stage: <stage_name>
-    message: <exciting narrative message for the current stage of the game>
-    action: "vote_governance <culture or decision>"
-    timeout_mins: 1
+      message: <exciting narrative message for the current stage of the game>
+      actions:
+        - action: "vote_governance <culture or decision>"
+      progress_conditions: []
 
     For the action field, you must select either "vote_governance culture" or "vote_governance decision". 
     For the message field, make sure you are crafting an interesting and fun story that ties in with the overall game narrative so far. 
@@ -1047,45 +1062,13 @@ def get_llm_agent():
     prompt = PromptTemplate(
         input_variables=["chat_history", "human_input"], template=template
     )
-    memory = ConversationBufferMemory(memory_key="chat_history")
+    llm = llm_provider.get(model_name="gpt-4", temperature=0)
+    # Recent stages plus a rolling summary, so prompts stay bounded
+    memory = StageSummaryMemory(llm=llm, memory_key="chat_history")
     llm_chain = LLMChain(
-        llm=ChatOpenAI(temperature=0, model_name="gpt-4"),
+        llm=llm,
         prompt=prompt,
         verbose=True,
         memory=memory,
     )
     return llm_chain
-
-
-async def generate_stage_llm(llm_agent, quest: Quest):
-    await quest.game_channel.send("generating next narrative step with llm..")
-    MAX_ATTEMPTS = 5
-    attempt = 0
-    stage = None
-    while attempt < MAX_ATTEMPTS and not stage:
-        try:
-            attempt += 1
-            await quest.game_channel.send("generating next narrative step with llm..")
-            yaml_string = llm_agent.predict(human_input="generate the next stage")
-            print(yaml_string)
-            yaml_data = ru_yaml.load(yaml_string)
-
-            if isinstance(yaml_data, list) and len(yaml_data) > 0:
-                stage = yaml_data[0]
-            elif isinstance(yaml_data, dict) and len(yaml_data) > 0:
-                stage = yaml_data
-        except:
-            await quest.game_channel.send("encountered error, retrying..")
-
-    if not stage:
-        raise ValueError(
-            "yaml output in wrong format after {} attempts".format(MAX_ATTEMPTS)
-        )
-
-    stage = Stage(
-        name=stage[QUEST_NAME_KEY],
-        message=stage[QUEST_MESSAGE_KEY],
-        actions=stage[QUEST_ACTIONS_KEY],
-        progress_conditions=stage[QUEST_PROGRESS_CONDITIONS_KEY],
-    )
-    return stage
@@ -13,6 +13,7 @@ from d20_governance.utils.constants import (
     CIRCLE_EMOJIS,
     DECISION_DICT,
     GOVERNANCE_SVG_ICONS,
+    INPUT_SPECTRUM,
 )
 from d20_governance.utils.utils import (
     Quest,
@@ -22,6 +23,8 @@ from d20_governance.utils.utils import (
     make_module_png,
 )
 from d20_governance.utils.cultures import CULTURE_MODULES, prompt_object
+from d20_governance.utils.scheduler import rest_scheduler
+from d20_governance.utils.tally import Tally
 
 from typing import Any, List
 
@@ -359,7 +362,7 @@ class LazyConsensusView(discord.ui.View):
             if isinstance(item, discord.ui.Button):
                 item.disabled = True
         # Update the message to reflect the change
-        await self.message.edit(view=self)
+        await rest_scheduler.edit(self.message, priority="vote", view=self)
 
 
 async def set_decision_module():
@@ -399,7 +402,6 @@ DECISION_MODULES = {
             "deactivated_message": "",
             "url": "",  # TODO: make decision img
             "icon": GOVERNANCE_SVG_ICONS["decision"],
-            "input_value": 0,
             "valid_for_continuous_input": True,
             "valid_for_global_module": True,
         }
@@ -414,7 +416,6 @@ DECISION_MODULES = {
             "deactivated_message": "",
             "url": "",  # TODO: make decision img
             "icon": GOVERNANCE_SVG_ICONS["decision"],
-            "input_value": 0,
             "valid_for_continuous_input": True,
             "valid_for_global_module": True,
         }
@@ -429,7 +430,6 @@ DECISION_MODULES = {
             "deactivated_message": "",
             "url": "",  # TODO: make decision img
             "icon": GOVERNANCE_SVG_ICONS["decision"],
-            "input_value": 0,
             "valid_for_continuous_input": False,
             "valid_for_global_module": False,
         }
@@ -441,6 +441,13 @@ CONTINUOUS_INPUT_DECISION_MODULES = {
     for module, attributes in DECISION_MODULES.items()
     if attributes["valid_for_continuous_input"]
 }
+decision_tally = Tally(
+    {
+        name: module["name"]
+        for name, module in CONTINUOUS_INPUT_DECISION_MODULES.items()
+    },
+    threshold=INPUT_SPECTRUM["threshold"],
+)
 
 
 async def set_global_decision_module(ctx, decision_module: str = None):
@@ -518,7 +525,7 @@ class VoteTimeoutView(View):
     async def update_buttons(self):
         for child in self.children:
             child.disabled = True
-        await self.message.edit(view=self)
+        await rest_scheduler.edit(self.message, priority="vote", view=self)
 
 
 class VoteView(discord.ui.View):
@@ -0,0 +1,486 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+
+import aiohttp
+import discord
+
+from collections import Counter, OrderedDict, deque
+from colorama import Fore, Style
+
+from d20_governance.utils.scheduler import rest_scheduler
+from d20_governance.utils.constants import (
+    DISCORD_API_BASE,
+    WEBHOOK_DELIVERY,
+    WEBHOOK_GUILD_LIMIT,
+    WEBHOOK_NAME,
+    WEBHOOK_RECONCILE,
+    WEBHOOK_STORE_PATH,
+)
+
+
+class WebhookPool:
+    """
+    Keep one reusable webhook per channel, keyed by channel id
+
+    Webhooks are created lazily the first time a channel needs one and their ids and
+    tokens are persisted so they survive restarts. Least recently used webhooks are
+    only deleted when a guild approaches Discord's webhook limit.
+
+    Webhook counts per guild are kept locally from our own creates and deletes and
+    from webhook update events, so no REST scan is needed on the hot path.
+    """
+
+    def __init__(self, store_path=WEBHOOK_STORE_PATH, guild_limit=WEBHOOK_GUILD_LIMIT):
+        self.store_path = store_path
+        self.guild_limit = guild_limit
+        self.client = None
+        # channel_id -> {"id", "token", "guild_id"}, ordered from least to most recently used
+        self.records = OrderedDict()
+        # channel_id -> discord.Webhook, built from records on first use
+        self.webhooks = {}
+        self.locks = {}
+        # guild_id -> {channel_id: number of webhooks in the channel, ours or not}
+        self.channel_counts = {}
+        # channel_id -> monotonic time of our last create or delete in that channel
+        self.recent_changes = {}
+        self.load()
+
+    def bind(self, client):
+        """
+        Attach the bot so restored webhooks can share its HTTP session
+        """
+        self.client = client
+
+    def load(self):
+        if not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read webhook store {self.store_path}: {e}")
+            return
+        for channel_id, record in stored.items():
+            self.records[int(channel_id)] = record
+
+    def save(self):
+        directory = os.path.dirname(self.store_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.store_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({str(k): v for k, v in self.records.items()}, f)
+        os.replace(temp_path, self.store_path)
+
+    def guild_count(self, guild_id):
+        """
+        Number of webhooks in a guild, falling back to our own until the guild is reconciled
+        """
+        counts = self.channel_counts.get(guild_id)
+        if counts is None:
+            return sum(1 for r in self.records.values() if r["guild_id"] == guild_id)
+        return sum(counts.values())
+
+    def _record_change(self, guild_id, channel_id, delta):
+        counts = self.channel_counts.get(guild_id)
+        if counts is not None:
+            counts[channel_id] = max(counts.get(channel_id, 0) + delta, 0)
+        self.recent_changes[channel_id] = time.monotonic()
+
+    async def get(self, channel):
+        """
+        Return the webhook for a channel, creating it if the channel has none yet
+        """
+        channel_id = channel.id
+        if channel_id in self.records:
+            self.records.move_to_end(channel_id)
+            return self._restore(channel_id)
+
+        lock = self.locks.setdefault(channel_id, asyncio.Lock())
+        async with lock:
+            # Another message may have created the webhook while we waited
+            if channel_id in self.records:
+                return self._restore(channel_id)
+
+            while self.guild_count(channel.guild.id) >= self.guild_limit:
+                if not await self.evict_lru(channel.guild.id):
+                    break
+
+            webhook = await rest_scheduler.submit(
+                lambda: channel.create_webhook(name=WEBHOOK_NAME),
+                route=f"webhooks:{channel.guild.id}",
+                priority="repost",
+            )
+            self._record_change(channel.guild.id, channel_id, 1)
+            self.records[channel_id] = {
+                "id": webhook.id,
+                "token": webhook.token,
+                "guild_id": channel.guild.id,
+            }
+            self.webhooks[channel_id] = webhook
+            self.save()
+            print(
+                f"{Fore.YELLOW}Created webhook for channel {channel_id}{Style.RESET_ALL}"
+            )
+            return webhook
+
+    def _restore(self, channel_id):
+        webhook = self.webhooks.get(channel_id)
+        if webhook is None:
+            record = self.records[channel_id]
+            webhook = discord.Webhook.partial(
+                record["id"], record["token"], client=self.client
+            )
+            self.webhooks[channel_id] = webhook
+        return webhook
+
+    def forget(self, channel_id):
+        """
+        Drop a channel's webhook without deleting it, e.g. when Discord reports it is gone
+        """
+        self.webhooks.pop(channel_id, None)
+        if self.records.pop(channel_id, None) is not None:
+            self.save()
+
+    def forget_guild(self, guild_id):
+        for channel_id in [
+            c for c, r in self.records.items() if r["guild_id"] == guild_id
+        ]:
+            self.webhooks.pop(channel_id, None)
+            del self.records[channel_id]
+        self.channel_counts.pop(guild_id, None)
+        self.save()
+
+    async def release(self, channel_id):
+        """
+        Delete the webhook owned by a channel, if any
+        """
+        record = self.records.get(channel_id)
+        if record is None:
+            return
+        webhook = self._restore(channel_id)
+        self.forget(channel_id)
+        try:
+            await rest_scheduler.submit(
+                webhook.delete,
+                route=f"webhooks:{record['guild_id']}",
+                priority="maintenance",
+            )
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            logging.error(f"Could not delete webhook for channel {channel_id}: {e}")
+            return
+        self._record_change(record["guild_id"], channel_id, -1)
+
+    async def evict_lru(self, guild_id):
+        """
+        Delete the least recently used webhook in a guild
+
+        Returns False if the guild has no pooled webhooks left to evict
+        """
+        channel_id = next(
+            (c for c, r in self.records.items() if r["guild_id"] == guild_id), None
+        )
+        if channel_id is None:
+            return False
+        print(
+            f"{Fore.YELLOW}Evicting least recently used webhook in channel {channel_id}{Style.RESET_ALL}"
+        )
+        await self.release(channel_id)
+        return True
+
+    async def on_webhooks_update(self, channel):
+        """
+        Refresh the count for one channel after Discord reports a webhook change there
+
+        Events caused by our own creates and deletes are already accounted for and skipped.
+        """
+        last_change = self.recent_changes.get(channel.id)
+        if (
+            last_change is not None
+            and time.monotonic() - last_change < WEBHOOK_RECONCILE["event_grace"]
+        ):
+            return
+        webhooks = await channel.webhooks()
+        self.channel_counts.setdefault(channel.guild.id, {})[channel.id] = len(webhooks)
+        record = self.records.get(channel.id)
+        if record is not None and record["id"] not in {w.id for w in webhooks}:
+            self.forget(channel.id)
+
+    async def reconcile(self, guild):
+        """
+        Correct local accounting with a single REST call for the guild
+
+        Returns the number of webhooks in the guild after any evictions
+        """
+        webhooks = await guild.webhooks()
+        self.channel_counts[guild.id] = dict(Counter(w.channel_id for w in webhooks))
+        webhook_ids = {w.id for w in webhooks}
+        for channel_id in [
+            c
+            for c, r in self.records.items()
+            if r["guild_id"] == guild.id and r["id"] not in webhook_ids
+        ]:
+            self.forget(channel_id)
+
+        while self.guild_count(guild.id) >= self.guild_limit:
+            if not await self.evict_lru(guild.id):
+                break
+        return self.guild_count(guild.id)
+
+
+class RateLimitBucket:
+    """
+    Rate limit state for one webhook, read from Discord's response headers
+    """
+
+    def __init__(self):
+        self.remaining = 1
+        self.reset_at = 0.0
+
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+    def exhaust(self, retry_after):
+        self.remaining = 0
+        self.reset_at = time.monotonic() + retry_after
+
+    def delay(self):
+        """
+        Seconds to wait before the next request may be sent
+        """
+        if self.remaining > 0:
+            return 0.0
+        return max(self.reset_at - time.monotonic(), 0.0)
+
+
+class WebhookJob:
+    def __init__(self, payload, coalesce=True):
+        self.payload = payload
+        self.coalesce = coalesce  # whether the post may be merged with others
+        self.futures = [asyncio.get_running_loop().create_future()]
+
+    def author_key(self):
+        return (self.payload.get("username"), self.payload.get("avatar_url"))
+
+    def merge(self, other):
+        self.payload = {
+            **self.payload,
+            "content": f"{self.payload['content']}\n{other.payload['content']}",
+        }
+        self.futures.extend(other.futures)
+
+    def resolve(self, result):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+
+
+class WebhookDelivery:
+    """
+    Deliver webhook posts over one shared, pooled HTTP session
+
+    Sends are queued per channel and paced with the rate limit bucket Discord reports
+    for the channel's webhook. Failed sends are retried with exponential backoff. When a
+    channel is being rate limited, consecutive posts from the same author are merged
+    into a single message.
+
+    Each HTTP attempt of a post or edit runs in the REST scheduler's "repost" lane on
+    the webhook's own route, so it goes before other REST calls without using up the
+    bot's channel route. Retry waits and webhook re-creation happen outside the slot.
+    """
+
+    def __init__(
+        self,
+        pool,
+        api_base=DISCORD_API_BASE,
+        settings=WEBHOOK_DELIVERY,
+        scheduler=rest_scheduler,
+    ):
+        self.pool = pool
+        self.api_base = api_base
+        self.settings = settings
+        self.scheduler = scheduler
+        self.session = None
+        self.queues = {}  # channel_id -> deque of WebhookJob
+        self.workers = {}  # channel_id -> asyncio.Task draining the queue
+        self.buckets = {}  # webhook id -> RateLimitBucket
+        self.metrics = {
+            "sent": 0,
+            "edited": 0,
+            "coalesced": 0,
+            "retried": 0,
+            "failed": 0,
+        }
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.settings["connections"]),
+                timeout=aiohttp.ClientTimeout(total=self.settings["timeout"]),
+            )
+        return self.session
+
+    async def close(self):
+        for worker in self.workers.values():
+            worker.cancel()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def send(self, channel, payload, coalesce=True):
+        """
+        Queue a webhook post for a channel
+
+        Pass `coalesce=False` for posts that are edited later and so need a message
+        of their own. Returns the created message as a dict, or None if the post could
+        not be delivered
+        """
+        job = WebhookJob(payload, coalesce)
+        self.queues.setdefault(channel.id, deque()).append(job)
+        worker = self.workers.get(channel.id)
+        if worker is None or worker.done():
+            self.workers[channel.id] = asyncio.create_task(self._drain(channel))
+        return await job.futures[0]
+
+    async def edit(self, channel, message_id, payload):
+        """
+        Edit a message previously posted through the channel's webhook
+
+        Edits skip the send queue but respect the webhook's rate limit bucket.
+        Returns the edited message as a dict, or None if the edit failed
+        """
+        webhook = await self.pool.get(channel)
+        delay = self.buckets.setdefault(webhook.id, RateLimitBucket()).delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        result = await self._post(channel, payload, message_id=message_id)
+        if result is None:
+            self.metrics["failed"] += 1
+        else:
+            self.metrics["edited"] += 1
+        return result
+
+    async def _drain(self, channel):
+        queue = self.queues[channel.id]
+        while queue:
+            job = None
+            try:
+                webhook = await self.pool.get(channel)
+                bucket = self.buckets.setdefault(webhook.id, RateLimitBucket())
+                delay = bucket.delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                job = queue.popleft()
+                if delay > 0:
+                    self._coalesce(job, queue)
+                result = await self._post(channel, job.payload)
+            except Exception as e:
+                error_msg = f"An unexpected error occurred while sending the webhook message: {e}"
+                print(error_msg)
+                logging.error(error_msg)
+                result = None
+                if job is None:
+                    job = queue.popleft()
+            if result is None:
+                self.metrics["failed"] += 1
+            else:
+                self.metrics["sent"] += 1
+            job.resolve(result)
+
+    def _coalesce(self, job, queue):
+        """
+        Merge queued posts from the same author into the job while the channel is throttled
+        """
+        if not job.coalesce:
+            return
+        while queue and queue[0].coalesce and queue[0].author_key() == job.author_key():
+            combined = (
+                len(job.payload["content"]) + len(queue[0].payload["content"]) + 1
+            )
+            if combined > self.settings["max_length"]:
+                break
+            job.merge(queue.popleft())
+            self.metrics["coalesced"] += 1
+
+    async def _post(self, channel, payload, message_id=None):
+        """
+        Send a new webhook message, or edit `message_id` if given
+        """
+        session = self.get_session()
+        for attempt in range(self.settings["retries"] + 1):
+            if attempt > 0:
+                self.metrics["retried"] += 1
+            webhook = await self.pool.get(channel)
+            bucket = self.buckets.setdefault(webhook.id, RateLimitBucket())
+            url = f"{self.api_base}/webhooks/{webhook.id}/{webhook.token}"
+            if message_id is not None:
+                url = f"{url}/messages/{message_id}"
+            try:
+                status, headers, body = await self.scheduler.submit(
+                    lambda: self._request(session, url, payload, message_id),
+                    route=f"webhook:{channel.id}",
+                    priority="repost",
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error(f"Webhook request failed: {e}")
+                await self._backoff(attempt)
+                continue
+
+            bucket.update(headers)
+            if status < 300:
+                return body
+            if status == 429:
+                retry_after = float(
+                    body.get("retry_after", headers.get("Retry-After", 1))
+                )
+                bucket.exhaust(retry_after)
+                await asyncio.sleep(retry_after)
+            elif status in (401, 404) and message_id is None:
+                # The pooled webhook was deleted outside the bot; replace it
+                self.pool.forget(channel.id)
+            elif status < 500:
+                error_msg = f"Webhook message rejected ({status}): {body}"
+                print(error_msg)
+                logging.error(error_msg)
+                return None
+            else:
+                await self._backoff(attempt)
+
+        error_msg = f"Giving up on webhook message in channel {channel.id} after {self.settings['retries'] + 1} attempts"
+        print(error_msg)
+        logging.error(error_msg)
+        return None
+
+    async def _request(self, session, url, payload, message_id):
+        """
+        Make one HTTP attempt and return its status, headers and body
+        """
+        if message_id is None:
+            request = session.post(url, json=payload, params={"wait": "true"})
+        else:
+            request = session.patch(url, json=payload)
+        async with request as response:
+            if response.status < 300 or response.status == 429:
+                body = await response.json()
+            else:
+                body = await response.text()
+            return response.status, response.headers, body
+
+    async def _backoff(self, attempt):
+        delay = self.settings["backoff"] * 2**attempt
+        await asyncio.sleep(delay + random.uniform(0, delay))
+
+
+webhook_pool = WebhookPool()
+webhook_delivery = WebhookDelivery(webhook_pool)